@@ -17,16 +17,30 @@ time curl -o source_properties.tsv --silent \
    http://cda.cfa.harvard.edu/csccli/getProperties
 echo "# Ended csccli call: `date`"
 
+# props2json writes the compressed chunks directly, in parallel. The
+# output is deterministic (i.e. same contents evaluate to same output
+# file) as no name or time stamp is stored, as with gzip -n.
+#
+rm -f wwt_srcprop.*.json.gz wwt_srcprop.*.json.br wwt_srcprop.*.json.zst
+
 echo "# Starting props2json: `date`"
-python props2json.py prerelease_filtered.fits source_properties.tsv wwt_srcprop
+python props2json.py prerelease_filtered.fits source_properties.tsv wwt_srcprop --gzip
 echo "# Ended props2json: `date`"
 
-# require -n in gzip to ensure the output is deterministic (i.e. same contents
-# evaluate to same output file); -n strips name and time stamp, the latter
-# being the culprit
+# Create the brotli and zstandard versions of the chunks, and of the
+# other catalogs, so the web server can send the smallest encoding
+# the browser supports (a format is skipped if its module is not
+# installed). The output is deterministic and the catalogs are only
+# re-written if they have changed.
 #
-rm wwt_srcprop.*.json.gz
-gzip -n wwt_srcprop.*.json
+echo "# Starting precompress: `date`"
+python csc21/precompress.py wwt_srcprop.*.json.gz
+for x in xmm.json.gz erosita.json.gz ens21.json.gz ; do
+  if [ -f ${outjsondir}/$x ] ; then
+    python csc21/precompress.py ${outjsondir}/$x
+  fi
+done
+echo "# Ended precompress: `date`"
 
 # Since we are near the end of the process, and the times are all messed
 # up, do not copy over the "status" information anymore.
@@ -39,7 +53,8 @@ cp wwt_status.json ${outjsondir}/
 
 # hope that the JSON output is deterministic so this check is worth it
 #
-for x in wwt_srcprop.*.json.gz ; do
+srcprop=`ls wwt_srcprop.*.json.gz wwt_srcprop.*.json.br wwt_srcprop.*.json.zst 2> /dev/null`
+for x in $srcprop ; do
   diff -q $x ${outjsondir}/$x
   if [ $? -ne 0 ] ; then
     cp $x ${outjsondir}/
@@ -48,11 +63,13 @@ done
 
 cd ${outjsondir}/
 
+catalogs=`ls xmm.json.br xmm.json.zst erosita.json.br erosita.json.zst ens21.json.br ens21.json.zst 2> /dev/null`
+
 # publish=/data/da/Docs/web4/ciao410/publish.pl
 publish=/data/da/Docs/web4/ciao411/publish.pl
 
-perl $publish wwt_status.json wwt_srcprop.*.json.gz
-perl $publish wwt_status.json wwt_srcprop.*.json.gz --type=live
+perl $publish wwt_status.json $srcprop $catalogs
+perl $publish wwt_status.json $srcprop $catalogs --type=live
 
 cd ..
 
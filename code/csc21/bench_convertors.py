@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+
+"""Usage:
+
+  ./bench_convertors.py [nrows]
+
+Aim:
+
+Compare the time taken to convert a column of strings with the
+per-cell convertors (stackdata.make_convertor) against the batch
+conversion in srctable.convert_column. The default is 400000 rows,
+which is close to the size of the CSC 2.1 master source table.
+
+The results of the two approaches are checked to be the same.
+
+"""
+
+import random
+import sys
+import time
+
+import numpy as np
+
+import srctable
+import stackdata
+
+
+def make_tokens(kind, nrows, rng):
+    """Create the column data (including some missing values)."""
+
+    if kind == "float":
+        return [repr(rng.uniform(-1, 1) * 10**rng.randint(-16, 3))
+                if rng.random() < 0.8 else ''
+                for _ in range(nrows)]
+
+    if kind == "integer":
+        return [str(rng.randint(0, 40)) if rng.random() < 0.95 else ''
+                for _ in range(nrows)]
+
+    if kind == "flag":
+        return [rng.choice("TF") for _ in range(nrows)]
+
+    if kind == "string":
+        return [f" 2CXO J{rng.randint(0, 235959):06d}.{rng.randint(0, 9)}+{rng.randint(0, 895959):06d} "
+                for _ in range(nrows)]
+
+    raise ValueError(kind)
+
+
+def per_cell(toks, kind, convertor):
+    return srctable.column_from_list([convertor(tok) for tok in toks], kind)
+
+
+def same(col1, col2):
+    if not np.array_equal(col1.mask, col2.mask):
+        return False
+
+    return col1.tolist() == col2.tolist()
+
+
+def doit(nrows):
+
+    rng = random.Random(2389)
+    kinds = [("float", "double"), ("integer", "int"),
+             ("flag", "boolean"), ("string", "char")]
+
+    print(f"# nrows={nrows}")
+    print("# kind     per-cell  batch   speedup")
+    for kind, dtype in kinds:
+        toks = make_tokens(kind, nrows, rng)
+        convertor = stackdata.make_convertor("col", dtype)
+
+        t0 = time.perf_counter()
+        col1 = per_cell(toks, kind, convertor)
+        t1 = time.perf_counter()
+        col2 = srctable.convert_column(toks, kind, convertor)
+        t2 = time.perf_counter()
+
+        if not same(col1, col2):
+            raise ValueError(f"Conversion differs for {kind}")
+
+        dt1 = t1 - t0
+        dt2 = t2 - t1
+        print(f"  {kind:8s} {dt1:7.3f}  {dt2:7.3f}  {dt1 / dt2:5.1f}")
+
+
+if __name__ == "__main__":
+
+    nargs = len(sys.argv)
+    if nargs == 2:
+        nrows = int(sys.argv[1])
+    elif nargs == 1:
+        nrows = 400000
+    else:
+        sys.stderr.write(f"Usage: {sys.argv[0]} [nrows]\n")
+        sys.exit(1)
+
+    doit(nrows)
@@ -0,0 +1,178 @@
+#!/usr/bin/env python
+
+"""Usage:
+
+  ./bench_layout.py [votable] [--quantize] [--chunksize n]
+
+Aim:
+
+Compare the rows and columns layouts of the source-property chunks
+(the --layout option of make_status.py): the total size of the
+chunks, with and without gzip compression, and the time taken to
+parse them with Python (json.loads) and, if node is available,
+Node (JSON.parse). For the columns layout the Node time is also
+given including the conversion to rows (as done by the viewer).
+
+If a VOTable file (a saved copy of the master_source query) is not
+given then the CSC 2.1 table is downloaded with
+stackdata.get_source_properties. The --quantize option writes out
+the positions and fluxes as integers (see quantize.py).
+
+"""
+
+import gzip
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+import bench_srcbinary
+import make_status
+import quantize
+import srcjson
+import stackdata
+
+
+NODE_SCRIPT = """
+const fs = require('fs');
+// The script is run with node -e, so the arguments start at argv[1].
+const layout = process.argv[1];
+const texts = process.argv.slice(2).map(f => fs.readFileSync(f, 'utf8'));
+
+function toRows(json) {
+  const values = json.cols.map(col => json.columns[col]);
+  const nrows = values.length > 0 ? values[0].length : 0;
+  const rows = new Array(nrows);
+  for (let i = 0; i < nrows; i++) {
+    rows[i] = values.map(vals => vals[i]);
+  }
+  return rows;
+}
+
+function best(func) {
+  let out = null;
+  for (let i = 0; i < 5; i++) {
+    const t0 = process.hrtime.bigint();
+    func();
+    const dt = Number(process.hrtime.bigint() - t0) / 1e9;
+    out = out === null ? dt : Math.min(out, dt);
+  }
+  return out;
+}
+
+const parse = best(() => texts.forEach(txt => JSON.parse(txt)));
+const rows = layout === 'columns'
+  ? best(() => texts.forEach(txt => toRows(JSON.parse(txt))))
+  : parse;
+console.log(JSON.stringify({parse: parse, rows: rows}));
+"""
+
+
+def node_times(layout, filenames):
+    """Return the Node parse times, or None if node is not available."""
+
+    node = shutil.which("node")
+    if node is None:
+        return None
+
+    out = subprocess.run([node, "-e", NODE_SCRIPT, layout, *filenames],
+                         check=True, capture_output=True, text=True)
+    return json.loads(out.stdout)
+
+
+def doit(source_data, quantize_data=False, chunksize=40000):
+
+    table = source_data["table"]
+    colorder = source_data["order"]
+    ntotal = len(table)
+
+    quant = None
+    if quantize_data:
+        table, quant = quantize.quantize_table(table)
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for layout in make_status.LAYOUTS:
+            texts = []
+            for start in range(0, ntotal + 1, chunksize):
+                chunk = table[start:start + chunksize]
+                if layout == "columns":
+                    txt = make_status.columns_chunk(ntotal, start, colorder,
+                                                    chunk, quant=quant)
+                else:
+                    txt = make_status.chunk_header(ntotal, colorder,
+                                                   quant=quant) + \
+                        srcjson.encode_table(chunk,
+                                             precision=make_status.FLOAT_PRECISION) + \
+                        make_status.chunk_trailer(start)
+
+                texts.append(txt.encode("utf-8"))
+
+            filenames = []
+            for idx, txt in enumerate(texts):
+                filename = os.path.join(tmpdir, f"{layout}.{idx}.json")
+                with open(filename, "wb") as fh:
+                    fh.write(txt)
+
+                filenames.append(filename)
+
+            tpython, _ = bench_srcbinary.timeit(lambda: [json.loads(txt) for txt in texts])
+            results[layout] = {
+                "size": sum(len(txt) for txt in texts),
+                "gzip": sum(len(gzip.compress(txt, compresslevel=6, mtime=0))
+                            for txt in texts),
+                "python": tpython,
+                "node": node_times(layout, filenames)}
+
+    def mb(nbytes):
+        return nbytes / 1024 / 1024
+
+    def secs(times, key):
+        if times is None:
+            return "        n/a"
+
+        return f"{times[key]:11.3f}"
+
+    print(f"# nrows={ntotal} chunksize={chunksize} quantize={quantize_data}")
+    print("# layout   size (MB)  gzip (MB)  python (s)    node (s)  node+rows (s)")
+    for layout, res in results.items():
+        print(f"  {layout:7s}  {mb(res['size']):9.2f}  {mb(res['gzip']):9.2f}  " +
+              f"{res['python']:10.3f}  {secs(res['node'], 'parse')}  " +
+              f"{secs(res['node'], 'rows'):>13s}")
+
+
+help_str = "Compare the rows and columns layouts of the source properties."
+
+
+if __name__ == "__main__":
+
+    import argparse
+
+    parser = argparse.ArgumentParser(description=help_str,
+                                     prog=sys.argv[0])
+
+    parser.add_argument('votable', type=str, nargs='?', default=None,
+                        help='A saved copy of the master_source query')
+    parser.add_argument('--quantize', action='store_true',
+                        help='Write the positions and fluxes as integers')
+    parser.add_argument('--chunksize', type=int, default=40000,
+                        help='The number of rows in a chunk (default: %(default)s)')
+
+    args = parser.parse_args(sys.argv[1:])
+    if args.chunksize < 1:
+        parser.error("--chunksize must be 1 or more")
+
+    if args.votable is None:
+        source_data = stackdata.get_source_properties(binary=True)
+    else:
+        with open(args.votable, "rb") as fh:
+            cts = fh.read()
+
+        try:
+            source_data = stackdata.srclist_process_binary(cts)
+        except ValueError:
+            source_data = stackdata.srclist_process_votable(cts.decode())
+
+    doit(source_data, quantize_data=args.quantize, chunksize=args.chunksize)
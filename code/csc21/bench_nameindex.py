@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+
+"""Usage:
+
+  ./bench_nameindex.py [votable] [--blocksize n] [--chunksize n]
+
+Aim:
+
+Report the size of the sorted name index (see nameindex.py) and
+the time to read it in and look up every source name, checking
+that each name is mapped to the correct chunk and row. If a
+VOTable file (a saved copy of the master_source query) is not given
+then the CSC 2.1 table is downloaded with
+stackdata.get_source_properties.
+
+For comparison, the size of a plain JSON list of the names, and
+the time to look up the names with a dictionary built from this
+list, are also reported.
+
+"""
+
+import gzip
+import json
+import sys
+import time
+
+import nameindex
+import stackdata
+
+
+def doit(source_data, blocksize=64, chunksize=40000):
+
+    names = source_data["table"]["name"].text().tolist()
+    ntotal = len(names)
+    chunks = list(range(0, ntotal + 1, chunksize))
+
+    t0 = time.perf_counter()
+    index = nameindex.build(names, chunks, blocksize=blocksize)
+    tbuild = time.perf_counter() - t0
+
+    itxt = json.dumps(index).encode("utf-8")
+    igz = gzip.compress(itxt, compresslevel=6, mtime=0)
+    ntxt = json.dumps(names).encode("utf-8")
+    ngz = gzip.compress(ntxt, compresslevel=6, mtime=0)
+
+    t0 = time.perf_counter()
+    index = json.loads(gzip.decompress(igz))
+    tread = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    found = [nameindex.lookup(index, name) for name in names]
+    tlookup = time.perf_counter() - t0
+
+    for row, (chunk, crow) in enumerate(found):
+        if chunks[chunk - 1] + crow != row:
+            raise ValueError(f"Wrong location for {names[row]}: " +
+                             f"chunk={chunk} row={crow}")
+
+    t0 = time.perf_counter()
+    store = {name: idx for idx, name in enumerate(json.loads(gzip.decompress(ngz)))}
+    tdread = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    for name in names:
+        row = store[name]
+        chunk = row // chunksize
+        (chunk + 1, row - chunk * chunksize)
+
+    tdlookup = time.perf_counter() - t0
+
+    def kb(nbytes):
+        return nbytes / 1024
+
+    print(f"# nsources={ntotal} blocksize={blocksize} chunksize={chunksize} " +
+          f"nblocks={len(index['first'])} sorted={index['rows'] is None}")
+    print(f"# build time: {tbuild:.3f} s")
+    print("# format   size (kB)  gzip (kB)  read (s)  lookup all (s)  per name (us)")
+    print(f"  index    {kb(len(itxt)):9.1f}  {kb(len(igz)):9.1f}  " +
+          f"{tread:8.3f}  {tlookup:14.3f}  {1e6 * tlookup / max(ntotal, 1):13.1f}")
+    print(f"  names    {kb(len(ntxt)):9.1f}  {kb(len(ngz)):9.1f}  " +
+          f"{tdread:8.3f}  {tdlookup:14.3f}  {1e6 * tdlookup / max(ntotal, 1):13.1f}")
+
+
+help_str = "Benchmark the sorted name index."
+
+
+if __name__ == "__main__":
+
+    import argparse
+
+    parser = argparse.ArgumentParser(description=help_str,
+                                     prog=sys.argv[0])
+
+    parser.add_argument('votable', type=str, nargs='?', default=None,
+                        help='A saved copy of the master_source query')
+    parser.add_argument('--blocksize', type=int, default=64,
+                        help='The number of names in a block (default: %(default)s)')
+    parser.add_argument('--chunksize', type=int, default=40000,
+                        help='The number of rows in a chunk (default: %(default)s)')
+
+    args = parser.parse_args(sys.argv[1:])
+    if args.blocksize < 1:
+        parser.error("--blocksize must be 1 or more")
+
+    if args.chunksize < 1:
+        parser.error("--chunksize must be 1 or more")
+
+    if args.votable is None:
+        source_data = stackdata.get_source_properties(binary=True)
+    else:
+        with open(args.votable, "rb") as fh:
+            cts = fh.read()
+
+        try:
+            source_data = stackdata.srclist_process_binary(cts)
+        except ValueError:
+            source_data = stackdata.srclist_process_votable(cts.decode())
+
+    doit(source_data, blocksize=args.blocksize, chunksize=args.chunksize)
@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+
+"""Usage:
+
+  ./bench_srcbinary.py [votable]
+
+Aim:
+
+Compare the size and decode time of the JSON and binary (see
+srcbinary.py) versions of the source properties, with the whole
+table written out as a single chunk. If a VOTable file (a saved
+copy of the master_source query) is not given then the CSC 2.1
+table is downloaded with stackdata.get_source_properties.
+
+The decoded binary data is checked against the JSON version (the
+JSON floats only have 6 significant figures and the binary ones
+are mostly float32, so the floats are compared to a relative
+tolerance).
+
+"""
+
+import gzip
+import json
+import sys
+import time
+
+import numpy as np
+
+import make_status
+import srcbinary
+import srcjson
+import stackdata
+
+
+def check(rows, table):
+    """Check the JSON rows match the decoded binary data."""
+
+    for idx, name in enumerate(table.names):
+        col = table[name]
+        jvals = [row[idx] for row in rows]
+        jnull = np.asarray([val is None for val in jvals])
+        if not np.array_equal(jnull, col.mask):
+            raise ValueError(f"Null values differ for {name}")
+
+        if col.values.dtype.kind != "f":
+            if [val for val in jvals if val is not None] != \
+               col.text()[~col.mask].tolist():
+                raise ValueError(f"Values differ for {name}")
+
+            continue
+
+        jvals = np.asarray([val for val in jvals if val is not None],
+                           dtype=np.float64)
+        if not np.allclose(jvals, col.values[~col.mask], rtol=1e-5, atol=0):
+            raise ValueError(f"Values differ for {name}")
+
+
+def timeit(func, ntries=3):
+    """Return the fastest time of ntries calls (and the last result)."""
+
+    best = None
+    for _ in range(ntries):
+        t0 = time.perf_counter()
+        out = func()
+        dt = time.perf_counter() - t0
+        best = dt if best is None else min(best, dt)
+
+    return best, out
+
+
+def doit(source_data):
+
+    table = source_data["table"]
+    colorder = source_data["order"]
+    ntotal = len(table)
+
+    jtxt = (make_status.chunk_header(ntotal, colorder) +
+            srcjson.encode_table(table, precision=make_status.FLOAT_PRECISION) +
+            make_status.chunk_trailer(0)).encode("utf-8")
+    btxt = srcbinary.encode_table(table, ntotal, 0, colorder)
+
+    jgz = gzip.compress(jtxt, compresslevel=6, mtime=0)
+    bgz = gzip.compress(btxt, compresslevel=6, mtime=0)
+
+    tjson, jdata = timeit(lambda: json.loads(jtxt))
+    tbin, (_, bdata) = timeit(lambda: srcbinary.decode(btxt))
+    tjgz, _ = timeit(lambda: json.loads(gzip.decompress(jgz)))
+    tbgz, _ = timeit(lambda: srcbinary.decode(gzip.decompress(bgz)))
+
+    check(jdata["rows"], bdata)
+
+    def mb(nbytes):
+        return nbytes / 1024 / 1024
+
+    print(f"# nrows={ntotal}")
+    print("# format   size (MB)  gzip (MB)  decode (s)  decode gzip (s)")
+    print(f"  json     {mb(len(jtxt)):9.2f}  {mb(len(jgz)):9.2f}  " +
+          f"{tjson:10.3f}  {tjgz:15.3f}")
+    print(f"  binary   {mb(len(btxt)):9.2f}  {mb(len(bgz)):9.2f}  " +
+          f"{tbin:10.3f}  {tbgz:15.3f}")
+    print(f"  ratio    {len(jtxt) / len(btxt):9.1f}  {len(jgz) / len(bgz):9.1f}  " +
+          f"{tjson / tbin:10.1f}  {tjgz / tbgz:15.1f}")
+
+
+if __name__ == "__main__":
+
+    nargs = len(sys.argv)
+    if nargs == 2:
+        with open(sys.argv[1], "rb") as fh:
+            cts = fh.read()
+
+        try:
+            source_data = stackdata.srclist_process_binary(cts)
+        except ValueError:
+            source_data = stackdata.srclist_process_votable(cts.decode())
+
+    elif nargs == 1:
+        source_data = stackdata.get_source_properties(binary=True)
+
+    else:
+        sys.stderr.write(f"Usage: {sys.argv[0]} [votable]\n")
+        sys.exit(1)
+
+    doit(source_data)
@@ -0,0 +1,145 @@
+#!/usr/bin/env python
+
+"""Usage:
+
+  ./bench_statusjson.py statusfile
+
+Aim:
+
+Compare the dicts and arrays layouts of wwt21_status.json (the
+--status-layout option of make_status.py): the size of the file,
+with and without gzip compression, and the time taken to parse it
+with Python (json.loads) and, if node is available, Node
+(JSON.parse). The times are also given including the conversion to
+the dicts layout (statusjson.to_dicts for Python, and the same
+conversion as the viewer for Node).
+
+The statusfile can use either layout.
+
+"""
+
+import gzip
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+import bench_srcbinary
+import statusjson
+
+
+NODE_SCRIPT = """
+const fs = require('fs');
+// The script is run with node -e, so the arguments start at argv[1].
+const txt = fs.readFileSync(process.argv[1], 'utf8');
+
+function toDicts(status) {
+  if (status.layout !== 'arrays') { return status; }
+  const stacks = {};
+  const completed = {};
+  const nsource = {};
+  for (let i = 0; i < status.stackids.length; i++) {
+    const stackid = status.stackids[i];
+    stacks[stackid] = status.stacks[i];
+    if (status.completed[i] !== null) { completed[stackid] = status.completed[i]; }
+    if (status.nsource[i] !== null) { nsource[stackid] = status.nsource[i]; }
+  }
+  status.stacks = stacks;
+  status.completed = completed;
+  status.nsource = nsource;
+  return status;
+}
+
+function best(func) {
+  let out = null;
+  for (let i = 0; i < 20; i++) {
+    const t0 = process.hrtime.bigint();
+    func();
+    const dt = Number(process.hrtime.bigint() - t0) / 1e9;
+    out = out === null ? dt : Math.min(out, dt);
+  }
+  return out;
+}
+
+const parse = best(() => JSON.parse(txt));
+const dicts = best(() => toDicts(JSON.parse(txt)));
+console.log(JSON.stringify({parse: parse, dicts: dicts}));
+"""
+
+
+def node_times(filename):
+    """Return the Node parse times, or None if node is not available."""
+
+    node = shutil.which("node")
+    if node is None:
+        return None
+
+    out = subprocess.run([node, "-e", NODE_SCRIPT, filename],
+                         check=True, capture_output=True, text=True)
+    return json.loads(out.stdout)
+
+
+def doit(statusfile):
+
+    status = statusjson.read(statusfile)
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for layout in statusjson.LAYOUTS:
+            out = status if layout == "dicts" else statusjson.to_arrays(status)
+            txt = json.dumps(out, sort_keys=True).encode("utf-8")
+
+            # Check the conversion.
+            #
+            if statusjson.to_dicts(json.loads(txt)) != status:
+                raise ValueError(f"Unable to convert the {layout} layout")
+
+            filename = os.path.join(tmpdir, f"{layout}.json")
+            with open(filename, "wb") as fh:
+                fh.write(txt)
+
+            tparse, _ = bench_srcbinary.timeit(lambda: json.loads(txt))
+            tdicts, _ = bench_srcbinary.timeit(lambda: statusjson.to_dicts(json.loads(txt)))
+            results[layout] = {
+                "size": len(txt),
+                "gzip": len(gzip.compress(txt, compresslevel=6, mtime=0)),
+                "python": tparse,
+                "python_dicts": tdicts,
+                "node": node_times(filename)}
+
+    def kb(nbytes):
+        return nbytes / 1024
+
+    def ms(times, key):
+        if times is None:
+            return "n/a"
+
+        return f"{times[key] * 1000:.2f}"
+
+    print(f"# nstacks={len(status['stacks'])} " +
+          f"ncompleted={len(status['completed'])}")
+    print("# layout  size (kB)  gzip (kB)  python (ms)  python+dicts (ms)  " +
+          "node (ms)  node+dicts (ms)")
+    for layout, res in results.items():
+        print(f"  {layout:6s}  {kb(res['size']):9.1f}  {kb(res['gzip']):9.1f}  " +
+              f"{res['python'] * 1000:11.2f}  {res['python_dicts'] * 1000:17.2f}  " +
+              f"{ms(res['node'], 'parse'):>9s}  {ms(res['node'], 'dicts'):>15s}")
+
+
+help_str = "Compare the dicts and arrays layouts of wwt21_status.json."
+
+
+if __name__ == "__main__":
+
+    import argparse
+
+    parser = argparse.ArgumentParser(description=help_str,
+                                     prog=sys.argv[0])
+
+    parser.add_argument('statusfile', type=str,
+                        help='The status file (either layout)')
+
+    args = parser.parse_args(sys.argv[1:])
+    doit(args.statusfile)
@@ -0,0 +1,95 @@
+"""
+Assign positions to HEALPix pixels (NESTED ordering).
+
+This is a NumPy version of the ang2pix_nest routine from the HEALPix
+library (Gorski et al. 2005, ApJ 622, 759), so that the sources can
+be split into equal-area tiles without needing healpy. Only the
+conversion from (ra, dec) to pixel number is provided.
+
+Requires NumPy.
+
+"""
+
+import numpy as np
+
+
+def order_to_nside(order):
+    """The nside value for the given order (nside = 2^order)."""
+
+    if order < 0 or order > 29:
+        raise ValueError(f"Invalid HEALPix order: {order}")
+
+    return 1 << order
+
+
+def spread_bits(vals, nbits):
+    """Move bit i of each value to bit 2i, for the first nbits bits."""
+
+    out = np.zeros(vals.shape, dtype=np.int64)
+    vals = vals.astype(np.int64)
+    for bit in range(nbits):
+        out |= ((vals >> bit) & 1) << (2 * bit)
+
+    return out
+
+
+def ang2pix_nest(order, ra, dec):
+    """Return the NESTED pixel number for each position.
+
+    Parameters
+    ----------
+    order : int
+        The HEALPix order, so nside is 2^order and there are
+        12 * nside^2 pixels.
+    ra, dec : array_like
+        The positions, in degrees.
+
+    Returns
+    -------
+    pix : ndarray of int64
+    """
+
+    nside = order_to_nside(order)
+    ra = np.asarray(ra, dtype=np.float64)
+    dec = np.asarray(dec, dtype=np.float64)
+
+    z = np.sin(np.radians(dec))
+    za = np.abs(z)
+
+    # tt is in the range [0, 4)
+    tt = np.mod(np.radians(ra), 2 * np.pi) * (2 / np.pi)
+    tt[tt >= 4] = 0
+
+    face = np.zeros(z.shape, dtype=np.int64)
+    ix = np.zeros(z.shape, dtype=np.int64)
+    iy = np.zeros(z.shape, dtype=np.int64)
+
+    # Equatorial region
+    #
+    eq = za <= 2 / 3
+    temp1 = nside * (0.5 + tt[eq])
+    temp2 = nside * z[eq] * 0.75
+    jp = (temp1 - temp2).astype(np.int64)  # ascending edge line
+    jm = (temp1 + temp2).astype(np.int64)  # descending edge line
+    ifp = jp // nside
+    ifm = jm // nside
+    face[eq] = np.where(ifp == ifm, ifp | 4,
+                        np.where(ifp < ifm, ifp, ifm + 8))
+    ix[eq] = jm & (nside - 1)
+    iy[eq] = nside - (jp & (nside - 1)) - 1
+
+    # Polar caps
+    #
+    pol = ~eq
+    ntt = np.minimum(tt[pol].astype(np.int64), 3)
+    tp = tt[pol] - ntt
+    tmp = nside * np.sqrt(3 * (1 - za[pol]))
+    jp = np.minimum((tp * tmp).astype(np.int64), nside - 1)
+    jm = np.minimum(((1 - tp) * tmp).astype(np.int64), nside - 1)
+    north = z[pol] >= 0
+    face[pol] = np.where(north, ntt, ntt + 8)
+    ix[pol] = np.where(north, nside - jm - 1, jp)
+    iy[pol] = np.where(north, nside - jp - 1, jm)
+
+    return face * nside * nside + spread_bits(ix, order) + \
+        (spread_bits(iy, order) << 1)
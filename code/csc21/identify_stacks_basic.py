@@ -67,11 +67,11 @@ import stackdata
 def process(indir):
     """Read in the stack data."""
 
-    stacks = stackdata.find_stack_obis(indir)
-    status = stackdata.find_stack_status(indir)
-    targets = stackdata.read_cxc_targetnames()
-
-    obi20 = stackdata.read_20_stacklist()
+    catalog = stackdata.StackCatalog.load(indir)
+    stacks = catalog.obis
+    status = catalog.status
+    targets = catalog.targets
+    obi20 = catalog.stacks20
 
     def nice(obi):
         return f'"{obi[0]:05d}_{obi[1]:03d}"'
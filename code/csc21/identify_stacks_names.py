@@ -25,8 +25,9 @@ import stackdata
 def process(indir):
     """Read in the stack data."""
 
-    stacks = stackdata.find_stack_obis(indir)
-    targets = stackdata.read_cxc_targetnames()
+    catalog = stackdata.StackCatalog.load(indir)
+    stacks = catalog.obis
+    targets = catalog.targets
 
     # Write out (really should be JSON but doint it this way for now).
     #
@@ -53,7 +53,7 @@ import stackdata
 def process(indir):
     """Read in the stack data."""
 
-    stacks = stackdata.find_stack_obis(indir)
+    stacks = stackdata.StackCatalog.load(indir).obis
 
     def nice(obi):
         return f'"{obi[0]:05d}_{obi[1]:03d}"'
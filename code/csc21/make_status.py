@@ -2,7 +2,13 @@
 
 """Usage:
 
- ./make_status.py [stackfile]
+ ./make_status.py [stackfile] [--stream | --binary] [--gzip] [--nproc n]
+                  [--incremental] [--tiles order] [--typed-arrays]
+                  [--quantize] [--layout rows|columns]
+                  [--tap-parts n] [--tap-workers n] [--tap-url url]
+                  [--cache | --refresh | --offline | --no-cache] [--cache-ttl s]
+                  [--cache-dir dir] [--status-pagesize n]
+                  [--status-layout dicts|arrays] [--no-precompress]
 
 Aim:
 
@@ -16,45 +22,182 @@ and we default to that if not given.
 We use the date of the file creation as the "last-modified"
 date for the database.
 
+The --stream option processes the source properties as they are
+downloaded, rather than reading in the whole response first, so
+that the memory use does not depend on the size of the catalog.
+The --binary option requests the BINARY2 serialization of the
+VOTABLE, which is decoded a column at a time with NumPy.
+
+The --gzip option writes out the source properties as gzip files
+directly (there is no time stamp or file name in the output, so
+it only depends on the contents). The --nproc option sets the
+number of processes used to create these files.
+
+The --incremental option keeps the chunk boundaries from the
+previous run, stored in wwt21_srcprop.state.npz, and names each
+chunk by the hash of its contents, so only the chunks that have
+changed are written out (and so need to be downloaded again).
+The list of chunks is written to the srcprop field of
+wwt21_status.json. The chunks of the previous run are only deleted
+by the run after this one, so a client with the old status file can
+still download them. It can not be used with --stream.
+
+The --tiles option also writes out the source properties split
+up by HEALPix pixel (NESTED ordering, of the given order), so that
+the sources in one part of the sky can be loaded without having
+to download the whole catalog. There is one file per non-empty
+tile, and the wwt21_srctiles.json file lists the tiles, along
+with the number of sources and size of each one. It can not be
+used with --stream.
+
+The --typed-arrays option also writes out each chunk in a binary
+format, where each column is stored as a little-endian typed array
+(see srcbinary.py), which is quicker to read in than JSON. It can
+not be used with --stream or --incremental.
+
+The --quantize option writes out the positions as integer
+micro-degrees, and the fluxes as a packed mantissa and exponent
+(see quantize.py), which makes the chunks smaller. Each chunk has a
+quant field which says how to convert the values back, and the
+maximum position error (in milli-arcseconds) and relative flux
+errors are displayed. It can not be used with --incremental or
+--tiles.
+
+The --layout option selects how the source-property chunks are
+stored: "rows" (the default) has a rows field listing the values of
+each source, and "columns" replaces it with a columns field, which
+maps each column name to the list of its values. See
+bench_layout.py to compare the two. The columns layout can not be
+used with --stream or --incremental.
+
+The --tap-parts option splits the TAP queries into separate ranges
+of source name (by RA hour), which are run in parallel, at most
+--tap-workers at a time, with each range retried on its own if it
+fails. The --tap-url option allows a different TAP service to be
+used, such as the stand-in from tap_standin.py. The --tap-parts
+option can not be used with --stream.
+
+The responses from the archive can be cached (see respcache.py), so
+that re-running the script soon after - e.g. to check a change to
+the output - does not need to re-query the archive. The cache is
+not used unless it is asked for, with --cache, --cache-ttl,
+--cache-dir, or the CSC_TAP_CACHE environment variable, so the
+scheduled runs always use the current archive results. The cached
+version is used if it is less than --cache-ttl seconds old. The
+--refresh option ignores the cache (but updates it), --offline
+only uses the cache (even if it has expired), and --no-cache
+turns off the cache. When the cache is used, the parsed stack
+lists (see stackdata.StackCatalog) are also saved in the cache
+directory, and re-used until one of the input files changes.
+
+The steps are run as a graph of stages (see stagegraph.py): the two
+TAP queries, the reading of the stack lists, and the status pages
+(status.xml and stacks-2.1.txt) do not wait for each other, and the
+outputs that depend on the source properties are written once the
+chunks have been created. The start and end time of each stage are
+displayed at the end.
+
+The stack status in wwt21_status.json is normally stored as objects
+keyed by the stack id. With --status-layout arrays each stack id is
+only written out once, and the values are stored in parallel arrays
+(see statusjson.py, which can read either version).
+
+Each run saves the stack status to wwt21_status.state.json, and
+writes the changes since the previous run to wwt21_status.delta.json
+(see statusjson.py), so that a client which has the previous version
+of wwt21_status.json - identified by its runid field - only needs
+to download the delta. The delta file is left as is when nothing
+has changed.
+
+The rows of the table in status.xml are written to stacks-2.1.json,
+as a compact JSON array, and the table is created from this file by
+js/status21.js (with deferred rendering), rather than written out as
+HTML. With --status-pagesize the first n rows are stored in
+stacks-2.1.json and the remaining rows in stacks-2.1.2.json,
+stacks-2.1.3.json, ..., with n rows in each, so that the first page
+of the table can be displayed before all the data has been
+downloaded.
+
+The wwt21_stack_sources.json file lists the sources in each stack,
+as an index into the source-property table (see stackindex.py). It
+is created from the same query used to count the number of sources
+in each stack.
+
+The wwt21_srcnames.json file is a sorted index of the source names
+(see nameindex.py), so that the chunk containing a source - and its
+position in the chunk - can be found without downloading all the
+chunks.
+
+The wwt21_srcstats.json file contains the range, quantiles, number
+of null values, and a histogram of each numeric column of the source
+properties (see srcstats.py), so that overview plots can be drawn
+before the chunks have been downloaded. It is not created with
+--stream.
+
+Once the source properties and wwt21_status.json have been written,
+the brotli (.br) and zstandard (.zst) versions of the source-property
+chunks are created (see precompress.py), so that the web server can
+send the smallest encoding the browser supports. A format is skipped
+if its module is not installed, and the .gz version is also created
+for chunks written without --gzip. The --no-precompress option skips
+this step.
+
 The output files are
 
-    wwt21_srcprop.*.json
+    wwt21_srcprop.*.json   (or .json.gz with --gzip)
+    wwt21_srcprop.*.bin      (or .bin.gz, with --typed-arrays)
+    wwt21_srcprop*.br, .zst  (and .gz, unless --no-precompress)
+    wwt21_srcprop.state.npz  (with --incremental)
+    wwt21_srctile.*.json.gz  (with --tiles)
+    wwt21_srctiles.json      (with --tiles)
+    wwt21_stack_sources.json (or .json.gz with --gzip)
+    wwt21_srcnames.json      (or .json.gz with --gzip)
+    wwt21_srcstats.json
     wwt21_status.json
+    wwt21_status.delta.json
+    wwt21_status.state.json
     status.xml
+    stacks-2.1.json          (and stacks-2.1.*.json with --status-pagesize)
     stacks-2.1.txt
 
 """
 
-from collections import OrderedDict
 from pathlib import Path
 import json
+import os
+import re
+import shutil
 import sys
 import time
 
+import numpy as np
+
+import healpix
+import nameindex
+import precompress
+import quantize
+import respcache
+import srcbinary
+import srcjson
+import srcmanifest
+import srcstats
 import stackdata
+import stackindex
+import stagegraph
+import statusjson
 
 
-class RoundingFloat(float):
-    """See https://stackoverflow.com/a/69056325
-
-    Note that we use the g format to try and handle
-    both values like 3.4234 and 7.42352e-16. The
-    default for g seems to be 5dp so bump to 6dp
-    just in case.
-    """
-
-    @staticmethod
-    def __repr__(x):
-        # just brute-force it, even if it is slow
-        old = repr(x)
-        new = f"{x:.6g}"
-        if len(new) < len(old):
-            return new
-        return old
-
+# The number of significant figures used for the floating-point
+# values in the source properties, if this is shorter than the
+# default representation. The "g" format is used to handle both
+# values like 3.4234 and 7.42352e-16.
+#
+FLOAT_PRECISION = 6
 
-json.encoder.c_make_encoder = None
-json.encoder.float = RoundingFloat
+# The supported layouts of the source-property chunks (see
+# write_sources).
+#
+LAYOUTS = ["rows", "columns"]
 
 
 def get_time(tstr):
@@ -128,7 +271,9 @@ def read_status(infile):
     return out, lmod_txt
 
 
-def write_json(processing, lmod_db, stack_count, source_data):
+def write_json(processing, lmod_db, stack_count, source_data,
+               layout="dicts", statefile="wwt21_status.state.json",
+               deltafile="wwt21_status.delta.json"):
 
     # If most of the stacks are processed then it would make sense to
     # have a single data structure for each stack, but for now
@@ -170,23 +315,67 @@ def write_json(processing, lmod_db, stack_count, source_data):
     out["lastupdate_db"] = lmod_db
 
 
-    out["nsources"] = len(source_data["rows"])
+    out["nsources"] = source_data["nsources"]
     out["nchunks"] = source_data["nchunks"]
 
+    # The incremental mode has to tell the client the names of the
+    # chunks, and where they go.
+    #
+    if "manifest" in source_data:
+        out["srcprop"] = source_data["manifest"]
+
+    if layout not in statusjson.LAYOUTS:
+        raise ValueError(f"Unknown layout: {layout}")
+
+    out["runid"] = statusjson.run_id(out)
+    write_status_delta(out, statefile, deltafile)
+
     outfile = "wwt21_status.json"
     with open(outfile, "wt") as fh:
-        fh.write(json.dumps(out, sort_keys=True))
+        if layout == "arrays":
+            fh.write(json.dumps(statusjson.to_arrays(out), sort_keys=True))
+        else:
+            fh.write(json.dumps(out, sort_keys=True))
+
+    print(f"Created: {outfile} (runid={out['runid']})")
 
-    print(f"Created: {outfile}")
 
+def write_status_delta(status, statefile, deltafile):
+    """Write out the changes since the previous run.
+
+    The previous status is read from statefile, which is then
+    replaced by status (in the dicts layout). The delta file is not
+    changed if there is no previous status, or if the status has
+    not changed (so it still refers to the last change).
+    """
 
-def write_xml(processing, lmod_db, stack_count):
+    previous = statusjson.read_state(statefile)
+    if previous is None:
+        print(f"Skipping {deltafile} as there is no previous status")
+    elif previous.get("runid") == status["runid"]:
+        print(f"Skipping {deltafile} as the status has not changed")
+    else:
+        if "runid" not in previous:
+            previous["runid"] = statusjson.run_id(previous)
+
+        delta = statusjson.make_delta(previous, status)
+        with open(deltafile, "wt") as fh:
+            fh.write(json.dumps(delta, sort_keys=True))
+
+        print(f"Created: {deltafile} with {delta['nchanged']} changed " +
+              f"stacks ({delta['base']} to {delta['target']})")
+
+    tmpname = f"{statefile}.tmp"
+    with open(tmpname, "wt") as fh:
+        fh.write(json.dumps(status, sort_keys=True))
+
+    os.replace(tmpname, statefile)
+
+
+def write_xml(processing, lmod_db, stack_count, catalog):
     """The XML status page."""
 
-    indir = Path("ian-2022-02-07")
-    status = stackdata.find_stack_status(indir)
-    all_obis = stackdata.find_stack_obis(indir)
-    all_names = stackdata.read_cxc_targetnames()
+    all_obis = catalog.obis
     outfile = "status.xml"
 
     with open(outfile, "wt") as fh:
@@ -207,6 +396,7 @@ def write_xml(processing, lmod_db, stack_count):
     <!-- see https://datatables.net/download/index -->
     <htmlscripts>
       <htmlscript src="https://cdn.datatables.net/v/dt/jq-3.6.0/jszip-2.5.0/dt-1.12.1/b-2.2.3/b-colvis-2.2.3/b-html5-2.2.3/b-print-2.2.3/sl-1.4.0/datatables.min.js"/>
+      <htmlscript src="../js/status21.js"/>
     </htmlscripts>
 
     <css src="https://cdn.datatables.net/v/dt/jq-3.6.0/jszip-2.5.0/dt-1.12.1/b-2.2.3/b-colvis-2.2.3/b-html5-2.2.3/b-print-2.2.3/sl-1.4.0/datatables.min.css"/>
@@ -266,10 +456,11 @@ div.dt-buttons {
         # The data I have has 10034 stacks containing 15533 (obsid,obi)
         # pairs and 15523 obsid values.
         #
+        # The table rows are read in from the JSON file (see
+        # write_status_table).
+        #
         fh.write(f"""
-  <text onload="let table = new DataTable('#csc21-status', {{
-  dom: 'Blfrtip', pageLength: 25, select: true, buttons: ['colvis', 'copy', 'csv', 'excel']
-}});">
+  <text onload="status21.createTable('#csc21-status', '{STATUS_TABLE}.json');">
 
     <h1>Processing status of CSC 2.1</h1>
     <div class="qlinkbar">
@@ -325,66 +516,125 @@ div.dt-buttons {
         </tr>
       </thead>
       <tbody>
+      </tbody>
+    </table>
+  </text>
+</page>
 """)
 
-        for stack in processing:
-            sdata = processing[stack]
-            state = sdata["state"]
+    print(f"Created: {outfile}")
 
-            # we report the number of obis even this array really
-            # contains obsids, but it will contain repeats for the
-            # few multi-obis we have.
-            #
-            obis = [obi[0] for obi in all_obis[stack]]
-            names = sorted(set([all_names[obi] for obi in obis]))
 
-            nstr = ", ".join(names)
+# The name of the JSON version of the status table (without the
+# .json suffix), and the columns it contains.
+#
+STATUS_TABLE = "stacks-2.1"
 
-            ra, dec = get_stack_pos(stack)
+STATUS_TABLE_COLS = ["stack", "nobi", "targets", "stacktype", "state",
+                     "ndet", "completed", "ra", "dec"]
 
-            fh.write("<tr><td>")
-            fh.write(f"<cxclink target='_blank' href='../wwt21.html?stackid={stack}&amp;ra={ra:.5f}&amp;dec={dec:.5f}'>{stack}</cxclink>")
-            fh.write("</td>")
-            fh.write(f"<td>{len(obis)}</td>")
-            fh.write(f"<td>{nstr}</td>")
-            fh.write(f"<td>{status[stack]}</td>")
-            fh.write(f"<td>{state}</td>")
 
-            if state == "Completed":
+def status_table_rows(processing, stack_count, catalog):
+    """The rows of the status table (see STATUS_TABLE_COLS).
 
-                try:
-                    nsrc = stack_count[stack]
-                except KeyError:
-                    nsrc = 0
+    The ndet value is -1 and completed is "" for stacks which have
+    not completed processing. The position is used for the link to
+    the WWT page.
+    """
 
-                fh.write(f'<td data-order="{nsrc}">{nsrc}</td>')
+    all_obis = catalog.obis
+    all_names = catalog.targets
 
-                ival = sdata["completed_int"]
-                fh.write(f'<td data-order="{ival}">')
-                fh.write(sdata["completed_str"])
-            else:
-                fh.write('<td data-order="-1">-</td>')
-                # Ensure we have a value
-                fh.write('<td data-order="0">Not completed')
+    rows = []
+    for stack in processing:
+        sdata = processing[stack]
+        state = sdata["state"]
 
-            fh.write("</td></tr>\n")
+        # we report the number of obis even this array really
+        # contains obsids, but it will contain repeats for the
+        # few multi-obis we have.
+        #
+        obis = [obi[0] for obi in all_obis[stack]]
+        names = sorted(set([all_names[obi] for obi in obis]))
 
-        fh.write("""
-      </tbody>
-    </table>
-  </text>
-</page>
-""")
+        ra, dec = get_stack_pos(stack)
+
+        if state == "Completed":
+            nsrc = stack_count.get(stack, 0)
+            completed = sdata["completed_str"]
+        else:
+            nsrc = -1
+            completed = ""
+
+        rows.append([stack, len(obis), ", ".join(names),
+                     catalog.status[stack], state, nsrc, completed,
+                     round(ra, 5), round(dec, 5)])
+
+    return rows
 
-    print(f"Created: {outfile}")
 
+def write_status_table(processing, lmod_db, stack_count, catalog,
+                       pagesize=None, outhead=STATUS_TABLE):
+    """Write out the rows of the status table as JSON.
 
-def write_txt(processing, lmod_db, stack_count):
+    The file <outhead>.json contains the cols, nrows, lastupdate,
+    and rows fields. If pagesize is set then rows only contains the
+    first pagesize rows, and the remaining rows are written to
+    <outhead>.2.json, <outhead>.3.json, ... (each with pagesize rows),
+    the number of files is given by the npages field, and any other
+    pages - from a previous run - are deleted.
+    """
+
+    rows = status_table_rows(processing, stack_count, catalog)
+    nrows = len(rows)
+    if pagesize is None:
+        pages = [rows]
+    else:
+        pages = [rows[start:start + pagesize]
+                 for start in range(0, max(nrows, 1), pagesize)]
+
+    def dump(value):
+        return json.dumps(value, separators=(",", ":"))
+
+    outfile = f"{outhead}.json"
+    out = {"cols": STATUS_TABLE_COLS,
+           "nrows": nrows,
+           "lastupdate": lmod_db,
+           "rows": pages[0]}
+    if pagesize is not None:
+        out["pagesize"] = pagesize
+        out["npages"] = len(pages)
+
+    with open(outfile, "wt") as fh:
+        fh.write(dump(out))
+
+    print(f"Created: {outfile} with {nrows} rows")
+
+    for page, prows in enumerate(pages[1:], 2):
+        outfile = f"{outhead}.{page}.json"
+        with open(outfile, "wt") as fh:
+            fh.write(dump({"page": page, "rows": prows}))
+
+    if len(pages) > 1:
+        print(f"Created: {outhead}.[2-{len(pages)}].json")
+
+    # Remove pages from previous runs.
+    #
+    pattern = re.compile(re.escape(outhead) + r"\.(\d+)\.json$")
+    for filename in sorted(os.listdir(".")):
+        match = pattern.match(filename)
+        if match is None or 2 <= int(match.group(1)) <= len(pages):
+            continue
+
+        os.remove(filename)
+        print(f"Removed: {filename}")
+
+
+def write_txt(processing, lmod_db, stack_count, catalog):
     """The text status page."""
 
-    indir = Path("ian-2022-02-07")
-    status = stackdata.find_stack_status(indir)
-    all_obis = stackdata.find_stack_obis(indir)
+    status = catalog.status
+    all_obis = catalog.obis
     outfile = "stacks-2.1.txt"
 
     with open(outfile, "wt") as fh:
@@ -427,105 +677,840 @@ def write_txt(processing, lmod_db, stack_count):
     print(f"Created: {outfile}")
 
 
+def chunk_header(ntotal, colorder, quant=None):
+    """The start of the chunk, up to the rows.
+
+    The chunk is written out as if json.dumps had been called with
+    sort_keys=True, so the keys are cols, ntotal, rows, start (with
+    quant, if set, before rows).
+    """
+
+    out = '{"cols": ' + json.dumps(colorder) + f', "ntotal": {ntotal}, '
+    if quant is not None:
+        out += '"quant": ' + json.dumps(quant, sort_keys=True) + ', '
+
+    return out + '"rows": '
+
+
+def chunk_trailer(start):
+    """The end of the chunk, after the rows."""
+
+    return f', "start": {start}}}'
+
+
+def columns_chunk(ntotal, start, colorder, table, quant=None):
+    """The chunk, as text, with the columns layout.
+
+    The rows field is replaced by columns, which is an object
+    containing the values of each column. As with the rows layout,
+    the keys are sorted.
+    """
+
+    out = '{"cols": ' + json.dumps(colorder) + ', "columns": ' + \
+        srcjson.encode_columns(table, precision=FLOAT_PRECISION) + \
+        f', "ntotal": {ntotal}, '
+    if quant is not None:
+        out += '"quant": ' + json.dumps(quant, sort_keys=True) + ', '
+
+    return out + f'"start": {start}}}'
+
+
+def write_chunk(outname, ntotal, start, colorder, table, compress=False,
+                quant=None, layout="rows"):
+    """Write out a chunk of the source data.
+
+    This may be run in a separate process, so the file name is
+    returned rather than displayed.
+    """
+
+    if layout == "columns":
+        with srcjson.open_output(outname, compress=compress) as fh:
+            fh.write(columns_chunk(ntotal, start, colorder, table,
+                                   quant=quant))
+
+        return outname
+
+    with srcjson.open_output(outname, compress=compress) as fh:
+        fh.write(chunk_header(ntotal, colorder, quant=quant))
+        fh.write(srcjson.encode_table(table, precision=FLOAT_PRECISION))
+        fh.write(chunk_trailer(start))
+
+    return outname
+
+
+def finalize_chunk(tmpname, outname, ntotal, start, colorder,
+                   compress=False, quant=None):
+    """Create the chunk from the rows spooled to tmpname.
+
+    This must match the output of write_chunk.
+    """
+
+    with srcjson.open_output(outname, compress=compress) as ofh:
+        ofh.write(chunk_header(ntotal, colorder, quant=quant))
+        with open(tmpname, 'r') as ifh:
+            shutil.copyfileobj(ifh, ofh)
+
+        ofh.write(chunk_trailer(start))
+
+    os.remove(tmpname)
+    return outname
+
+
 def write_sources(source_data,
                   outhead="wwt21_srcprop",
-                  chunksize=40000):
+                  chunksize=40000,
+                  compress=False,
+                  nproc=1,
+                  typed_arrays=False,
+                  quantize_data=False,
+                  layout="rows"):
     """Chunk up the source data
 
-    Should we reduce the accuracy of the numbers as
-    it can probably save a lot of space?
+    The numbers are written out with reduced accuracy (see
+    FLOAT_PRECISION) to save space. This used to be done by
+    changing the float type used by the json module (following
+    https://stackoverflow.com/a/69056325), which meant the slow
+    pure-Python encoder was used for all JSON output. The srcjson
+    module now does this a column at a time, and creates the same
+    output.
+
+    Write to wwt21_srcprop.*.json, or wwt21_srcprop.*.json.gz if
+    compress is set (the output is the same as gzip -n, in that it
+    does not depend on the time or file name, but the compressed
+    bytes are not guaranteed to match those from gzip). The chunks
+    are created by nproc processes.
+
+    The data is normally stored in the table field (a
+    srctable.SourceTable). In the streaming mode of
+    stackdata.get_source_properties there is instead a tables field,
+    which is an iterator of tables, and the total number of rows is
+    not known until the end. Each chunk is then written to a
+    temporary file as the rows are read, and the chunk files are
+    created once all the rows have been read, so only part of the
+    table is held in memory at a time. The output is the same in
+    both cases.
+
+    If typed_arrays is set then each chunk is also written out in
+    the binary format of srcbinary.py, as wwt21_srcprop.*.bin (or
+    .bin.gz). This is not supported in the streaming mode.
+
+    If quantize_data is set then the positions and fluxes are
+    written out as integers (see quantize.py), and each chunk has a
+    quant field describing how to convert them back. The maximum
+    errors this introduces are displayed, and stored in the
+    quant_report field of source_data.
+
+    The layout argument is either "rows", where the chunk contains
+    a rows field which lists the values for each row, or "columns",
+    where the chunk instead contains a columns field, which maps
+    each column name to a list of its values (see LAYOUTS). The
+    columns layout is not supported in the streaming mode.
 
-    See
-    https://stackoverflow.com/questions/54370322/how-to-limit-the-number-of-float-digits-jsonencoder-produces
-    which suggests that over-riding JSONEncoder is surprisingly hard,
-    so I'm going with the "direct" manipulation suggested at
-    https://stackoverflow.com/a/69056325 which is somewhat more
-    dangerous as it "infects" all JSON use. So far it should be okay
-    here (as the only two places we write out JSON are here and in the
-    status case, which doesn't write out floats).
+    """
 
-    Write to wwt21_srcprop.*.json
+    if layout not in LAYOUTS:
+        raise ValueError(f"Unknown layout: {layout}")
 
-    """
+    if "table" not in source_data:
+        if typed_arrays:
+            raise ValueError("The binary chunks can not be created when streaming")
+
+        if layout != "rows":
+            raise ValueError("Only the rows layout is supported when streaming")
+
+        write_sources_stream(source_data, outhead=outhead,
+                             chunksize=chunksize, compress=compress,
+                             nproc=nproc, quantize_data=quantize_data)
+        return
+
+    table = source_data["table"]
+    colorder = source_data["order"]
+
+    quant = None
+    if quantize_data:
+        qtable, quant = quantize.quantize_table(table)
+        report = quantize.error_report(table, qtable, quant)
+        quantize.print_report(report)
+        source_data["quant_report"] = report
+        table = qtable
 
-    ntotal = len(source_data["rows"])
+    ntotal = len(table)
 
     start = 0
     end = start + chunksize
 
     ctr = 1
 
-    colorder = source_data["order"]
+    suffix = "json.gz" if compress else "json"
 
     print("Starting output: " +
-          "nrows={} chunksize={}".format(ntotal, chunksize))
+          "nrows={} chunksize={} nproc={}".format(ntotal, chunksize, nproc))
+    jobs = []
     while start <= ntotal:
-        outname = "{}.{}.json".format(outhead, ctr)
-
-        # Use an ordered dict so that we can be sure it serializes
-        # the same if the input data is the same. This isn't needed
-        # any more, but leave in.
-        #
-        js = OrderedDict()
-        js['ntotal'] = ntotal
-        js['start'] = start
-        js['cols'] = colorder
-        js['rows'] = source_data['rows'][start:end]
-
-        open(outname, 'w').write(json.dumps(js, sort_keys=True,
-                                            allow_nan=False))
-        print("Created: {}".format(outname))
+        outname = "{}.{}.{}".format(outhead, ctr, suffix)
+        jobs.append((outname, ntotal, start, colorder, table[start:end],
+                     compress, quant, layout))
 
         start += chunksize
         end += chunksize
         ctr += 1
 
-    # We store the number of chunks so it can be written to the status
-    # file.
+    for outname in srcjson.run_jobs(write_chunk, jobs, nproc=nproc):
+        print("Created: {}".format(outname))
+
+    if typed_arrays:
+        suffix = "bin.gz" if compress else "bin"
+        jobs = [("{}.{}.{}".format(outhead, idx, suffix), *job[1:7])
+                for idx, job in enumerate(jobs, 1)]
+        for outname in srcjson.run_jobs(srcbinary.write_chunk, jobs,
+                                        nproc=nproc):
+            print("Created: {}".format(outname))
+
+    # We store the number of chunks (and sources) so it can be written
+    # to the status file.
     #
+    source_data["nsources"] = ntotal
     source_data["nchunks"] = ctr - 1
+    source_data["starts"] = [job[2] for job in jobs]
+    print(f"Number of chunks: {source_data['nchunks']}")
+
+
+def write_sources_stream(source_data,
+                         outhead="wwt21_srcprop",
+                         chunksize=40000,
+                         compress=False,
+                         nproc=1,
+                         quantize_data=False):
+    """Chunk up the source data as it is read in.
+
+    See write_sources. Only the creation of the chunks from the
+    temporary files is done in parallel.
+    """
+
+    colorder = source_data["order"]
+
+    print("Starting streaming output: " +
+          "chunksize={}".format(chunksize))
+
+    def start_chunk():
+        starts.append(ntotal)
+        outname = "{}.{}.json.tmp".format(outhead, len(starts))
+        fh = open(outname, 'w')
+        fh.write("[")
+        return fh
+
+    ntotal = 0
+    nchunk = 0
+    starts = []
+    names = []
+    quant = None
+    reports = []
+    fh = start_chunk()
+
+    for table in source_data["tables"]:
+        names.append(table["name"].values)
+        if quantize_data:
+            qtable, quant = quantize.quantize_table(table)
+            reports.append(quantize.error_report(table, qtable, quant))
+            table = qtable
+
+        rows = srcjson.encode_rows(table, precision=FLOAT_PRECISION)
+        while len(rows) > 0:
+            if nchunk == chunksize:
+                fh.write("]")
+                fh.close()
+                fh = start_chunk()
+                nchunk = 0
+
+            n = min(len(rows), chunksize - nchunk)
+            if nchunk > 0:
+                fh.write(", ")
+
+            fh.write(", ".join(rows[:n]))
+            rows = rows[n:]
+            nchunk += n
+            ntotal += n
+
+    # The original code always writes out a chunk after the last
+    # full one, even if it is empty, so we do the same here.
+    #
+    if nchunk == chunksize:
+        fh.write("]")
+        fh.close()
+        fh = start_chunk()
+
+    fh.write("]")
+    fh.close()
+
+    suffix = "json.gz" if compress else "json"
+    jobs = []
+    for ctr, start in enumerate(starts, 1):
+        tmpname = "{}.{}.json.tmp".format(outhead, ctr)
+        outname = "{}.{}.{}".format(outhead, ctr, suffix)
+        jobs.append((tmpname, outname, ntotal, start, colorder, compress,
+                     quant))
+
+    for outname in srcjson.run_jobs(finalize_chunk, jobs, nproc=nproc):
+        print("Created: {}".format(outname))
+
+    print(f"Number of rows: {ntotal}")
+    if quantize_data:
+        report = quantize.merge_reports(reports)
+        quantize.print_report(report)
+        source_data["quant_report"] = report
+
+    source_data["nsources"] = ntotal
+    source_data["nchunks"] = len(starts)
+    source_data["starts"] = starts
+    source_data["names"] = np.concatenate(names) if len(names) > 0 \
+        else np.zeros(0, dtype=str)
+    print(f"Number of chunks: {source_data['nchunks']}")
+
+
+def write_rows_chunk(outname, colorder, rows, compress=False):
+    """Write out a chunk for the incremental mode.
+
+    The rows have already been converted to JSON. Unlike write_chunk
+    there is no ntotal or start field, since these would change
+    whenever a source was added or removed before the chunk. The
+    file is written to a temporary name and then renamed, so that a
+    partially-written file can not be mistaken for a complete one.
+    """
+
+    tmpname = f"{outname}.tmp"
+    with srcjson.open_output(tmpname, compress=compress) as fh:
+        fh.write(incremental_header(colorder))
+        fh.write(", ".join(rows))
+        fh.write("]}")
+
+    os.replace(tmpname, outname)
+    return outname
+
+
+def incremental_header(colorder):
+    """The start of an incremental chunk, up to the rows."""
+
+    return '{"cols": ' + json.dumps(colorder) + ', "rows": ['
+
+
+def write_sources_incremental(source_data,
+                              outhead="wwt21_srcprop",
+                              chunksize=40000,
+                              compress=False,
+                              nproc=1):
+    """Update the chunks from the previous run.
+
+    The chunk boundaries are chosen to match the previous run as
+    closely as possible (see srcmanifest.chunk_starts), using the
+    state stored in <outhead>.state.npz, and the chunk files are
+    named by the hash of their contents, so only those chunks
+    which have changed need to be written out. Chunk files that are
+    not used by this run or the previous one are deleted (the files
+    of the previous run are kept, since the current status file, and
+    any client which has downloaded it, still refers to them).
+
+    The source_data dictionary gets a manifest field, which lists
+    the file, hash, start row, and number of rows of each chunk.
+    """
+
+    if "table" not in source_data:
+        raise ValueError("The incremental mode does not support streaming")
+
+    table = source_data["table"]
+    colorder = source_data["order"]
+    ntotal = len(table)
+
+    statefile = f"{outhead}.state.npz"
+    previous = srcmanifest.read_state(statefile)
+
+    rows = srcjson.encode_rows(table, precision=FLOAT_PRECISION)
+    names = table["name"].text()
+    hashes = srcmanifest.row_hashes(rows)
+
+    if previous is None:
+        print(f"No previous state found in {statefile}")
+    else:
+        nadd, nremove, nchange = srcmanifest.compare_sources(previous,
+                                                             names, hashes)
+        print(f"Sources: {nadd} added, {nremove} removed, {nchange} changed")
+
+    starts = srcmanifest.chunk_starts(names, chunksize, previous=previous)
+    ends = np.append(starts[1:], ntotal)
+
+    header = incremental_header(colorder)
+    suffix = "json.gz" if compress else "json"
+
+    manifest = []
+    jobs = []
+    for start, end in zip(starts.tolist(), ends.tolist()):
+        hashval = srcmanifest.chunk_hash(header, hashes[start:end])
+        outname = srcmanifest.chunk_filename(outhead, hashval, suffix)
+        manifest.append({"file": outname, "hash": hashval,
+                         "start": start, "nrows": end - start})
+        if not os.path.exists(outname):
+            jobs.append((outname, colorder, rows[start:end], compress))
+
+    print("Starting incremental output: " +
+          "nrows={} nchunks={} changed={}".format(ntotal, len(manifest),
+                                                  len(jobs)))
+    for outname in srcjson.run_jobs(write_rows_chunk, jobs, nproc=nproc):
+        print("Created: {}".format(outname))
+
+    files = [chunk["file"] for chunk in manifest]
+    keep = set(files)
+    if previous is not None:
+        keep.update(previous["files"].tolist())
+
+    # Also keep the compressed versions (see precompress.py).
+    #
+    for name in list(keep):
+        keep.update(precompress.output_names(name))
+
+    outdir = os.path.dirname(outhead)
+    for name in os.listdir(outdir or "."):
+        name = os.path.join(outdir, name)
+        if name in keep or \
+           not srcmanifest.is_chunk_filename(name, outhead):
+            continue
+
+        os.remove(name)
+        print(f"Removed: {name}")
+
+    changed = previous is None or len(jobs) > 0 or \
+        not np.array_equal(previous["hashes"], hashes) or \
+        not np.array_equal(previous["names"].astype(str), names) or \
+        previous["files"].tolist() != files
+    if changed:
+        srcmanifest.write_state(statefile, names, hashes, starts, files)
+
+    source_data["nsources"] = ntotal
+    source_data["nchunks"] = len(manifest)
+    source_data["starts"] = [chunk["start"] for chunk in manifest]
+    source_data["manifest"] = manifest
     print(f"Number of chunks: {source_data['nchunks']}")
 
 
-def doit(stackfile):
+def write_tile(outname, colorder, rows):
+    """Write out the sources (converted to JSON) in a tile.
+
+    The file is always compressed. The file name and size are
+    returned.
+    """
+
+    with srcjson.open_output(outname, compress=True) as fh:
+        fh.write(incremental_header(colorder))
+        fh.write(", ".join(rows))
+        fh.write("]}")
+
+    return outname, os.path.getsize(outname)
+
+
+def write_tiles(source_data, order,
+                outhead="wwt21_srctile",
+                manifest="wwt21_srctiles.json",
+                nproc=1):
+    """Split the sources into HEALPix tiles.
+
+    The sources are assigned to the NESTED HEALPix pixels of the
+    given order (there are 12 * 4^order pixels; for order=4 each is
+    about 3.7 degrees on a side) and each non-empty tile is written
+    to <outhead>.<order>.<pixel>.json.gz, with the same cols and rows
+    fields as the incremental chunks. Within a tile the sources are
+    in the same order as the full table.
+
+    The manifest file lists the HEALPix settings, the columns, and
+    the pixel number, number of sources, and file size (in bytes)
+    of each tile, so a viewer only needs to download the tiles that
+    overlap the area it is showing.
+
+    Tiles from a previous run which are now empty are deleted.
+    """
+
+    if "table" not in source_data:
+        raise ValueError("The tiles can not be created when streaming")
+
+    table = source_data["table"]
+    colorder = source_data["order"]
+
+    ra = table["ra"]
+    dec = table["dec"]
+    if ra.mask.any() or dec.mask.any():
+        raise ValueError("There are sources with no position")
+
+    pix = healpix.ang2pix_nest(order, ra.values, dec.values)
+    idx = np.argsort(pix, kind="stable")
+    pix = pix[idx]
+
+    # The tiles are small, so it is quicker to convert all the rows
+    # in one go than tile by tile.
+    #
+    rows = np.asarray(srcjson.encode_rows(table, precision=FLOAT_PRECISION),
+                      dtype=object)[idx].tolist()
+
+    pixels, starts = np.unique(pix, return_index=True)
+    ends = np.append(starts[1:], len(pix))
+
+    print("Starting tiled output: " +
+          "nrows={} order={} ntiles={}".format(len(rows), order,
+                                               len(pixels)))
+    jobs = []
+    for pixel, start, end in zip(pixels.tolist(), starts.tolist(),
+                                 ends.tolist()):
+        outname = f"{outhead}.{order}.{pixel}.json.gz"
+        jobs.append((outname, colorder, rows[start:end]))
+
+    nbytes = [nbyte for _, nbyte in
+              srcjson.run_jobs(write_tile, jobs, nproc=nproc)]
+
+    keep = set(job[0] for job in jobs)
+    outdir = os.path.dirname(outhead)
+    prefix = os.path.basename(outhead) + "."
+    for name in os.listdir(outdir or "."):
+        name = os.path.join(outdir, name)
+        if name in keep or \
+           not os.path.basename(name).startswith(prefix) or \
+           not name.endswith(".json.gz"):
+            continue
+
+        os.remove(name)
+        print(f"Removed: {name}")
+
+    out = {"scheme": "healpix-nested",
+           "order": order,
+           "nside": healpix.order_to_nside(order),
+           "file": f"{outhead}.{order}.{{pixel}}.json.gz",
+           "cols": colorder,
+           "ntotal": len(rows),
+           "tiles": [[pixel, int(end - start), nbyte]
+                     for pixel, start, end, nbyte in
+                     zip(pixels.tolist(), starts, ends, nbytes)]}
+
+    with open(manifest, "wt") as fh:
+        fh.write(json.dumps(out))
+
+    print(f"Created: {manifest} with {len(pixels)} tiles " +
+          f"({sum(nbytes)} bytes)")
+
+
+def write_stack_index(source_data, assoc,
+                      outname="wwt21_stack_sources.json",
+                      compress=False):
+    """Write out the stack to source-row index.
+
+    The assoc argument is the output of stackdata.get_stack_assoc,
+    and the rows refer to the position of the source in the
+    source-property table (see stackindex.py). This must be called
+    after write_sources (or one of its variants).
+    """
+
+    if "table" in source_data:
+        srcnames = source_data["table"]["name"].values
+    else:
+        srcnames = source_data["names"]
+
+    index = stackindex.build(srcnames, assoc["name"], assoc["stack"])
+    if compress:
+        outname += ".gz"
+
+    stackindex.write(outname, index, len(srcnames), compress=compress)
+    print(f"Created: {outname} with {len(index['stacks'])} stacks " +
+          f"({index['nmissing']} unmatched pairs)")
+
+
+def write_name_index(source_data,
+                     outname="wwt21_srcnames.json",
+                     compress=False):
+    """Write out the sorted index of source names.
+
+    This maps a source name to the chunk containing it, and the row
+    in the chunk (see nameindex.py). The chunk number refers to the
+    wwt21_srcprop.<n>.json files, or the n'th entry of the manifest
+    in incremental mode. This must be called after write_sources (or
+    one of its variants).
+    """
+
+    if "table" in source_data:
+        srcnames = source_data["table"]["name"].values
+    else:
+        srcnames = source_data["names"]
+
+    index = nameindex.build(srcnames, source_data["starts"])
+    if compress:
+        outname += ".gz"
+
+    nameindex.write(outname, index, compress=compress)
+    print(f"Created: {outname} with {len(index['first'])} blocks")
+
+
+def write_source_stats(source_data, outname="wwt21_srcstats.json"):
+    """Write out the summary statistics of the source properties.
+
+    See srcstats.py. This is not supported in the streaming mode,
+    since the table is not kept.
+    """
+
+    if "table" not in source_data:
+        print(f"Skipping {outname} as the sources were streamed")
+        return
+
+    t0 = time.time()
+    stats = srcstats.build(source_data["table"])
+    with open(outname, "wt") as fh:
+        fh.write(json.dumps(stats))
+
+    print(f"Created: {outname} with {len(stats['columns'])} columns " +
+          f"({time.time() - t0:.2f} seconds)")
+
+
+def precompress_sources(outhead="wwt21_srcprop", nproc=1):
+    """Write out the compressed versions of the source-property chunks.
+
+    See precompress.py: the brotli and zstandard versions are created
+    if the modules are installed, along with the gzip version if the
+    chunk is not compressed. This includes the binary chunks. A file
+    is only re-written if its contents have changed.
+    """
+
+    pat = re.escape(outhead) + r"\.[^.]+\.(json|bin)(\.gz)?"
+    infiles = sorted(name for name in os.listdir(".")
+                     if re.fullmatch(pat, name) is not None)
+    if len(infiles) == 0:
+        print(f"Skipping precompress as there are no {outhead} files")
+        return
+
+    precompress.doit(infiles, precompress.available_formats(), nproc=nproc)
+
+
+def doit(stackfile, stream=False, binary=False, compress=False, nproc=1,
+         incremental=False, tile_order=None, typed_arrays=False,
+         tap_parts=1, tap_workers=4, tap_url=stackdata.TAP_URL,
+         quantize_data=False, layout="rows",
+         status_pagesize=None, status_layout="dicts", precompress_data=True):
 
     infile = Path(stackfile)
     if not infile.is_file():
         raise OSError(f"stackfile={stackfile} does not exist")
 
-    processing, lmod_db = read_status(infile)
-
-    # Try to get the number of sources in each processed stack.
-    # This is done later than infile was created so may contain more
-    # stacks than infile does. Hopefully it will not contain less.
+    # The steps are run as a graph of stages (see stagegraph.py), so
+    # that the two TAP queries, the local parsing, and the status
+    # pages can run at the same time. Each stage is listed with the
+    # stages whose results it needs.
     #
-    stack_count = stackdata.get_stack_numbers()
+    def get_stack_count(stack_assoc):
+        return stackdata.count_stack_sources(stack_assoc)
 
     # It would be nice to hide those sources we technically don't know
     # about, but let's not worry about that here.
     #
-    source_data = stackdata.get_source_properties()
+    # In streaming mode the query is only run as write_sources
+    # reads the rows.
+    #
+    def get_sources():
+        return stackdata.get_source_properties(stream=stream,
+                                               binary=binary,
+                                               nparts=tap_parts,
+                                               nworkers=tap_workers,
+                                               url=tap_url)
+
+    # This must be called before write_json and the index writers.
+    def write_srcprop(source_data):
+        if incremental:
+            write_sources_incremental(source_data, compress=compress,
+                                      nproc=nproc)
+        else:
+            write_sources(source_data, compress=compress, nproc=nproc,
+                          typed_arrays=typed_arrays,
+                          quantize_data=quantize_data,
+                          layout=layout)
 
-    # This must be called before write_json
-    write_sources(source_data)
+        return source_data
 
-    write_json(processing, lmod_db, stack_count, source_data)
-    write_xml(processing, lmod_db, stack_count)
-    write_txt(processing, lmod_db, stack_count)
+    # The stack lists are only parsed once (or, when the cache is
+    # used, read from the snapshot if they have not changed).
+    #
+    def get_catalog():
+        return stackdata.StackCatalog.load(Path("ian-2022-02-07"),
+                                           use_snapshot=respcache.settings["mode"] in ["use", "offline"])
+
+    stages = {
+        "status": (lambda: read_status(infile), []),
+
+        # Try to get the number of sources in each processed stack.
+        # This is done later than infile was created so may contain
+        # more stacks than infile does. Hopefully it will not contain
+        # less.
+        #
+        # The association is also used for the stack index.
+        #
+        "stack_assoc": (lambda: stackdata.get_stack_assoc(nparts=tap_parts,
+                                                          nworkers=tap_workers,
+                                                          url=tap_url), []),
+        "stack_count": (get_stack_count, ["stack_assoc"]),
+        "catalog": (get_catalog, []),
+        "sources": (get_sources, []),
+        "write_sources": (write_srcprop, ["sources"]),
+        "write_stack_index": (lambda sd, assoc: write_stack_index(sd, assoc, compress=compress),
+                              ["write_sources", "stack_assoc"]),
+        "write_name_index": (lambda sd: write_name_index(sd, compress=compress),
+                             ["write_sources"]),
+        "write_source_stats": (write_source_stats, ["write_sources"]),
+        "write_json": (lambda status, count, sd: write_json(*status, count, sd,
+                                                            layout=status_layout),
+                       ["status", "stack_count", "write_sources"]),
+        "write_xml": (lambda status, count, cat: write_xml(*status, count, cat),
+                      ["status", "stack_count", "catalog"]),
+        "write_txt": (lambda status, count, cat: write_txt(*status, count, cat),
+                      ["status", "stack_count", "catalog"]),
+        "write_status_table": (lambda status, count, cat:
+                               write_status_table(*status, count, cat,
+                                                  pagesize=status_pagesize),
+                               ["status", "stack_count", "catalog"])
+    }
+
+    if tile_order is not None:
+        stages["write_tiles"] = (lambda sd: write_tiles(sd, tile_order, nproc=nproc),
+                                 ["write_sources"])
+
+    # The compression is slow, so it is left until the chunks and
+    # the status file have been written.
+    #
+    if precompress_data:
+        stages["precompress"] = (lambda sd, _: precompress_sources(nproc=nproc),
+                                 ["write_sources", "write_json"])
+
+    _, timings = stagegraph.run_stages(stages)
+    stagegraph.print_timings(timings)
+
+
+help_str = """Create the status data for CSC 2.1."""
 
 
 if __name__ == "__main__":
 
-    nargs = len(sys.argv)
-    if nargs == 2:
-        stackfile = sys.argv[1]
+    import argparse
 
-    elif nargs == 1:
-        stackfile = "/home/ascdsops/l3stacks/cat21_stack_status.lis"
+    parser = argparse.ArgumentParser(description=help_str,
+                                     prog=sys.argv[0])
 
-    else:
-        sys.stderr.write(f"Usage: {sys.argv[0]} [stackfile]\n")
-        sys.exit(1)
+    parser.add_argument('stackfile', type=str, nargs='?',
+                        default="/home/ascdsops/l3stacks/cat21_stack_status.lis",
+                        help='The stack status file (default: %(default)s)')
+    parser.add_argument('--stream', action='store_true',
+                        help='Process the source properties as they are downloaded, to limit memory use')
+    parser.add_argument('--binary', action='store_true',
+                        help='Request the source properties as a BINARY2 VOTABLE (requires NumPy)')
+
+    parser.add_argument('--gzip', action='store_true',
+                        help='Write the source properties as .json.gz files')
+    parser.add_argument('--nproc', type=int, default=1,
+                        help='Number of processes used to write the source properties (default: %(default)s)')
+
+    parser.add_argument('--incremental', action='store_true',
+                        help='Only write out the source-property chunks that have changed')
+
+    parser.add_argument('--tiles', type=int, default=None, metavar='order',
+                        help='Also write out the source properties in HEALPix tiles of this order')
+
+    parser.add_argument('--typed-arrays', action='store_true',
+                        help='Also write out the source properties in a binary format')
+
+    parser.add_argument('--quantize', action='store_true',
+                        help='Write the positions and fluxes as integers')
+
+    parser.add_argument('--layout', choices=LAYOUTS, default="rows",
+                        help='Store the source properties by row or column (default: %(default)s)')
+
+    parser.add_argument('--tap-parts', type=int, default=1,
+                        help='Split the TAP queries into this many name ranges (default: %(default)s)')
+    parser.add_argument('--tap-workers', type=int, default=4,
+                        help='The number of TAP queries to run at once (default: %(default)s)')
+    parser.add_argument('--tap-url', type=str, default=stackdata.TAP_URL,
+                        help='The TAP service (default: %(default)s)')
+
+    cache = parser.add_mutually_exclusive_group()
+    cache.add_argument('--cache', action='store_true',
+                       help='Use the cached archive queries if they have not expired')
+    cache.add_argument('--refresh', action='store_true',
+                       help='Re-run the archive queries even if they are cached')
+    cache.add_argument('--offline', action='store_true',
+                       help='Only use the cached archive queries')
+    cache.add_argument('--no-cache', action='store_true',
+                       help='Do not use the cache of archive queries')
+    parser.add_argument('--cache-ttl', type=float, default=None,
+                        help=f'Use the cache, where a cached query can be used for this many seconds (default: {respcache.settings["ttl"]})')
+    parser.add_argument('--cache-dir', type=str, default=None,
+                        help=f'Use the cache, stored in this directory (default: {respcache.settings["cachedir"]})')
+
+    parser.add_argument('--status-pagesize', type=int, default=None,
+                        help='Split the status table data into files with this many rows')
+    parser.add_argument('--status-layout', choices=statusjson.LAYOUTS, default="dicts",
+                        help='Store the stack status by stack id or as arrays (default: %(default)s)')
+    parser.add_argument('--no-precompress', action='store_true',
+                        help='Do not write the brotli and zstandard versions of the source properties')
 
-    doit(stackfile)
+    args = parser.parse_args(sys.argv[1:])
+    if args.stream and args.binary:
+        parser.error("--stream and --binary can not be combined")
+
+    if args.stream and args.incremental:
+        parser.error("--stream and --incremental can not be combined")
+
+    if args.stream and args.tiles is not None:
+        parser.error("--stream and --tiles can not be combined")
+
+    if args.typed_arrays and (args.stream or args.incremental):
+        parser.error("--typed-arrays can not be combined with --stream or --incremental")
+
+    if args.layout != "rows" and (args.stream or args.incremental):
+        parser.error("--layout columns can not be combined with --stream or --incremental")
+
+    if args.quantize and (args.incremental or args.tiles is not None):
+        parser.error("--quantize can not be combined with --incremental or --tiles")
+
+    if args.tiles is not None and (args.tiles < 0 or args.tiles > 13):
+        parser.error("--tiles must be in the range 0 to 13")
+
+    if args.nproc < 1:
+        parser.error("--nproc must be 1 or more")
+
+    if args.status_pagesize is not None and args.status_pagesize < 1:
+        parser.error("--status-pagesize must be 1 or more")
+
+    if args.tap_parts < 1 or args.tap_parts > 24:
+        parser.error("--tap-parts must be in the range 1 to 24")
+
+    if args.tap_workers < 1:
+        parser.error("--tap-workers must be 1 or more")
+
+    if args.stream and args.tap_parts > 1:
+        parser.error("--stream can not be used with --tap-parts")
+
+    if args.cache_ttl is not None and args.cache_ttl < 0:
+        parser.error("--cache-ttl must be 0 or more")
+
+    # The cache is off unless asked for (see respcache.settings).
+    #
+    if args.refresh:
+        mode = "refresh"
+    elif args.offline:
+        mode = "offline"
+    elif args.no_cache:
+        mode = "off"
+    elif args.cache or args.cache_ttl is not None or args.cache_dir is not None:
+        mode = "use"
+    else:
+        mode = None
+
+    respcache.configure(cachedir=args.cache_dir, ttl=args.cache_ttl,
+                        mode=mode)
+
+    doit(args.stackfile, stream=args.stream, binary=args.binary,
+         compress=args.gzip, nproc=args.nproc,
+         incremental=args.incremental, tile_order=args.tiles,
+         typed_arrays=args.typed_arrays, tap_parts=args.tap_parts,
+         tap_workers=args.tap_workers, tap_url=args.tap_url,
+         quantize_data=args.quantize,
+         layout=args.layout, status_pagesize=args.status_pagesize,
+         status_layout=args.status_layout,
+         precompress_data=not args.no_precompress)
     print("Completed make_status.py")
@@ -0,0 +1,193 @@
+"""
+A sorted index of the source names, so that the chunk containing a
+source can be found without downloading all the chunks.
+
+The index is a JSON file with the fields
+
+  nsources   the number of sources
+  chunks     the first row of each chunk (so the k'th chunk, counting
+             from 1, contains rows chunks[k - 1] to chunks[k] - 1)
+  blocksize  the number of names in each block
+  first      the first name of each block
+  blocks     the names in each block, front coded (see below)
+  rows       the row of each name (in sorted order) in the
+             source-property table, or null if the table is sorted
+             by name (so the row is the position in the sorted list)
+
+To find a name, binary search first to find the block, and then
+decode the block to find the position of the name in the block. The
+position in the sorted list is the block number times blocksize
+plus the position in the block.
+
+The names in a block are sorted and front coded: each name is
+written as a single character, chr(48 + n), where n is the number
+of leading characters it shares with the previous name in the block
+(n is 0 for the first name in the block), followed by the remaining
+characters. The names are joined together with a "|" character.
+
+Requires NumPy.
+
+"""
+
+import bisect
+import gzip
+import json
+
+import numpy as np
+
+import srcjson
+
+
+# The maximum shared prefix length that can be encoded (so that the
+# character code is at most 'z').
+#
+MAX_PREFIX = ord("z") - 48
+
+SEPARATOR = "|"
+
+
+def shared_prefix(a, b):
+    """The number of leading characters a and b have in common."""
+
+    n = min(len(a), len(b), MAX_PREFIX)
+    for idx in range(n):
+        if a[idx] != b[idx]:
+            return idx
+
+    return n
+
+
+def encode_block(names):
+    """Front code the names (which must be sorted)."""
+
+    out = []
+    prev = ""
+    for name in names:
+        if SEPARATOR in name:
+            raise ValueError(f"Name contains {SEPARATOR}: {name}")
+
+        n = shared_prefix(prev, name)
+        out.append(chr(48 + n) + name[n:])
+        prev = name
+
+    return SEPARATOR.join(out)
+
+
+def decode_block(block):
+    """Return the names in the block."""
+
+    out = []
+    prev = ""
+    for tok in block.split(SEPARATOR):
+        name = prev[:ord(tok[0]) - 48] + tok[1:]
+        out.append(name)
+        prev = name
+
+    return out
+
+
+def find_in_block(block, name):
+    """Return the position of name in the block, or -1.
+
+    The names are sorted, so the search stops once a name after
+    the requested one is found.
+    """
+
+    prev = ""
+    for pos, tok in enumerate(block.split(SEPARATOR)):
+        prev = prev[:ord(tok[0]) - 48] + tok[1:]
+        if prev >= name:
+            return pos if prev == name else -1
+
+    return -1
+
+
+def build(names, chunks, blocksize=64):
+    """Create the index.
+
+    Parameters
+    ----------
+    names : sequence of str
+        The source names, in the order of the source-property
+        table. They must be unique.
+    chunks : sequence of int
+        The first row of each chunk.
+    blocksize : int
+        The number of names per block.
+
+    Returns
+    -------
+    index : dict
+        The fields of the JSON file (see the module documentation).
+    """
+
+    names = np.asarray(names, dtype=str)
+    order = np.argsort(names, kind="stable")
+    snames = names[order].tolist()
+    for prev, name in zip(snames, snames[1:]):
+        if prev == name:
+            raise ValueError(f"Name is not unique: {name}")
+
+    if np.array_equal(order, np.arange(len(names))):
+        rows = None
+    else:
+        rows = order.tolist()
+
+    starts = range(0, len(snames), blocksize)
+    return {"nsources": len(snames),
+            "chunks": [int(chunk) for chunk in chunks],
+            "blocksize": blocksize,
+            "first": [snames[start] for start in starts],
+            "blocks": [encode_block(snames[start:start + blocksize])
+                       for start in starts],
+            "rows": rows}
+
+
+def write(outname, index, compress=False):
+    """Write out the index."""
+
+    with srcjson.open_output(outname, compress=compress) as fh:
+        fh.write(json.dumps(index))
+
+
+def read(filename):
+    """Read in the index (which may be gzip-compressed)."""
+
+    with open(filename, "rb") as fh:
+        cts = fh.read()
+
+    if cts[:2] == b"\x1f\x8b":
+        cts = gzip.decompress(cts)
+
+    return json.loads(cts)
+
+
+def find_row(index, name):
+    """Return the row of the source in the source-property table.
+
+    A KeyError is raised if the name is not known.
+    """
+
+    bnum = bisect.bisect_right(index["first"], name) - 1
+    if bnum < 0:
+        raise KeyError(name)
+
+    pos = find_in_block(index["blocks"][bnum], name)
+    if pos < 0:
+        raise KeyError(name)
+
+    idx = bnum * index["blocksize"] + pos
+    rows = index["rows"]
+    return idx if rows is None else rows[idx]
+
+
+def lookup(index, name):
+    """Return the chunk number (starting at 1) and the row in the chunk.
+
+    A KeyError is raised if the name is not known.
+    """
+
+    row = find_row(index, name)
+    chunks = index["chunks"]
+    chunk = bisect.bisect_right(chunks, row)
+    return chunk, row - chunks[chunk - 1]
@@ -0,0 +1,268 @@
+#!/usr/bin/env python
+
+"""Usage:
+
+  ./precompress.py file [file ...] [--formats gz,br,zst] [--nproc n]
+
+Aim:
+
+Write out brotli (.br) and zstandard (.zst) versions of the data
+files, alongside the gzip versions, so that the web server can send
+the best encoding the browser supports. The files can be JSON files
+or their gzip-compressed versions - e.g.
+
+  ./precompress.py wwtdata/wwt21_srcprop.*.json.gz wwtdata/xmm.json.gz
+
+creates wwtdata/wwt21_srcprop.1.json.br and
+wwtdata/wwt21_srcprop.1.json.zst, and so on. If the input is not
+compressed then the .gz version is also created (with no file name or
+time stamp, as with gzip -n).
+
+The output is deterministic - the same contents give the same file -
+and a file is only re-written when its contents change, so that a
+diff-based copy (as in create_pages.sh) only picks up the files that
+have changed. The files are processed in parallel, by nproc
+processes, and a table of the compressed sizes and decompression
+times is displayed.
+
+The brotli and zstandard modules are optional: a format whose module
+is not installed is skipped, unless it is explicitly requested with
+--formats, in which case it is an error.
+
+"""
+
+import gzip
+import os
+import sys
+import time
+
+import srcjson
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+# The compression settings. The highest levels are used since the
+# files are compressed once but downloaded many times.
+#
+BROTLI_QUALITY = 11
+ZSTD_LEVEL = 19
+
+FORMATS = ["gz", "br", "zst"]
+
+
+def available_formats():
+    """The formats that can be written."""
+
+    out = ["gz"]
+    if brotli is not None:
+        out.append("br")
+
+    if zstandard is not None:
+        out.append("zst")
+
+    return out
+
+
+def compress(data, fmt):
+    """Return the compressed data."""
+
+    if fmt == "gz":
+        return gzip.compress(data, compresslevel=6, mtime=0)
+
+    if fmt == "br":
+        return brotli.compress(data, mode=brotli.MODE_TEXT,
+                               quality=BROTLI_QUALITY)
+
+    if fmt == "zst":
+        cctx = zstandard.ZstdCompressor(level=ZSTD_LEVEL,
+                                        write_checksum=False,
+                                        write_content_size=True)
+        return cctx.compress(data)
+
+    raise ValueError(f"Unknown format: {fmt}")
+
+
+def decompress(data, fmt):
+
+    if fmt == "gz":
+        return gzip.decompress(data)
+
+    if fmt == "br":
+        return brotli.decompress(data)
+
+    if fmt == "zst":
+        return zstandard.ZstdDecompressor().decompress(data)
+
+    raise ValueError(f"Unknown format: {fmt}")
+
+
+def base_name(infile):
+    """The name of the uncompressed file."""
+
+    if infile.endswith(".gz"):
+        return infile[:-3]
+
+    return infile
+
+
+def output_names(infile, formats=FORMATS):
+    """The names of the compressed versions of infile."""
+
+    base = base_name(infile)
+    return [f"{base}.{fmt}" for fmt in formats]
+
+
+def write_if_changed(outname, data):
+    """Write out the data unless the file already contains it.
+
+    Returns True if the file was written.
+    """
+
+    try:
+        with open(outname, "rb") as fh:
+            if fh.read() == data:
+                return False
+
+    except FileNotFoundError:
+        pass
+
+    tmpname = f"{outname}.tmp"
+    with open(tmpname, "wb") as fh:
+        fh.write(data)
+
+    os.replace(tmpname, outname)
+    return True
+
+
+def process_file(infile, formats):
+    """Create the compressed versions of infile.
+
+    Returns the input name, the uncompressed size, and for each
+    format the output name, size, decompression time, and whether
+    the file was changed. This may be run in a separate process.
+    """
+
+    with open(infile, "rb") as fh:
+        data = fh.read()
+
+    if infile.endswith(".gz"):
+        data = gzip.decompress(data)
+
+    out = {}
+    for fmt, outname in zip(formats, output_names(infile, formats)):
+        if outname == infile:
+            with open(infile, "rb") as fh:
+                cdata = fh.read()
+
+            changed = False
+        else:
+            cdata = compress(data, fmt)
+            changed = write_if_changed(outname, cdata)
+
+        t0 = time.perf_counter()
+        if decompress(cdata, fmt) != data:
+            raise ValueError(f"Unable to decompress {outname}")
+
+        dt = time.perf_counter() - t0
+        out[fmt] = (outname, len(cdata), dt, changed)
+
+    return infile, len(data), out
+
+
+def doit(infiles, formats, nproc=1):
+
+    # Only process each file once, even if both the JSON file and its
+    # gzip version are given (in which case the JSON file is used).
+    #
+    todo = {}
+    for infile in infiles:
+        base = base_name(infile)
+        if base not in todo or todo[base].endswith(".gz"):
+            todo[base] = infile
+
+    jobs = [(infile, formats) for infile in todo.values()]
+    results = srcjson.run_jobs(process_file, jobs, nproc=nproc)
+
+    for _, _, out in results:
+        for outname, _, _, changed in out.values():
+            if changed:
+                print(f"Created: {outname}")
+
+    def kb(nbytes):
+        return nbytes / 1024
+
+    hdr = "# file".ljust(40) + "  raw (kB)"
+    for fmt in formats:
+        hdr += f"  {fmt + ' (kB)':>10s}  {fmt + ' (ms)':>8s}"
+
+    print(hdr)
+    totals = {fmt: [0, 0.0] for fmt in formats}
+    nraw = 0
+    for infile, size, out in results:
+        line = f"  {os.path.basename(base_name(infile)):38s}  {kb(size):8.1f}"
+        for fmt in formats:
+            _, csize, dt, _ = out[fmt]
+            line += f"  {kb(csize):10.1f}  {dt * 1000:8.1f}"
+            totals[fmt][0] += csize
+            totals[fmt][1] += dt
+
+        nraw += size
+        print(line)
+
+    line = f"  {'total':38s}  {kb(nraw):8.1f}"
+    for fmt in formats:
+        line += f"  {kb(totals[fmt][0]):10.1f}  {totals[fmt][1] * 1000:8.1f}"
+
+    print(line)
+
+
+help_str = "Create brotli and zstandard versions of the data files."
+
+
+if __name__ == "__main__":
+
+    import argparse
+
+    parser = argparse.ArgumentParser(description=help_str,
+                                     prog=sys.argv[0])
+
+    parser.add_argument('infiles', type=str, nargs='+',
+                        help='The JSON files (may be gzip-compressed)')
+    parser.add_argument('--formats', type=str, default=None,
+                        help=f'The formats to create, from {",".join(FORMATS)} (default: all those available)')
+    parser.add_argument('--nproc', type=int, default=os.cpu_count(),
+                        help='Number of processes to use (default: %(default)s)')
+
+    args = parser.parse_args(sys.argv[1:])
+    if args.nproc < 1:
+        parser.error("--nproc must be 1 or more")
+
+    available = available_formats()
+    if args.formats is None:
+        formats = available
+        for fmt in FORMATS:
+            if fmt not in available:
+                print(f"Skipping .{fmt} as the module is not installed")
+
+    else:
+        formats = args.formats.split(",")
+        for fmt in formats:
+            if fmt not in FORMATS:
+                parser.error(f"Unknown format: {fmt}")
+
+            if fmt not in available:
+                parser.error(f"The module for .{fmt} is not installed")
+
+    for infile in args.infiles:
+        if not os.path.isfile(infile):
+            parser.error(f"Unable to find {infile}")
+
+    doit(args.infiles, formats, nproc=args.nproc)
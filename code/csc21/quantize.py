@@ -0,0 +1,230 @@
+"""
+Fixed-point versions of the source positions and fluxes.
+
+Rounding the floating-point values (the old roundy routine) does not
+save much space, since the JSON still has to write out the decimal
+point and - for the fluxes - the exponent. Here the values are
+converted to integers, a column at a time:
+
+  - the positions (ra and dec) are stored as integer micro-degrees,
+    so the value is the integer times 1e-6 (the maximum error in
+    each coordinate is 0.5 micro-degrees, so the position is out by
+    at most 2.6 milli-arcseconds);
+
+  - the fluxes (the float columns whose name starts with flux) are
+    stored as a mantissa, m, with the given number of digits, and
+    a power-of-ten exponent, e, so the value is m * 10^e. The two
+    are packed into a single integer
+
+        q = sign * (m * 100 + e + 50)
+
+    so m = |q| // 100 and e = |q| % 100 - 50 (the exponent must be
+    in the range -50 to 49).
+
+The quant field returned by quantize_table describes the converted
+columns, and is written to the chunk, so that the values can be
+converted back (see dequantize_table):
+
+  {"ra": {"type": "scaled", "scale": 1e-06},
+   "flux_aper_b": {"type": "mantissa", "digits": 5}, ...}
+
+Null values stay null.
+
+Requires NumPy.
+
+"""
+
+import numpy as np
+
+import srctable
+
+
+COORD_COLUMNS = ["ra", "dec"]
+
+COORD_SCALE = 1e-6
+
+FLUX_DIGITS = 5
+
+EXPONENT_OFFSET = 50
+
+
+def flux_columns(table):
+    """The names of the flux columns in the table."""
+
+    return [name for name in table.names
+            if name.startswith("flux") and
+            table[name].values.dtype.kind == "f"]
+
+
+def quantize_scaled(col, scale):
+    """Return the column as integer multiples of scale."""
+
+    values = np.where(col.mask, 0, col.values)
+    out = np.rint(values / scale).astype(np.int64)
+    return srctable.Column(out, col.mask.copy())
+
+
+def dequantize_scaled(col, scale):
+
+    # Dividing by 10^6, rather than multiplying by 1e-6, gives the
+    # closest float to the decimal value.
+    #
+    values = col.values / np.round(1 / scale)
+    return srctable.Column(np.where(col.mask, 0, values), col.mask.copy())
+
+
+def quantize_mantissa(col, digits=FLUX_DIGITS):
+    """Return the column as packed mantissa and exponent values.
+
+    A ValueError is raised if a value is not finite or the exponent
+    is out of range.
+    """
+
+    values = np.where(col.mask, 0, col.values).astype(np.float64)
+    if not np.all(np.isfinite(values)):
+        raise ValueError("Unable to quantize non-finite values")
+
+    absval = np.abs(values)
+    nonzero = absval > 0
+    expon = np.zeros(len(values), dtype=np.int64)
+    expon[nonzero] = np.floor(np.log10(absval[nonzero])).astype(np.int64) - \
+        (digits - 1)
+
+    mant = np.rint(absval / np.power(10.0, expon)).astype(np.int64)
+
+    # The rounding (or log10 being slightly off) can leave the
+    # mantissa with the wrong number of digits.
+    #
+    big = mant >= 10**digits
+    while big.any():
+        expon[big] += 1
+        mant[big] = np.rint(absval[big] / np.power(10.0, expon[big])).astype(np.int64)
+        big = mant >= 10**digits
+
+    small = nonzero & (mant < 10**(digits - 1))
+    while small.any():
+        expon[small] -= 1
+        mant[small] = np.rint(absval[small] / np.power(10.0, expon[small])).astype(np.int64)
+        small = nonzero & (mant < 10**(digits - 1))
+
+    expon[mant == 0] = 0
+    if np.any(expon < -EXPONENT_OFFSET) or np.any(expon >= EXPONENT_OFFSET):
+        raise ValueError("Exponent out of range")
+
+    packed = np.sign(values).astype(np.int64) * (mant * 100 + expon + EXPONENT_OFFSET)
+    return srctable.Column(packed, col.mask.copy())
+
+
+def dequantize_mantissa(col):
+
+    absval = np.abs(col.values)
+    mant = (absval // 100).astype(np.float64)
+    expon = absval % 100 - EXPONENT_OFFSET
+
+    # Dividing by an exact power of ten gives a correctly-rounded
+    # result, which multiplying by 10^e (e < 0) does not.
+    #
+    values = np.where(expon < 0,
+                      mant / np.power(10.0, np.maximum(-expon, 0)),
+                      mant * np.power(10.0, np.maximum(expon, 0)))
+    values = np.sign(col.values) * values
+    return srctable.Column(np.where(col.mask, 0, values), col.mask.copy())
+
+
+def quantize_table(table, digits=FLUX_DIGITS):
+    """Convert the position and flux columns to integers.
+
+    Returns the new table and the quant description.
+    """
+
+    quant = {}
+    columns = {}
+    for name in table.names:
+        if name in COORD_COLUMNS:
+            columns[name] = quantize_scaled(table[name], COORD_SCALE)
+            quant[name] = {"type": "scaled", "scale": COORD_SCALE}
+        else:
+            columns[name] = table[name]
+
+    for name in flux_columns(table):
+        columns[name] = quantize_mantissa(table[name], digits=digits)
+        quant[name] = {"type": "mantissa", "digits": digits}
+
+    return srctable.SourceTable(table.names, columns), quant
+
+
+def dequantize_table(table, quant):
+    """Convert the columns back to floating point."""
+
+    columns = {}
+    for name in table.names:
+        info = quant.get(name)
+        if info is None:
+            columns[name] = table[name]
+        elif info["type"] == "scaled":
+            columns[name] = dequantize_scaled(table[name], info["scale"])
+        elif info["type"] == "mantissa":
+            columns[name] = dequantize_mantissa(table[name])
+        else:
+            raise ValueError(f"Unknown quantization for {name}: {info['type']}")
+
+    return srctable.SourceTable(table.names, columns)
+
+
+def separation(ra1, dec1, ra2, dec2):
+    """The angular separation, in arcseconds (the inputs are in degrees)."""
+
+    ra1, dec1, ra2, dec2 = map(np.radians, (ra1, dec1, ra2, dec2))
+    sdec = np.sin((dec2 - dec1) / 2)
+    sra = np.sin((ra2 - ra1) / 2)
+    hav = sdec * sdec + np.cos(dec1) * np.cos(dec2) * sra * sra
+    return np.degrees(2 * np.arcsin(np.sqrt(np.minimum(hav, 1)))) * 3600
+
+
+def error_report(table, qtable, quant):
+    """How much have the values changed?
+
+    The return value has the maximum positional error (maxpos, in
+    arcseconds) and, for each flux column, the maximum relative
+    error (in the fluxes field), along with the number of rows.
+    """
+
+    dtable = dequantize_table(qtable, quant)
+    good = ~(table["ra"].mask | table["dec"].mask)
+    sep = separation(table["ra"].values[good], table["dec"].values[good],
+                     dtable["ra"].values[good], dtable["dec"].values[good])
+
+    fluxes = {}
+    for name, info in quant.items():
+        if info["type"] != "mantissa":
+            continue
+
+        good = ~table[name].mask & (table[name].values != 0)
+        orig = table[name].values[good]
+        diff = np.abs(dtable[name].values[good] - orig) / np.abs(orig)
+        fluxes[name] = float(diff.max()) if len(diff) > 0 else 0.0
+
+    return {"nrows": len(table),
+            "maxpos": float(sep.max()) if len(sep) > 0 else 0.0,
+            "fluxes": fluxes}
+
+
+def merge_reports(reports):
+    """Combine the reports (e.g. for each block of a stream)."""
+
+    out = {"nrows": 0, "maxpos": 0.0, "fluxes": {}}
+    for report in reports:
+        out["nrows"] += report["nrows"]
+        out["maxpos"] = max(out["maxpos"], report["maxpos"])
+        for name, err in report["fluxes"].items():
+            out["fluxes"][name] = max(out["fluxes"].get(name, 0.0), err)
+
+    return out
+
+
+def print_report(report):
+
+    print(f"Quantization errors for {report['nrows']} sources:")
+    print(f"  maximum position error: {report['maxpos'] * 1000:.3f} mas")
+    for name, err in report["fluxes"].items():
+        print(f"  maximum relative error in {name}: {err:.2e}")
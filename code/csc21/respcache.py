@@ -0,0 +1,261 @@
+"""
+An on-disk cache of the responses from the archive services (TAP and
+CSCCLI).
+
+Re-running a script, for instance to check a change to the output
+code, used to mean re-running all the queries. Here the response is
+stored - gzip-compressed - in a cache directory, keyed by the service
+URL and the query parameters (with the white space in the ADQL
+normalized), and re-used if it is less than ttl seconds old.
+
+The mode setting controls how the cache is used:
+
+  use      - use the cached response if it has not expired,
+             otherwise query the service and save the response
+  refresh  - always query the service, and save the response
+  offline  - only use the cache (even if the response has expired);
+             it is an error if there is no cached response
+  off      - do not use the cache
+
+Entries are written to a temporary file and then renamed, so that
+concurrent runs can not see (or create) a partially-written entry.
+
+The cache is only meant for re-running the scripts by hand, so that
+the scheduled runs always publish the current archive results: the
+mode is "off" unless the CSC_TAP_CACHE environment variable is set,
+in which case it is "use" and the variable gives the cache directory
+(otherwise ~/.cache/csc-tap is used). The settings can be changed
+with configure (make_status.py, for instance, turns on the cache
+with --cache, --cache-ttl, or --cache-dir).
+
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import re
+import tempfile
+import time
+
+
+MODES = ["use", "refresh", "offline", "off"]
+
+settings = {"cachedir": os.environ.get("CSC_TAP_CACHE",
+                                       os.path.expanduser("~/.cache/csc-tap")),
+            "ttl": 6 * 3600,
+            "mode": "use" if "CSC_TAP_CACHE" in os.environ else "off"}
+
+
+def configure(cachedir=None, ttl=None, mode=None):
+    """Change the cache settings (None means leave as is)."""
+
+    if mode is not None:
+        if mode not in MODES:
+            raise ValueError(f"Unknown cache mode: {mode}")
+
+        settings["mode"] = mode
+
+    if ttl is not None:
+        if ttl < 0:
+            raise ValueError(f"ttl must be positive, not {ttl}")
+
+        settings["ttl"] = ttl
+
+    if cachedir is not None:
+        settings["cachedir"] = cachedir
+
+
+def normalize_query(query):
+    """Collapse white space in the ADQL, ignoring quoted strings."""
+
+    toks = query.split("'")
+    for idx in range(0, len(toks), 2):
+        toks[idx] = re.sub(r"\s+", " ", toks[idx])
+
+    return "'".join(toks).strip()
+
+
+def cache_key(endpoint, params):
+    """The key for the query (a hex string)."""
+
+    norm = {}
+    for key, value in params.items():
+        if key.upper() == "QUERY":
+            value = normalize_query(value)
+
+        norm[key] = value
+
+    txt = json.dumps([endpoint, norm], sort_keys=True)
+    return hashlib.sha256(txt.encode("utf-8")).hexdigest()
+
+
+def entry_path(endpoint, params):
+    return os.path.join(settings["cachedir"],
+                        cache_key(endpoint, params) + ".gz")
+
+
+def lookup(endpoint, params):
+    """Return the cache file to use, or None.
+
+    An OSError is raised in offline mode if there is no entry.
+    """
+
+    mode = settings["mode"]
+    if mode in ["off", "refresh"]:
+        return None
+
+    path = entry_path(endpoint, params)
+    try:
+        age = time.time() - os.stat(path).st_mtime
+    except FileNotFoundError:
+        if mode == "offline":
+            raise OSError(f"No cached response for {endpoint} " +
+                          "(offline mode)") from None
+
+        return None
+
+    if age <= settings["ttl"]:
+        print(f"   using cached response ({age:.0f} seconds old)")
+        return path
+
+    if mode == "offline":
+        print(f"   using expired cached response ({age:.0f} seconds old)")
+        return path
+
+    return None
+
+
+class Entry:
+    """Write out a cache entry.
+
+    The data is written to a temporary file which is only moved
+    into place by commit. If the cache is not being used then the
+    data is ignored.
+    """
+
+    def __init__(self, endpoint, params):
+        self.path = None
+        self.tmpname = None
+        self.fh = None
+        if settings["mode"] == "off":
+            return
+
+        self.path = entry_path(endpoint, params)
+        cachedir = os.path.dirname(self.path)
+        os.makedirs(cachedir, exist_ok=True)
+        fd, self.tmpname = tempfile.mkstemp(dir=cachedir, suffix=".tmp")
+        self.raw = os.fdopen(fd, 'wb')
+        self.fh = gzip.GzipFile(filename='', mode='wb', fileobj=self.raw,
+                                compresslevel=6, mtime=0)
+
+    def write(self, data):
+        if self.fh is not None:
+            self.fh.write(data)
+
+    def close(self):
+        if self.fh is not None:
+            self.fh.close()
+            self.raw.close()
+            self.fh = None
+
+    def commit(self):
+        if self.tmpname is None:
+            return
+
+        self.close()
+        os.replace(self.tmpname, self.path)
+        self.tmpname = None
+
+    def discard(self):
+        if self.tmpname is None:
+            return
+
+        self.close()
+        os.remove(self.tmpname)
+        self.tmpname = None
+
+
+def store(endpoint, params, data):
+    """Add the response to the cache."""
+
+    entry = Entry(endpoint, params)
+    try:
+        entry.write(data)
+        entry.commit()
+    except:
+        entry.discard()
+        raise
+
+
+def invalidate(endpoint, params):
+    """Remove the response from the cache (e.g. if it was invalid)."""
+
+    try:
+        os.remove(entry_path(endpoint, params))
+    except FileNotFoundError:
+        pass
+
+
+def fetch(endpoint, params, download):
+    """Return the response, using the cache if possible.
+
+    The download argument is called, with no arguments, to get the
+    response (as bytes) when the cache can not be used.
+    """
+
+    path = lookup(endpoint, params)
+    if path is not None:
+        with gzip.open(path, 'rb') as fh:
+            return fh.read()
+
+    data = download()
+    store(endpoint, params, data)
+    return data
+
+
+def fetch_process(endpoint, params, download, func):
+    """Return func called on the response, using the cache if possible.
+
+    This is for when the response can only be checked by processing
+    it: if func raises an error then the cache entry is removed, so
+    that an invalid response is not re-used.
+    """
+
+    data = fetch(endpoint, params, download)
+    try:
+        return func(data)
+    except:
+        invalidate(endpoint, params)
+        raise
+
+
+def fetch_time(endpoint, params):
+    """When was the response used by fetch downloaded?
+
+    This is the time (Unix seconds) the cache entry was written, so
+    it is only valid after a call to fetch (or fetch_process), and
+    None is returned if the cache is not being used (in which case
+    the response was downloaded by the call).
+    """
+
+    if settings["mode"] == "off":
+        return None
+
+    try:
+        return os.stat(entry_path(endpoint, params)).st_mtime
+    except FileNotFoundError:
+        return None
+
+
+class TeeReader:
+    """Copy the data read from fh to the cache entry."""
+
+    def __init__(self, fh, entry):
+        self.fh = fh
+        self.entry = entry
+
+    def read(self, size=-1):
+        data = self.fh.read(size)
+        self.entry.write(data)
+        return data
@@ -0,0 +1,253 @@
+"""
+A binary version of the source-property chunks.
+
+The JSON chunks have to be parsed as text by the browser, which is
+slow for the full catalog. This format stores each column as a
+little-endian typed array, so it can be read with a TypedArray (or
+NumPy) view without parsing. The layout is
+
+  magic     8 bytes     b"CSCSRCB1"
+  hlen      uint32      the length of the header
+  header    hlen bytes  UTF-8 JSON, padded with spaces so that
+                        the data starts on an 8-byte boundary
+  data      the column blocks, each of which starts on an 8-byte
+            boundary (measured from the start of the file)
+
+The header contains the ntotal, start, and cols fields of the JSON
+chunk, nrows (the number of rows in this chunk), and a columns
+field which describes each column:
+
+  name      the column name
+  type      one of float64, float32, int32, int16, int8, or string
+  offset    the start of the values (in bytes)
+  nulls     the start of the null bitmap, or null if there are
+            no null values in this chunk
+
+Floating-point columns are written as float32, apart from the
+positions (see DOUBLE_COLUMNS). The JSON output only uses 6
+significant figures, which float32 can represent. Integer columns
+use the smallest type that holds the values in the chunk.
+
+For string columns, offset points to nrows + 1 uint32 values, which
+give the start and end of each string in the UTF-8 encoded string
+table, which starts at the data position (and is nbytes long).
+
+If the positions and fluxes have been converted to integers (see
+quantize.py) then the header also contains the quant field.
+
+The null bitmap has one bit per row, with bit (i % 8) of byte
+(i // 8) set if row i is null. Null floating-point values are also
+stored as NaN.
+
+Requires NumPy.
+
+"""
+
+import gzip
+import json
+
+import numpy as np
+
+import srcjson
+import srctable
+
+
+MAGIC = b"CSCSRCB1"
+
+# These columns are written as float64.
+#
+DOUBLE_COLUMNS = ["ra", "dec"]
+
+
+def align(pos):
+    """Round up to the next multiple of 8."""
+
+    return (pos + 7) // 8 * 8
+
+
+def column_blocks(name, col):
+    """Return the type and the data (as NumPy arrays) for a column.
+
+    The return value is the type name and a dictionary of arrays,
+    where the keys match the header fields they are written to.
+    """
+
+    values = col.values
+    kind = values.dtype.kind
+    blocks = {}
+    if kind in "SU":
+        # Byte strings are ASCII (see srctable.Column), so are UTF-8.
+        encoded = values.tolist()
+        if kind == "U":
+            encoded = [val.encode("utf-8") for val in encoded]
+
+        offsets = np.zeros(len(encoded) + 1, dtype="<u4")
+        np.cumsum([len(val) for val in encoded], out=offsets[1:])
+        blocks["offset"] = offsets
+        blocks["data"] = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+        dtype = "string"
+
+    elif kind == "f":
+        dtype = "float64" if name in DOUBLE_COLUMNS else "float32"
+        vals = values.astype(f"<{'f8' if dtype == 'float64' else 'f4'}")
+        vals[col.mask] = np.nan
+        blocks["offset"] = vals
+
+    elif kind in "iu":
+        for dtype, nptype in [("int8", "<i1"), ("int16", "<i2"),
+                              ("int32", "<i4")]:
+            info = np.iinfo(nptype)
+            if len(values) == 0 or \
+               (values.min() >= info.min and values.max() <= info.max):
+                break
+        else:
+            raise ValueError(f"Column {name} does not fit into int32")
+
+        vals = values.astype(nptype)
+        vals[col.mask] = 0
+        blocks["offset"] = vals
+
+    else:
+        raise ValueError(f"Unsupported column type: {values.dtype}")
+
+    if col.mask.any():
+        blocks["nulls"] = np.packbits(col.mask, bitorder="little")
+
+    return dtype, blocks
+
+
+def encode_table(table, ntotal, start, colorder, quant=None):
+    """Return the binary version of the chunk (as bytes).
+
+    The quant argument is added to the header if set (see
+    quantize.py).
+    """
+
+    columns = []
+    blocks = []
+    for name in table.names:
+        dtype, cblocks = column_blocks(name, table[name])
+        info = {"name": name, "type": dtype, "nulls": None}
+        for key, arr in cblocks.items():
+            info[key] = arr
+            blocks.append((info, key, arr))
+
+        if dtype == "string":
+            info["nbytes"] = len(cblocks["data"])
+
+        columns.append(info)
+
+    header = {"version": 1, "ntotal": ntotal, "start": start,
+              "nrows": len(table), "cols": colorder,
+              "columns": columns}
+    if quant is not None:
+        header["quant"] = quant
+
+    # The offsets depend on the header length, which depends on the
+    # offsets, so start with a guess, and increase the header size
+    # until it fits.
+    #
+    hsize = 1024
+    while True:
+        pos = align(len(MAGIC) + 4 + hsize)
+        for info, key, arr in blocks:
+            info[key] = pos
+            pos = align(pos + arr.nbytes)
+
+        htxt = json.dumps(header).encode("utf-8")
+        if len(htxt) <= hsize:
+            break
+
+        hsize = len(htxt)
+
+    datastart = align(len(MAGIC) + 4 + hsize)
+    htxt += b" " * (datastart - len(MAGIC) - 4 - len(htxt))
+
+    out = bytearray(pos)
+    out[:len(MAGIC)] = MAGIC
+    out[len(MAGIC):len(MAGIC) + 4] = np.uint32(len(htxt)).astype("<u4").tobytes()
+    out[len(MAGIC) + 4:datastart] = htxt
+    for info, key, arr in blocks:
+        offset = info[key]
+        out[offset:offset + arr.nbytes] = arr.tobytes()
+
+    return bytes(out)
+
+
+def write_chunk(outname, ntotal, start, colorder, table, compress=False,
+                quant=None):
+    """Write out the binary version of a chunk.
+
+    This matches make_status.write_chunk, and returns the file name.
+    """
+
+    with srcjson.open_output(outname, compress=compress, binary=True) as fh:
+        fh.write(encode_table(table, ntotal, start, colorder, quant=quant))
+
+    return outname
+
+
+NPTYPES = {"float64": "<f8", "float32": "<f4", "int32": "<i4",
+           "int16": "<i2", "int8": "<i1"}
+
+
+def decode(buf):
+    """Decode the binary chunk.
+
+    Returns the header and the data as a srctable.SourceTable, with
+    float32 values converted to float64.
+    """
+
+    if buf[:len(MAGIC)] != MAGIC:
+        raise ValueError("Not a binary source-property chunk")
+
+    hlen = int(np.frombuffer(buf, dtype="<u4", count=1, offset=len(MAGIC))[0])
+    hstart = len(MAGIC) + 4
+    header = json.loads(buf[hstart:hstart + hlen])
+
+    nrows = header["nrows"]
+    columns = {}
+    for info in header["columns"]:
+        if info["nulls"] is None:
+            mask = np.zeros(nrows, dtype=bool)
+        else:
+            bits = np.frombuffer(buf, dtype=np.uint8, count=(nrows + 7) // 8,
+                                 offset=info["nulls"])
+            mask = np.unpackbits(bits, count=nrows,
+                                 bitorder="little").astype(bool)
+
+        if info["type"] == "string":
+            offsets = np.frombuffer(buf, dtype="<u4", count=nrows + 1,
+                                    offset=info["offset"]).tolist()
+            data = buf[info["data"]:info["data"] + info["nbytes"]]
+            values = np.asarray([data[i:j].decode("utf-8")
+                                 for i, j in zip(offsets[:-1], offsets[1:])],
+                                dtype=str)
+
+        else:
+            values = np.frombuffer(buf, dtype=NPTYPES[info["type"]],
+                                   count=nrows, offset=info["offset"])
+            if values.dtype.kind == "f":
+                values = values.astype(np.float64)
+            else:
+                values = values.astype(values.dtype.newbyteorder("="))
+
+        columns[info["name"]] = srctable.Column(values, mask)
+
+    names = [info["name"] for info in header["columns"]]
+    return header, srctable.SourceTable(names, columns)
+
+
+def read_chunk(filename):
+    """Read in a binary chunk (which may be gzip-compressed).
+
+    See decode.
+    """
+
+    with open(filename, "rb") as fh:
+        buf = fh.read()
+
+    if buf[:2] == b"\x1f\x8b":
+        buf = gzip.decompress(buf)
+
+    return decode(buf)
@@ -0,0 +1,177 @@
+"""
+Write out a srctable.SourceTable as JSON.
+
+The source-property chunks used to be created with json.dumps on
+a list of rows. To shorten the floating-point values, make_status.py
+replaced the float type used by the json module (which meant
+disabling the C encoder for all JSON output), and then called repr
+twice for each value. Here the values are converted a column at a
+time, and the rows are then joined together, so the json module is
+left alone.
+
+The output matches json.dumps (with the default separators), where
+a float is written using the shorter of repr(x) and the precision
+(as a "g" format) version, when precision is set. The table can be
+written out as a list of rows, or as an object with a list of values
+for each column.
+
+There is also support for writing out gzip-compressed files, and
+for writing the chunks in parallel.
+
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+import contextlib
+import gzip
+import io
+import json
+import multiprocessing
+
+import numpy as np
+
+
+def encode_floats(col, precision=None):
+    """Return the JSON text for each element of a float column."""
+
+    values = col.values
+    good = ~col.mask
+    if not np.all(np.isfinite(values[good])):
+        raise ValueError("Out of range float values are not JSON compliant")
+
+    # Replace the null values so they can be formatted.
+    #
+    values = np.where(good, values, 0.0)
+    vals = values.tolist()
+    if precision is None:
+        out = np.asarray(list(map(float.__repr__, vals)), dtype=object)
+        out[col.mask] = "null"
+        return out
+
+    out = np.asarray(list(map(f"{{:.{precision}g}}".format, vals)),
+                     dtype=object)
+
+    # repr is slow, so only call it when it can be shorter than
+    # the reduced-precision version. This requires that either
+    #
+    #  - the reduced-precision version round trips, so that repr
+    #    can not need more digits, or
+    #  - the value is large enough that the reduced-precision
+    #    version uses an exponent but repr does not.
+    #
+    check = (out.astype(np.float64) == values) | \
+        (np.abs(values) >= 10**precision)
+    for idx in np.flatnonzero(check):
+        rstr = float.__repr__(vals[idx])
+        if len(rstr) <= len(out[idx]):
+            out[idx] = rstr
+
+    out[col.mask] = "null"
+    return out
+
+
+def encode_column(col, precision=None):
+    """Return the JSON text for each element of the column."""
+
+    kind = col.values.dtype.kind
+    if kind == "f":
+        return encode_floats(col, precision=precision)
+
+    if kind in "iu":
+        out = np.asarray(list(map(str, col.values.tolist())), dtype=object)
+    elif kind in "SU":
+        out = np.asarray(list(map(json.encoder.encode_basestring_ascii,
+                                  col.text().tolist())), dtype=object)
+    elif kind == "O":
+        # A column with values that could not be converted (see
+        # srctable.column_from_list).
+        out = np.asarray(list(map(json.dumps, col.values.tolist())),
+                         dtype=object)
+    else:
+        raise ValueError(f"Unsupported column type: {col.values.dtype}")
+
+    if col.mask.any():
+        out[col.mask] = json.dumps(col.null)
+
+    return out
+
+
+def encode_rows(table, precision=None):
+    """Return the JSON text for each row of the table."""
+
+    cols = [encode_column(table[name], precision=precision).tolist()
+            for name in table.names]
+    return ["[" + row + "]" for row in map(", ".join, zip(*cols))]
+
+
+def encode_table(table, precision=None):
+    """Return the JSON text for the table (a list of rows)."""
+
+    return "[" + ", ".join(encode_rows(table, precision=precision)) + "]"
+
+
+def encode_columns(table, precision=None):
+    """Return the JSON text for the table as an object of columns.
+
+    The keys are the column names, in sorted order (as with
+    json.dumps and sort_keys=True), and the values are the lists
+    of values.
+    """
+
+    cols = []
+    for name in sorted(table.names):
+        vals = ", ".join(encode_column(table[name], precision=precision).tolist())
+        cols.append(json.dumps(name) + ": [" + vals + "]")
+
+    return "{" + ", ".join(cols) + "}"
+
+
+@contextlib.contextmanager
+def open_output(outname, compress=False, binary=False):
+    """Open the output file for writing text (or bytes if binary).
+
+    If compress is set then the output is gzip-compressed, with
+    no file name or time stamp stored in the header (as with
+    gzip -n), so the output only depends on the contents. The
+    compression level matches the gzip default.
+    """
+
+    if not compress:
+        with open(outname, 'wb' if binary else 'w') as fh:
+            yield fh
+
+        return
+
+    with open(outname, 'wb') as raw:
+        with gzip.GzipFile(filename='', mode='wb', fileobj=raw,
+                           compresslevel=6, mtime=0) as gz:
+            if binary:
+                yield gz
+                return
+
+            with io.TextIOWrapper(gz, encoding='utf-8') as fh:
+                yield fh
+
+
+def run_jobs(func, jobs, nproc=1):
+    """Call func for each set of arguments in jobs.
+
+    The calls are made using a pool of nproc processes, unless
+    nproc is 1. The return values are returned in the order of
+    jobs.
+
+    The processes are not forked from this one, since this can be
+    called from a thread (see stagegraph.py), and forking while the
+    other threads hold locks can leave the child deadlocked. So the
+    forkserver start method is used, if available, otherwise spawn.
+    This means that func must be importable by the child processes.
+    """
+
+    if nproc == 1:
+        return [func(*job) for job in jobs]
+
+    methods = multiprocessing.get_all_start_methods()
+    method = "forkserver" if "forkserver" in methods else "spawn"
+    context = multiprocessing.get_context(method)
+    with ProcessPoolExecutor(max_workers=nproc, mp_context=context) as pool:
+        futures = [pool.submit(func, *job) for job in jobs]
+        return [future.result() for future in futures]
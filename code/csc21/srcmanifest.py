@@ -0,0 +1,198 @@
+"""
+Support for incrementally updating the source-property chunks.
+
+The chunks were originally fixed-size slices of the name-ordered
+source list, so adding a single source near the start changed
+every later chunk. Here the chunk boundaries are taken from the
+previous run - each chunk starts at the same source name (or the
+next one along, if the source has been removed) - and a chunk is
+only split or merged when it has grown or shrunk too much.
+
+Each chunk is identified by a hash of its contents, which is built
+from a hash of each source (that is, the JSON text of the row). The
+per-source hashes and chunk boundaries are saved to a state file
+(a NumPy .npz file) so the next run can pick the same boundaries and
+report what has changed.
+
+The state file also lists the chunk files of the run, so that the
+next run can keep them: the status file (and any client which has
+already downloaded it) refers to the previous chunks until it is
+replaced, so a chunk file is only deleted once it is not used by
+either the current or the previous run.
+
+Requires NumPy.
+
+"""
+
+import hashlib
+import os
+import re
+
+import numpy as np
+
+
+# Change this if the state file changes.
+#
+STATE_VERSION = 1
+
+
+def row_hashes(rows):
+    """Return a 64-bit hash of each row (the JSON text)."""
+
+    digests = b"".join(hashlib.blake2b(row.encode("utf-8"),
+                                       digest_size=8).digest()
+                       for row in rows)
+    return np.frombuffer(digests, dtype="<u8")
+
+
+def chunk_hash(header, hashes):
+    """The hash of a chunk.
+
+    The header is the text that does not depend on the rows (such
+    as the column names) and hashes are the row hashes.
+    """
+
+    h = hashlib.blake2b(header.encode("utf-8"), digest_size=16)
+    h.update(np.asarray(hashes, dtype="<u8").tobytes())
+    return h.hexdigest()
+
+
+def chunk_filename(outhead, hashval, suffix):
+    return f"{outhead}.{hashval}.{suffix}"
+
+
+def is_chunk_filename(filename, outhead):
+    """Does this look like a chunk file written by this module?
+
+    The compressed versions created by precompress.py are included.
+    """
+
+    pat = re.escape(outhead) + r"\.[0-9a-f]{32}\.json(\.gz|\.br|\.zst)?"
+    return re.fullmatch(pat, filename) is not None
+
+
+def read_state(statefile):
+    """Read in the state from the previous run.
+
+    Returns None if the file does not exist or is from a different
+    version, otherwise a dictionary with the names, hashes, starts,
+    and files arrays (files is empty if the state file does not
+    list the chunk files).
+    """
+
+    try:
+        with np.load(statefile) as state:
+            if int(state["version"]) != STATE_VERSION:
+                print(f"Ignoring {statefile} as it is from a different version")
+                return None
+
+            if "files" in state:
+                files = state["files"]
+            else:
+                files = np.zeros(0, dtype=str)
+
+            return {"names": state["names"],
+                    "hashes": state["hashes"],
+                    "starts": state["starts"],
+                    "files": files}
+
+    except FileNotFoundError:
+        return None
+
+
+def write_state(statefile, names, hashes, starts, files):
+    """Write out the state (replacing any existing file).
+
+    The files argument lists the chunk files.
+    """
+
+    # np.savez adds .npz to the name unless it is sent a file handle.
+    #
+    tmpname = f"{statefile}.tmp"
+    with open(tmpname, "wb") as fh:
+        np.savez_compressed(fh, version=STATE_VERSION,
+                            names=np.asarray(names, dtype=bytes),
+                            hashes=hashes, starts=starts,
+                            files=np.asarray(files, dtype=str))
+
+    os.replace(tmpname, statefile)
+    print(f"Created: {statefile}")
+
+
+def chunk_starts(names, chunksize, previous=None):
+    """Return the index of the first row of each chunk.
+
+    Parameters
+    ----------
+    names : ndarray of str
+        The source names, which must be sorted.
+    chunksize : int
+        The target number of rows in a chunk. A chunk is split
+        when it has more than twice this many rows, and merged
+        with its neighbour when it has less than a quarter.
+    previous : dict or None
+        The state from the previous run (see read_state).
+
+    Returns
+    -------
+    starts : ndarray of int
+        There is always at least one chunk, even if there are no
+        rows.
+    """
+
+    nrows = len(names)
+    if nrows == 0:
+        return np.zeros(1, dtype=np.int64)
+
+    if previous is None:
+        starts = list(range(0, nrows, chunksize))
+
+    else:
+        if np.any(names[1:] < names[:-1]):
+            raise ValueError("The source names are not sorted")
+
+        # Each chunk starts at the first source which sorts at or
+        # after the first source of the previous version.
+        #
+        firsts = previous["names"][previous["starts"]].astype(str)
+        starts = np.searchsorted(names, firsts)
+        starts = np.union1d([0], starts)
+        starts = starts[starts < nrows].tolist()
+
+    out = []
+    for start, end in zip(starts, starts[1:] + [nrows]):
+        size = end - start
+        if size <= 2 * chunksize:
+            out.append(start)
+            continue
+
+        nsplit = -(-size // chunksize)
+        out.extend(start + (size * i) // nsplit for i in range(nsplit))
+
+    # Merge the small chunks into the previous one (or the next one,
+    # for the first chunk).
+    #
+    minsize = chunksize // 4
+    idx = 0
+    while len(out) > 1 and idx < len(out):
+        end = out[idx + 1] if idx + 1 < len(out) else nrows
+        if end - out[idx] >= minsize:
+            idx += 1
+            continue
+
+        if idx == 0:
+            del out[1]
+        else:
+            del out[idx]
+
+    return np.asarray(out, dtype=np.int64)
+
+
+def compare_sources(previous, names, hashes):
+    """Return the number of added, removed, and changed sources."""
+
+    oldnames = previous["names"].astype(str)
+    _, idx1, idx2 = np.intersect1d(oldnames, names, assume_unique=True,
+                                   return_indices=True)
+    nchanged = np.count_nonzero(previous["hashes"][idx1] != hashes[idx2])
+    return len(names) - len(idx2), len(oldnames) - len(idx1), nchanged
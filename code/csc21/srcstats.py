@@ -0,0 +1,149 @@
+"""
+Summary statistics of the source properties.
+
+The plots in the viewer (wwtplots.js) are created by looping over
+the source rows, so they can only be drawn once the chunks have been
+downloaded. This module calculates - a column at a time - the
+values needed for an overview of the whole catalog:
+
+  nrows     the number of rows
+  nnull     the number of null values
+  min, max  the range of the non-null values
+  quantiles the values at the QUANTILES positions
+  hist      a histogram of the non-null values
+
+The histogram has the fields lo, hi, log, and counts: there are
+len(counts) equal-width bins between lo and hi, where the bins are
+in log10 space if log is set (the lo and hi values are then also
+log10 values). Only positive values are included in a log histogram,
+and the number of excluded values is given by nonpositive. For
+integer columns with a small range each bin contains one value.
+Missing integers are not masked (they are set to srctable.INT_NULL)
+so they are counted as null here.
+
+The flux columns use log bins. As the viewer plots the broad and
+wide band fluxes separately, the BAND_COLUMNS also have a bands
+field, which contains the statistics for each fluxband value.
+
+Requires NumPy.
+
+"""
+
+import numpy as np
+
+import srctable
+
+
+QUANTILES = [0.01, 0.05, 0.25, 0.5, 0.75, 0.95, 0.99]
+
+NBINS = 50
+
+BAND_COLUMNS = ["flux", "significance"]
+
+
+def is_log_column(name):
+    """Should the column be histogrammed with log bins?"""
+
+    return name.startswith("flux") and name != "fluxband"
+
+
+def tidy(value, precision=6):
+    """Convert to a Python float with the given number of significant figures."""
+
+    return float(f"{value:.{precision}g}")
+
+
+def histogram(values, log=False, nbins=NBINS, integer=False):
+    """Return the histogram fields for the (non-null) values."""
+
+    out = {"log": log}
+    if log:
+        good = values > 0
+        out["nonpositive"] = int(np.count_nonzero(~good))
+        values = np.log10(values[good])
+
+    if len(values) == 0:
+        out.update({"lo": None, "hi": None, "counts": []})
+        return out
+
+    lo = values.min()
+    hi = values.max()
+    if integer and hi - lo < nbins:
+        lo -= 0.5
+        hi += 0.5
+        nbins = int(hi - lo)
+    elif lo == hi:
+        lo -= 0.5
+        hi += 0.5
+
+    # The edges are written out with reduced precision, so use
+    # these values, and make sure the end points are still included.
+    #
+    lo = tidy(lo)
+    hi = tidy(hi)
+    counts, _ = np.histogram(np.clip(values, lo, hi), bins=nbins,
+                             range=(lo, hi))
+    out.update({"lo": lo, "hi": hi, "counts": counts.tolist()})
+    return out
+
+
+def column_stats(name, col, nbins=NBINS):
+    """The statistics for a numeric column."""
+
+    mask = col.mask
+    if col.values.dtype.kind in "iu":
+        mask = mask | (col.values == srctable.INT_NULL)
+
+    values = col.values[~mask]
+    integer = values.dtype.kind in "iub"
+    if values.dtype.kind == "b":
+        values = values.astype(np.int8)
+
+    out = {"nrows": len(col),
+           "nnull": int(np.count_nonzero(mask))}
+
+    if len(values) == 0:
+        out.update({"min": None, "max": None,
+                    "quantiles": [None] * len(QUANTILES)})
+    else:
+        out.update({"min": tidy(values.min()),
+                    "max": tidy(values.max()),
+                    "quantiles": [tidy(q) for q in
+                                  np.quantile(values, QUANTILES)]})
+
+    out["hist"] = histogram(values, log=is_log_column(name), nbins=nbins,
+                            integer=integer)
+    return out
+
+
+def build(table, nbins=NBINS):
+    """Calculate the statistics for the numeric columns of the table.
+
+    String columns are skipped.
+    """
+
+    columns = {}
+    for name in table.names:
+        col = table[name]
+        if col.values.dtype.kind not in "fiub":
+            continue
+
+        columns[name] = column_stats(name, col, nbins=nbins)
+
+    if "fluxband" in table.names:
+        band = table["fluxband"]
+        bands = np.unique(band.values[~band.mask]).tolist()
+        for name in BAND_COLUMNS:
+            if name not in columns:
+                continue
+
+            columns[name]["bands"] = {
+                str(val): column_stats(name,
+                                       table[name][~band.mask &
+                                                   (band.values == val)],
+                                       nbins=nbins)
+                for val in bands}
+
+    return {"nsources": len(table),
+            "quantiles": QUANTILES,
+            "columns": columns}
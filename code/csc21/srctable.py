@@ -0,0 +1,350 @@
+"""
+A column-oriented store for the source properties.
+
+This replaces the "list of lists" store used by stackdata.py (CSC 2.1)
+and props2json.py (CSC 2.0), where each row was a list of Python
+objects. Here each column is a NumPy array with a boolean mask that
+is True for null values, so a chunk of the table is just a set of
+views into the full arrays. String columns are stored as bytes (the
+NumPy S type) when they are ASCII, since NumPy uses four bytes per
+character for str (U) arrays, and the names dominate the memory
+use. They are only decoded when converted to Python (tolist and
+text) or written out.
+
+The output format is unchanged: tolist returns the rows as lists,
+with null values replaced by the null setting of each column (None,
+unless set otherwise). Note that the "sentinel" values used when
+converting the input - such as -999 for a missing integer, or an
+empty string - are stored as values and are not masked (see
+INT_NULL).
+
+Requires NumPy.
+
+"""
+
+import numpy as np
+
+
+# The value used for a missing integer. It is not masked, so that
+# it is written out as is, which means code that looks at the
+# values (such as srcstats) has to exclude it.
+#
+INT_NULL = -999
+
+
+class Column:
+    """The values of a column and the null mask.
+
+    The null argument is the value used for masked elements
+    when converting to Python.
+    """
+
+    __slots__ = ("values", "mask", "null")
+
+    def __init__(self, values, mask=None, null=None):
+        values = np.asarray(values)
+        if values.dtype.kind == "U":
+            values = to_bytes(values)
+
+        if mask is None:
+            mask = np.zeros(len(values), dtype=bool)
+        else:
+            mask = np.asarray(mask, dtype=bool)
+
+        if values.shape != mask.shape:
+            raise ValueError("values and mask do not match: " +
+                             f"{values.shape} {mask.shape}")
+
+        self.values = values
+        self.mask = mask
+        self.null = null
+
+    def __len__(self):
+        return len(self.values)
+
+    def __getitem__(self, idx):
+        # Slicing returns views, other forms of indexing copy.
+        return Column(self.values[idx], self.mask[idx], self.null)
+
+    def text(self):
+        """The values as str, decoding byte strings."""
+
+        return to_str(self.values)
+
+    def tolist(self):
+        """The values, with the masked elements replaced by null."""
+
+        out = to_str(self.values).tolist()
+        for idx in np.flatnonzero(self.mask):
+            out[idx] = self.null
+
+        return out
+
+
+def to_bytes(values):
+    """Return the str array as bytes, if it only contains ASCII.
+
+    Otherwise the input is returned.
+    """
+
+    try:
+        return values.astype("S")
+    except UnicodeEncodeError:
+        return values
+
+
+def to_str(values):
+    """Return the array as str if it contains bytes.
+
+    Otherwise the input is returned.
+    """
+
+    values = np.asarray(values)
+    if values.dtype.kind == "S":
+        return values.astype(str)
+
+    return values
+
+
+class SourceTable:
+    """A set of columns, all of the same length.
+
+    Indexing by a string returns the column, otherwise the index
+    (such as a slice or boolean array) is applied to every column.
+    """
+
+    def __init__(self, names, columns):
+        self.names = list(names)
+        self.columns = {name: columns[name] for name in self.names}
+
+        lens = set(len(col) for col in self.columns.values())
+        if len(lens) > 1:
+            raise ValueError(f"Columns have different lengths: {lens}")
+
+    def __len__(self):
+        if len(self.names) == 0:
+            return 0
+
+        return len(self.columns[self.names[0]])
+
+    def __getitem__(self, idx):
+        if isinstance(idx, str):
+            return self.columns[idx]
+
+        return SourceTable(self.names,
+                           {name: col[idx]
+                            for name, col in self.columns.items()})
+
+    def tolist(self):
+        """Return the data as a list of rows (each a list)."""
+
+        cols = [self.columns[name].tolist() for name in self.names]
+        return [list(row) for row in zip(*cols)]
+
+    @staticmethod
+    def concatenate(tables):
+        """Join the tables, which must have the same columns."""
+
+        names = tables[0].names
+        for tbl in tables[1:]:
+            if tbl.names != names:
+                raise ValueError("Tables have different columns")
+
+        columns = {}
+        for name in names:
+            cols = [tbl[name] for tbl in tables]
+            columns[name] = Column(np.concatenate([col.values for col in cols]),
+                                   np.concatenate([col.mask for col in cols]),
+                                   null=cols[0].null)
+
+        return SourceTable(names, columns)
+
+
+def column_from_list(vals, kind):
+    """Create a column from a list of converted values.
+
+    A value of None is treated as null. The kind argument is one
+    of "string", "integer", "float", or "flag" (a 0/1 value).
+
+    A string value in a non-string column is a value that could not
+    be converted (see convert_column). It is kept, as with the
+    original list-of-rows store, so the column holds Python objects.
+    Integers which do not fit into int32 are stored as int64 (or as
+    Python objects if they do not fit into that either).
+    """
+
+    if kind == "string":
+        mask = [val is None for val in vals]
+        return Column(np.asarray(["" if val is None else val
+                                  for val in vals], dtype=str), mask)
+
+    if kind == "float":
+        fill, dtype = np.nan, np.float64
+    elif kind == "integer":
+        fill, dtype = INT_NULL, np.int32
+    elif kind == "flag":
+        fill, dtype = 0, np.int8
+    else:
+        raise ValueError(kind)
+
+    mask = [val is None for val in vals]
+    values = [fill if val is None else val for val in vals]
+
+    # NumPy would convert a string such as "1", so check for them.
+    #
+    if any(isinstance(val, str) for val in values):
+        return Column(np.asarray(values, dtype=object), mask)
+
+    try:
+        return Column(np.asarray(values, dtype=dtype), mask)
+    except OverflowError:
+        if kind != "integer":
+            raise
+
+    print("Integer values do not fit into int32")
+    try:
+        return Column(np.asarray(values, dtype=np.int64), mask)
+    except OverflowError:
+        return Column(np.asarray(values, dtype=object), mask)
+
+
+def convert_column(toks, kind, convertor, true="T", false="F"):
+    """Convert a column of strings.
+
+    This is the batch version of calling convertor on each element
+    and then column_from_list. The values are stripped, and then:
+
+      - for "string", are returned as is
+      - for "float", an empty string is null
+      - for "integer", an empty string is converted to INT_NULL
+        (and is not masked)
+      - for "flag", the true and false values are converted to 1
+        and 0
+
+    A token of None is treated as an empty string. If the column
+    can not be converted - for example an invalid number or flag
+    value, or an integer which does not fit into int32 - then the
+    per-element convertor is used, so that the errors are handled
+    the same way: a token which the convertor rejects is reported
+    and kept as is (see column_from_list).
+
+    Parameters
+    ----------
+    toks : sequence of str or None
+        The column values.
+    kind : {"string", "float", "integer", "flag"}
+        The column type.
+    convertor : callable
+        The per-element version of the conversion.
+    true, false : str
+        The values for the flag column.
+
+    Returns
+    -------
+    col : Column
+    """
+
+    if kind == "string":
+        return Column(np.char.strip(np.asarray(["" if tok is None else tok
+                                                for tok in toks], dtype=str)))
+
+    if kind not in ["float", "integer", "flag"]:
+        raise ValueError(kind)
+
+    # Using an object array means that the conversion of each element
+    # is done by NumPy (calling float or int). Values which contain
+    # spaces are left to the per-element conversion, to strip them.
+    #
+    tokens = np.asarray(toks, dtype=object)
+    empty = (tokens == "") | (tokens == None)
+    try:
+        if kind == "float":
+            tokens[empty] = "nan"
+            return Column(tokens.astype(np.float64), empty)
+
+        if kind == "integer":
+            tokens[empty] = str(INT_NULL)
+            return Column(tokens.astype(np.int32))
+
+        flag = tokens == true
+        if np.all(flag | (tokens == false)):
+            return Column(flag.astype(np.int8))
+
+    except (ValueError, OverflowError):
+        pass
+
+    # Fall back to the per-element conversion.
+    #
+    vals = []
+    for tok in toks:
+        if tok is None:
+            tok = ""
+
+        try:
+            vals.append(convertor(tok))
+        except ValueError:
+            print("Unable to convert '{}'".format(tok))
+            vals.append(tok)
+
+    return column_from_list(vals, kind)
+
+
+def merge_fluxes(names, columns, label):
+    """Merge the flux_aper_[b/w] columns.
+
+    The broad and wide aperture fluxes (and their _lolim and _hilim
+    variants) are replaced by the fluxband, flux, flux_lolim, and
+    flux_hilim columns, placed where flux_aper_b was. At most one
+    of the broad or wide bands is expected to be set. The fluxband
+    column is 0 for broad, 1 for wide, and -1 when neither is set.
+
+    Parameters
+    ----------
+    names : list of str
+        The column order.
+    columns : dict
+        The Column values for each name.
+    label : Column
+        Used to identify sources in the warning messages (normally
+        the name column).
+
+    Returns
+    -------
+    tbl : SourceTable
+    """
+
+    fb = ~columns["flux_aper_b"].mask
+    fw = ~columns["flux_aper_w"].mask
+
+    both = np.flatnonzero(fb & fw)
+    for name, idx in zip(label[both].tolist(), both):
+        print("WARNING: {} has fb=[{}] fw=[{}]".format(name,
+                                                       columns["flux_aper_b"].values[idx],
+                                                       columns["flux_aper_w"].values[idx]))
+
+    band = np.where(fb, 0, np.where(fw, 1, -1)).astype(np.int8)
+
+    def select(suffix):
+        bcol = columns[f"flux_aper{suffix}_b"]
+        wcol = columns[f"flux_aper{suffix}_w"]
+        values = np.where(fb, bcol.values, wcol.values)
+        mask = np.where(fb, bcol.mask, np.where(fw, wcol.mask, True))
+        return Column(values, mask)
+
+    outnames = []
+    outcols = {}
+    for name in names:
+        if name == "flux_aper_b":
+            outnames.extend(["fluxband", "flux", "flux_lolim", "flux_hilim"])
+            outcols["fluxband"] = Column(band)
+            outcols["flux"] = select("")
+            outcols["flux_lolim"] = select("_lolim")
+            outcols["flux_hilim"] = select("_hilim")
+
+        if name.startswith("flux_aper"):
+            continue
+
+        outnames.append(name)
+        outcols[name] = columns[name]
+
+    return SourceTable(outnames, outcols)
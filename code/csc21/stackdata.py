@@ -8,14 +8,43 @@ Requires:
 
   <indir>/{acis|hrc}_stacks_{uncnaged|updated|new}.lis
 
+The source properties are converted, and stored, with
+srctable.py, and so require NumPy. The BINARY2 support is in
+votbinary.py.
+
+The TAP responses can be cached on disk by respcache.py (this is
+off by default). The stack lists are parsed once by StackCatalog,
+which can save a snapshot of the results (a pickle file) in the
+same directory, and re-use it while the input files are unchanged.
+
 """
 
 
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+import gzip
+import os
+import pickle
 import subprocess as sbp
+import tempfile
 import time
 import xml.etree.ElementTree as ET
 
+import respcache
+
+
+VOT_NS = "{http://www.ivoa.net/xml/VOTable/v1.2}"
+
+TAP_URL = "https://cda.cfa.harvard.edu/csc21_snapshot_tap/sync"
+
+STACK_QUERY = "SELECT distinct a.name, a.detect_stack_id from csc21_snapshot.master_stack_assoc a"
+
+# The TAP FORMAT value for the binary version of the VOTABLE.
+#
+BINARY2_FORMAT = "application/x-votable+xml;serialization=BINARY2"
+
+SOURCE_QUERY = "SELECT DISTINCT m.name,m.ra,m.dec,m.err_ellipse_r0,m.err_ellipse_r1,m.err_ellipse_ang,m.conf_flag,m.sat_src_flag,m.acis_num,m.hrc_num,m.var_flag,m.significance,m.flux_aper_b,m.flux_aper_lolim_b,m.flux_aper_hilim_b,m.flux_aper_w,m.flux_aper_lolim_w,m.flux_aper_hilim_w,m.nh_gal,m.hard_hm,m.hard_hm_lolim,m.hard_hm_hilim,m.hard_ms,m.hard_ms_lolim,m.hard_ms_hilim FROM csc21_snapshot.master_source m ORDER BY name ASC"
+
 
 def read_20_stacklist():
     """Read in the CSC 2.0 stack/obi mapping.
@@ -167,33 +196,38 @@ def read_unchanged(infile):
     return stacks
 
 
-def find_stack_obis(indir):
-    """Create the mapping from stack id to obis"""
+def read_stack_lists(indir):
+    """Read in Ian's lists of stacks.
+
+    Returns the mapping from stack id to obis, the status of each
+    stack (new, updated, or unchanged), and the CSC 2.0 mapping
+    (from read_20_stacklist). Each file is only read once.
+    """
 
     if not indir.is_dir():
         raise ValueError(f"'{indir} is not a directory")
 
     unchanged = set()
     stacks = {}
-    nstacks = 0
+    status = {}
     for inst in ["acis", "hrc"]:
 
         infile = indir / f"{inst}_stacks_unchanged.txt"
-        unchanged |= read_unchanged(infile)
-
-        for status in ["updated", "new"]:
-            infile = indir / f"{inst}_stacks_{status}.txt"
+        for stack in read_unchanged(infile):
+            assert stack not in status
+            status[stack] = "unchanged"
+            unchanged.add(stack)
 
-            stackdata = read_changed(infile)
-            n = len(stackdata)
+        for state in ["updated", "new"]:
+            infile = indir / f"{inst}_stacks_{state}.txt"
 
-            # argh: we no-longer have a new-enough python (3.9)
-            # stacks |= stackdata
-            stacks.update(stackdata)
-            if len(stacks) != (nstacks + n):
-                raise OSError(f"multiple stacks with {infile} ??")
+            for stack, obis in read_changed(infile).items():
+                if stack in stacks:
+                    raise OSError(f"multiple stacks with {infile} ??")
 
-            nstacks = len(stacks)
+                assert stack not in status
+                stacks[stack] = obis
+                status[stack] = state
 
     # I am *VERY* surprised we have mappings in stacks20 for all
     # elements in unchanged.
@@ -203,70 +237,201 @@ def find_stack_obis(indir):
         assert stack20 not in stacks
         stacks[stack20] = stacks20[stack20]
 
-    return stacks
+    return stacks, status, stacks20
+
+
+def find_stack_obis(indir):
+    """Create the mapping from stack id to obis"""
+
+    return read_stack_lists(indir)[0]
 
 
 def find_stack_status(indir):
-    """Is this new/updated/unchanged?
+    """Is this new/updated/unchanged?"""
+
+    return read_stack_lists(indir)[1]
+
+
+# Change this if the contents of the snapshot change.
+#
+SNAPSHOT_VERSION = 1
+
+
+def snapshot_path():
+    """The default location of the StackCatalog snapshot."""
+
+    return os.path.join(respcache.settings["cachedir"], "stackcatalog.pickle")
 
-    Should have been part of find_stack_obis but I can't
-    be bothered to retro-fit things.
+
+class StackCatalog:
+    """The stack data from the input lists.
+
+    The fields are
+
+      obis      stack id to the sorted list of (obsid, obi) pairs
+      status    stack id to new, updated, or unchanged
+      targets   obsid to target name
+      stacks20  the CSC 2.0 stack id to obis mapping
+
+    Use StackCatalog.load to read in the data, or a snapshot of
+    the data if the input files have not changed.
     """
 
-    if not indir.is_dir():
-        raise ValueError(f"'{indir} is not a directory")
+    def __init__(self, obis, status, targets, stacks20):
+        self.obis = obis
+        self.status = status
+        self.targets = targets
+        self.stacks20 = stacks20
 
-    stacks = {}
-    for inst in ["acis", "hrc"]:
+    @staticmethod
+    def input_files(indir):
+        """The files the catalog is created from."""
 
-        infile = indir / f"{inst}_stacks_unchanged.txt"
-        for stack in read_unchanged(infile):
-            assert stack not in stacks
-            stacks[stack] = "unchanged"
+        out = [indir / f"{inst}_stacks_{state}.txt"
+               for inst in ["acis", "hrc"]
+               for state in ["unchanged", "updated", "new"]]
+        return out + ["csc20_detect_stack_obi.lis", "obsid-targets.tsv"]
 
-        for status in ["updated", "new"]:
-            infile = indir / f"{inst}_stacks_{status}.txt"
+    @staticmethod
+    def signature(indir):
+        """The name, modification time, and size of each input file."""
 
-            for stack in read_changed(infile):
-                assert stack not in stacks
-                stacks[stack] = status
+        out = []
+        for infile in StackCatalog.input_files(indir):
+            stat = os.stat(infile)
+            out.append((os.path.abspath(infile), stat.st_mtime_ns,
+                        stat.st_size))
 
-    return stacks
+        return out
+
+    @staticmethod
+    def read(indir):
+        """Read in the input files (ignoring any snapshot)."""
+
+        obis, status, stacks20 = read_stack_lists(indir)
+        return StackCatalog(obis, status, read_cxc_targetnames(), stacks20)
+
+    @staticmethod
+    def load(indir, snapshot=None, use_snapshot=True):
+        """Read in the data, using the snapshot if it is valid.
+
+        The snapshot (snapshot_path() if not given) is re-created
+        if any input file has changed since it was written.
+        """
+
+        if not use_snapshot:
+            return StackCatalog.read(indir)
+
+        if snapshot is None:
+            snapshot = snapshot_path()
+
+        signature = StackCatalog.signature(indir)
+        try:
+            with open(snapshot, "rb") as fh:
+                store = pickle.load(fh)
+
+            if store["version"] == SNAPSHOT_VERSION and \
+               store["inputs"] == signature:
+                return StackCatalog(**store["catalog"])
+
+        except (OSError, EOFError, KeyError, TypeError,
+                pickle.UnpicklingError):
+            pass
+
+        catalog = StackCatalog.read(indir)
+        catalog.save(snapshot, signature)
+        return catalog
+
+    def save(self, snapshot, signature):
+        """Write out the snapshot.
+
+        The file is written to a temporary file and then renamed, so
+        that a concurrent run does not see a partially-written file.
+        """
+
+        store = {"version": SNAPSHOT_VERSION,
+                 "inputs": signature,
+                 "catalog": {"obis": self.obis,
+                             "status": self.status,
+                             "targets": self.targets,
+                             "stacks20": self.stacks20}}
+
+        outdir = os.path.dirname(os.path.abspath(snapshot))
+        os.makedirs(outdir, exist_ok=True)
+        fd, tmpname = tempfile.mkstemp(dir=outdir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as fh:
+                pickle.dump(store, fh, protocol=pickle.HIGHEST_PROTOCOL)
+
+            os.replace(tmpname, snapshot)
+        except BaseException:
+            os.unlink(tmpname)
+            raise
 
 
-def get_stack_numbers():
+def get_stack_numbers(nparts=1, nworkers=4, url=TAP_URL):
     """What are the number of sources for each stack?
 
-    We should be able to do this with ADQL but I am not sure how,
-    so just read in the data and do the calculation in Python.
+    This is count_stack_sources applied to get_stack_assoc.
+    """
+
+    return count_stack_sources(get_stack_assoc(nparts=nparts,
+                                               nworkers=nworkers,
+                                               url=url))
+
+
+def get_stack_assoc(nparts=1, nworkers=4, url=TAP_URL):
+    """What sources are in each stack?
+
+    We should be able to count the sources with ADQL but I am not
+    sure how, so just read in the data and do the calculation in
+    Python (count_stack_sources). The association is also used to
+    create the stack index (see stackindex.py).
 
     Note that this is being run later than when the status data
     was processed, so it may contain extra stacks.
 
     We cold do this with pyvo but I am trying to make this easy to
     run from a generic work machine, so we use curl unstead.
+
+    If nparts is greater than 1 then the query is split up by
+    source name and run in parallel (see tap_fetch_ranges).
+
+    The return value has the name and stack fields, which are
+    lists of the source name and stack id of each pair.
     """
 
     print("-> start stack count")
     tstart = time.time()
-    proc = sbp.run(["curl",
-                    "--silent",
-                    "--request", "POST",
-                    "--location",
-                    "--data", "REQUEST=doQuery",
-                    "--data", "PHASE=RUN",
-                    "--data", "FORMAT=text",
-                    "--data", "LANG=ADQL",
-                    "--data", "QUERY=SELECT distinct a.name, a.detect_stack_id from csc21_snapshot.master_stack_assoc a",
-                    "https://cda.cfa.harvard.edu/csc21_snapshot_tap/sync"],
-                   check=True, stdout=sbp.PIPE)
+    if nparts == 1:
+        cts = tap_query(STACK_QUERY, "text", url=url)
+        parts = [tap_check(STACK_QUERY, "text", url,
+                           parse_stack_assoc, cts)]
+
+    else:
+        parts = tap_fetch_ranges(STACK_QUERY, "a.name", "text",
+                                 parse_stack_assoc, nparts,
+                                 nworkers=nworkers, url=url)
 
     tend = time.time()
     print(f"<- took {tend - tstart:.1f} seconds")
 
-    stacks = defaultdict(int)
+    # The ranges do not overlap, so they can be joined together.
+    #
+    out = {"name": [], "stack": []}
+    for part in parts:
+        out["name"].extend(part["name"])
+        out["stack"].extend(part["stack"])
+
+    return out
+
+
+def parse_stack_assoc(cts):
+    """Extract the (name, stack) pairs from the TAP response."""
+
+    out = {"name": [], "stack": []}
     header = True
-    for l in proc.stdout.decode().split("\n"):
+    for l in cts.decode().split("\n"):
         if header:
             if l.startswith("#"):
                 continue
@@ -282,32 +447,29 @@ def get_stack_numbers():
 
         toks = l.split("\t")
         assert len(toks) == 2, l
-        stacks[toks[1]] += 1
+        out["name"].append(toks[0])
+        out["stack"].append(toks[1])
 
-    # remove default nature (so we know what stacks are not known)
-    #
-    out = {}
-    for stack, count in stacks.items():
-        out[stack] = count
+    if header:
+        raise ValueError("no header found")
 
     return out
 
 
-def roundy(v, n):
-    """Restrict to n decimal places.
+def count_stack_sources(assoc):
+    """Count the number of sources per stack (see get_stack_assoc)."""
 
-    Up to the vagueris of floating-point representation.
-
-    And have decided not to do this, so it just returns the
-    input value.
-    """
+    stacks = defaultdict(int)
+    for stack in assoc["stack"]:
+        stacks[stack] += 1
 
-    """
-    t = 10**n
-    return math.floor(v * t + 0.5) / t
-    """
+    # remove default nature (so we know what stacks are not known)
+    #
+    out = {}
+    for stack, count in stacks.items():
+        out[stack] = count
 
-    return v
+    return out
 
 
 def unitify(unitstr):
@@ -391,104 +553,128 @@ def add_convertor(metadata):
                                            metadata["datatype"])
 
 
-def srclist_update_store(store, row):
-    """Add the column data to the store.
+def srclist_field_metadata(field):
+    """Extract the metadata for a VOTABLE FIELD element."""
 
-    Special case handling for flux_aper_[b/w] and the _lolim/_hilim
-    variants.
+    name = field.attrib["name"]
+    mdata = {
+        "name": name,
+        "datatype": field.attrib["datatype"]
+    }
 
-    Extended sources (those ending in X) are skipped as they only
-    have a subset of the data we care about and I don't have the
-    energy to work in this just now.
-    """
-
-    toks = [r.text for r in row.findall('{http://www.ivoa.net/xml/VOTable/v1.2}TD')]
-    assert len(toks) == len(store["order"])
-
-    # need to "down convert" the fluxes
-    rowdata = dict(list(zip(store['order'], toks)))
-
-    # Skip extended sources
-    if rowdata['name'].endswith("X"):
-        return
-
-    fb = rowdata['flux_aper_b']
-    fw = rowdata['flux_aper_w']
-
-    # Just cheking what the value is as dealing with different
-    # versions of the table (text/tsv vs VOTABLE)
+    # we currently don't make use of this null value, should we?
+    # (I'm assuming we don't have any null values in the data...)
     #
-    if fb is not None and fb.strip() == '':
-        print(rowdata['name'])
-        fb = None
-
-    if fw is not None and fw.strip() == '':
-        print(rowdata['name'])
-        fw = None
-
-    if fb is not None and fw is not None:
-        print("WARNING: {} has fb=[{}] fw=[{}]".format(name,
-                                                       fb,
-                                                       fw))
-
-    # extract flux values here, not in loop
-    if fb is not None:
-        # band = 'broad'
-        band = 0
-        flux = fb  # rowdata['flux_aper_b']
-        fluxlo = rowdata['flux_aper_lolim_b']
-        fluxhi = rowdata['flux_aper_hilim_b']
-    elif fw is not None:
-        # band = 'wide'
-        band = 1
-        flux = fw  # rowdata['flux_aper_w']
-        fluxlo = rowdata['flux_aper_lolim_w']
-        fluxhi = rowdata['flux_aper_hilim_w']
-    else:
-        # band = ''
-        band = -1
-        flux = None
-        fluxlo = None
-        fluxhi = None
+    if field.attrib["datatype"] == "int":
+        try:
+            mdata["null"] = int(field.findall(VOT_NS + "VALUES[@null]")[0].attrib["null"])
+        except IndexError:
+            pass
 
-    flux = convert_to_float(flux)
-    fluxlo = convert_to_float(fluxlo)
-    fluxhi = convert_to_float(fluxhi)
+    add_convertor(mdata)
+    return mdata
 
-    # row = {}
-    row = []
 
-    # Ugh: trying to be generic but also re-ordering/naming the columns.
-    #
-    for col, val in zip(store['order'], toks):
-        assert col not in row  # not sure this is even meaningful anymore
+def srclist_output_columns(order):
+    """The column names after the flux columns have been merged."""
+
+    cnames = []
+    for col in order:
 
-        # We assume the fluxes are in a set order so when we
-        # hit the first one we can replace with our
-        # Need to handle conversion of flux values
-        #
         if col == 'flux_aper_b':
-            row.extend([band, flux, fluxlo, fluxhi])
+            cnames.extend(["fluxband", "flux", "flux_lolim", "flux_hilim"])
 
         # Can skip the flux columns as already handled.
         #
         if col.startswith('flux_aper'):
             continue
 
-        try:
-            val = store["metadata"][col]["convertor"](val)
-        except ValueError:
-            print("Unable to convert '{}'".format(val))
+        cnames.append(col)
+
+    return cnames
+
+
+def srclist_convert_columns(metadata, names, rows):
+    """Convert the rows of tokens, returning a srctable.Column per name.
+
+    The conversion is done a column at a time, but matches the
+    metadata convertor for each column (so, for example, missing
+    integers are set to -999).
+    """
+
+    import srctable
+
+    columns = {}
+    for name, toks in zip(names, zip(*rows)):
+        mdata = metadata[name]
+        dtype = mdata["datatype"]
+        if dtype == "char" and not name.endswith("_flag"):
+            kind = "string"
+        elif dtype == "double":
+            kind = "float"
+        elif dtype == "int":
+            kind = "integer"
+        else:
+            kind = "flag"
+
+        columns[name] = srctable.convert_column(toks, kind,
+                                                mdata["convertor"])
+
+    return columns
 
-        if col == 'ra':
-            val = roundy(val, 4)
-        elif col == 'dec':
-            val = roundy(val, 5)
 
-        # row[col] = val
-        row.append(val)
+def srclist_binary_column(mdata, values, mask):
+    """Convert the votbinary column, returning a srctable.Column.
 
-    store['rows'].append(row)
+    The conversions match srclist_convert_columns.
+    """
+
+    import numpy as np
+    import srctable
+
+    name = mdata["name"]
+    dtype = mdata["datatype"]
+    if dtype == "char" and name.endswith("_flag"):
+        values = np.char.strip(values)
+        true = values == "T"
+        if not np.all(true | (values == "F")):
+            raise ValueError(f"Invalid FLAG value in {name}")
+
+        return srctable.Column(true.astype(np.int8))
+
+    if dtype == "char":
+        return srctable.Column(np.char.strip(values))
+
+    if dtype == "boolean":
+        if mask.any():
+            raise ValueError(f"Null FLAG value in {name}")
+
+        return srctable.Column(values.astype(np.int8))
+
+    if dtype == "int":
+        # Missing integers are stored as -999 rather than masked.
+        return srctable.Column(np.where(mask, srctable.INT_NULL, values))
+
+    if dtype == "double":
+        return srctable.Column(values, mask)
+
+    raise ValueError(dtype)
+
+
+def srclist_make_table(names, columns):
+    """Create the source table from the converted columns.
+
+    Extended sources (those ending in X) are skipped as they only
+    have a subset of the data we care about and I don't have the
+    energy to work in this just now. The flux columns are merged.
+    """
+
+    import numpy as np
+    import srctable
+
+    keep = ~np.char.endswith(columns["name"].text(), "X")
+    columns = {name: col[keep] for name, col in columns.items()}
+    return srctable.merge_fluxes(names, columns, columns["name"])
 
 
 def srclist_process_votable(cts):
@@ -497,19 +683,19 @@ def srclist_process_votable(cts):
     tstart = time.time()
 
     root = ET.fromstring(cts)
-    check = root.findall("./{http://www.ivoa.net/xml/VOTable/v1.2}RESOURCE/{http://www.ivoa.net/xml/VOTable/v1.2}INFO[@value='OK']")
+    check = root.findall(f"./{VOT_NS}RESOURCE/{VOT_NS}INFO[@value='OK']")
     if len(check) != 1:
         # don't bother reporting more info until we need to
         raise ValueError("query was not OK")
 
-    tbls = root.findall("./{http://www.ivoa.net/xml/VOTable/v1.2}RESOURCE/{http://www.ivoa.net/xml/VOTable/v1.2}TABLE[@name='results']")
+    tbls = root.findall(f"./{VOT_NS}RESOURCE/{VOT_NS}TABLE[@name='results']")
     if len(tbls) != 1:
         # don't bother reporting more info until we need to
         raise ValueError(f"expected 1 table, found {len(tbls)}")
 
     tbl = tbls[0]
-    fields = tbl.findall("{http://www.ivoa.net/xml/VOTable/v1.2}FIELD")
-    datas = tbl.findall("{http://www.ivoa.net/xml/VOTable/v1.2}DATA")
+    fields = tbl.findall(VOT_NS + "FIELD")
+    datas = tbl.findall(VOT_NS + "DATA")
 
     assert len(fields) == 25
     assert len(datas) == 1
@@ -517,58 +703,359 @@ def srclist_process_votable(cts):
     names = []
     metadata = {}
     for field in fields:
-        name = field.attrib["name"]
-        names.append(name)
+        mdata = srclist_field_metadata(field)
+        names.append(mdata["name"])
+        metadata[mdata["name"]] = mdata
 
-        mdata = {
-            "name": name,
-            "datatype": field.attrib["datatype"]
-        }
+    rows = []
+    data = datas[0]
+    for row in data.findall(f"{VOT_NS}TABLEDATA/{VOT_NS}TR"):
+        toks = [r.text for r in row.findall(VOT_NS + 'TD')]
+        assert len(toks) == len(names)
+        rows.append(toks)
 
-        # we currently don't make use of this null value, should we?
-        # (I'm assuming we don't have any null values in the data...)
-        #
-        if field.attrib["datatype"] == "int":
-            try:
-                mdata["null"] = int(field.findall("{http://www.ivoa.net/xml/VOTable/v1.2}VALUES[@null]")[0].attrib["null"])
-            except IndexError:
-                pass
+    # Convert a column at a time.
+    #
+    if len(rows) == 0:
+        raise ValueError("no rows found")
 
-        add_convertor(mdata)
-        metadata[name] = mdata
+    columns = srclist_convert_columns(metadata, names, rows)
+    del rows
 
-    store = {"metadata": metadata, "rows": [], "order": names}
-
-    data = datas[0]
-    for row in data.findall("{http://www.ivoa.net/xml/VOTable/v1.2}TABLEDATA/{http://www.ivoa.net/xml/VOTable/v1.2}TR"):
-        srclist_update_store(store, row)
+    table = srclist_make_table(names, columns)
 
     # We need to re-order the column names as we have mangled
     # them.
     #
-    cnames = []
-    for col in store["order"]:
+    store = {"metadata": metadata, "table": table,
+             "order": srclist_output_columns(names)}
+    assert store["order"] == table.names
 
-        if col == 'flux_aper_b':
-            cnames.extend(["fluxband", "flux", "flux_lolim", "flux_hilim"])
+    tend = time.time()
+    print(f"<- took {tend - tstart:.1f} seconds")
 
-        # Can skip the flux columns as already handled.
-        #
-        if col.startswith('flux_aper'):
-            continue
+    assert len(table) > 0
+    return store
 
-        cnames.append(col)
 
-    store["order"] = cnames
+def srclist_process_binary(cts):
+    """Process a VOTABLE which uses the BINARY or BINARY2 serialization.
+
+    The data is converted a column at a time, using NumPy, rather
+    than a cell at a time, but the table should match that from
+    srclist_process_votable.
+    """
+
+    import votbinary
+
+    print("-> start decoding source properties")
+    tstart = time.time()
+
+    fields, bincols = votbinary.process_votable(cts)
+    assert len(fields) == 25
+
+    names = []
+    metadata = {}
+    for field in fields:
+        mdata = srclist_field_metadata(field)
+        names.append(mdata["name"])
+        metadata[mdata["name"]] = mdata
+
+    columns = {}
+    for name in names:
+        values, mask = bincols[name]
+        columns[name] = srclist_binary_column(metadata[name], values, mask)
+
+    table = srclist_make_table(names, columns)
+    store = {"metadata": metadata, "table": table,
+             "order": srclist_output_columns(names)}
+    assert store["order"] == table.names
 
     tend = time.time()
     print(f"<- took {tend - tstart:.1f} seconds")
 
-    assert len(store["rows"]) > 0
+    assert len(table) > 0
     return store
 
 
-def get_source_properties():
+def srclist_stream_votable(fh, blocksize=10000):
+    """Process the VOTABLE incrementally.
+
+    This is the streaming version of srclist_process_votable: the
+    header (up to the start of the TABLEDATA block) is parsed
+    before returning, but the "tables" field is an iterator which
+    reads the TR elements, discarding them once they have been
+    read, and returns a srctable.SourceTable for every blocksize
+    rows (the last one may be smaller). This means
+    that the whole response never has to be held in memory. The
+    check on the query status is made once all the rows have been
+    read.
+
+    The fh argument must be a binary file-like object (e.g. the
+    stdout of a subprocess).
+    """
+
+    # Track the element nesting so that we only check the
+    # RESOURCE/INFO and RESOURCE/TABLE/FIELD elements, to match
+    # srclist_process_votable.
+    #
+    path = []
+    state = {"nok": 0}
+
+    def handle(event, elem):
+        if event == "start":
+            path.append(elem.tag)
+            return
+
+        path.pop()
+        if elem.tag == VOT_NS + "INFO" and \
+           path[-1:] == [VOT_NS + "RESOURCE"] and \
+           elem.attrib.get("value") == "OK":
+            state["nok"] += 1
+
+    events = ET.iterparse(fh, events=("start", "end"))
+
+    names = []
+    metadata = {}
+    tabledata = None
+    for event, elem in events:
+        handle(event, elem)
+        if event == "start":
+            if elem.tag == VOT_NS + "TABLEDATA":
+                tabledata = elem
+                break
+
+            continue
+
+        if elem.tag == VOT_NS + "FIELD" and \
+           path[-2:] == [VOT_NS + "RESOURCE", VOT_NS + "TABLE"]:
+            mdata = srclist_field_metadata(elem)
+            names.append(mdata["name"])
+            metadata[mdata["name"]] = mdata
+
+    if tabledata is None:
+        raise ValueError("no TABLEDATA block found")
+
+    assert len(names) == 25
+
+    def convert(block):
+        columns = srclist_convert_columns(metadata, names, block)
+        return srclist_make_table(names, columns)
+
+    def tables():
+        nrows = 0
+        block = []
+        for event, elem in events:
+            handle(event, elem)
+            if event != "end" or elem.tag != VOT_NS + "TR":
+                continue
+
+            toks = [r.text for r in elem.findall(VOT_NS + 'TD')]
+            assert len(toks) == len(names)
+            block.append(toks)
+
+            # Drop the processed row so that memory use does not
+            # grow with the number of rows.
+            #
+            tabledata.clear()
+
+            if len(block) < blocksize:
+                continue
+
+            out = convert(block)
+            block = []
+
+            nrows += len(out)
+            yield out
+
+        if len(block) > 0:
+            out = convert(block)
+            nrows += len(out)
+            yield out
+
+        if state["nok"] != 1:
+            # don't bother reporting more info until we need to
+            raise ValueError("query was not OK")
+
+        assert nrows > 0
+
+    return {"metadata": metadata,
+            "order": srclist_output_columns(names),
+            "tables": tables()}
+
+
+def tap_command(query, fmt, url=TAP_URL, fail=False):
+    """The curl command to run the ADQL query against the TAP service.
+
+    We cold do this with pyvo but I am trying to make this easy to
+    run from a generic work machine, so we use curl unstead.
+
+    If fail is set then curl exits with an error if the server
+    returns an error (such as a 503).
+    """
+
+    command = ["curl",
+               "--silent",
+               "--request", "POST",
+               "--location"]
+    if fail:
+        command.append("--fail")
+
+    return command + ["--data", "REQUEST=doQuery",
+                      "--data", "PHASE=RUN",
+                      "--data-urlencode", f"FORMAT={fmt}",
+                      "--data", "LANG=ADQL",
+                      "--data", f"QUERY={query}",
+                      url]
+
+
+def tap_params(query, fmt):
+    """The parameters that identify the query (for the cache)."""
+
+    return {"FORMAT": fmt, "LANG": "ADQL", "QUERY": query}
+
+
+def tap_query(query, fmt, url=TAP_URL, fail=False):
+    """Run the query, returning the response.
+
+    The response is taken from the cache if possible (see
+    respcache.py), otherwise curl is used (see tap_command).
+    """
+
+    def download():
+        command = tap_command(query, fmt, url=url, fail=fail)
+        return sbp.run(command, check=True, stdout=sbp.PIPE).stdout
+
+    return respcache.fetch(url, tap_params(query, fmt), download)
+
+
+def tap_check(query, fmt, url, process, cts):
+    """Return process(cts), removing the response from the cache on error.
+
+    This means that a bad response - such as a query which was not
+    OK - is not re-used.
+    """
+
+    try:
+        return process(cts)
+    except:
+        respcache.invalidate(url, tap_params(query, fmt))
+        raise
+
+
+def tap_name_ranges(nparts, prefix="2CXO J"):
+    """Split the source names into nparts ranges.
+
+    The CSC source names start with the RA (2CXO JHHMMSS.s...) so
+    the ranges are chosen by RA hour, with the first and last ranges
+    being open-ended so that no name can be missed. The return value
+    is a list of (lo, hi) pairs, where lo <= name < hi and None means
+    there is no limit.
+    """
+
+    if nparts < 1 or nparts > 24:
+        raise ValueError(f"nparts must be in the range 1 to 24, not {nparts}")
+
+    bounds = [f"{prefix}{24 * idx // nparts:02d}" for idx in range(1, nparts)]
+    return list(zip([None] + bounds, bounds + [None]))
+
+
+def tap_range_query(query, column, lo, hi):
+    """Restrict the ADQL query to lo <= column < hi.
+
+    The query must not already contain a WHERE clause. The range is
+    added before any ORDER BY clause.
+    """
+
+    if " WHERE " in query.upper():
+        raise ValueError("The query already has a WHERE clause")
+
+    conds = []
+    if lo is not None:
+        conds.append(f"{column} >= '{lo}'")
+
+    if hi is not None:
+        conds.append(f"{column} < '{hi}'")
+
+    if len(conds) == 0:
+        return query
+
+    where = " WHERE " + " AND ".join(conds)
+    idx = query.upper().find(" ORDER BY ")
+    if idx < 0:
+        return query + where
+
+    return query[:idx] + where + query[idx:]
+
+
+def tap_fetch(query, fmt, process, url=TAP_URL, retries=3, delay=5):
+    """Run the query and process the output.
+
+    The call is repeated, after a delay, if curl fails or process
+    raises a ValueError (such as a query that was not OK), up to
+    retries times.
+    """
+
+    for attempt in range(1, retries + 1):
+        try:
+            cts = tap_query(query, fmt, url=url, fail=True)
+            return tap_check(query, fmt, url, process, cts)
+
+        except (sbp.CalledProcessError, ValueError) as exc:
+            if attempt == retries:
+                raise
+
+            if isinstance(exc, sbp.CalledProcessError):
+                reason = f"curl exit status {exc.returncode}"
+            else:
+                reason = str(exc)
+
+            print(f"   attempt {attempt} failed ({reason}), retrying")
+            time.sleep(delay * attempt)
+
+
+def tap_fetch_ranges(query, column, fmt, process, nparts,
+                     nworkers=4, retries=3, delay=5, url=TAP_URL):
+    """Run the query as nparts separate name ranges.
+
+    The ranges (from tap_name_ranges) are run in parallel, with at
+    most nworkers queries at a time, and a range which fails is
+    retried on its own (see tap_fetch). The process argument is
+    called on the output of each range, and the results are
+    returned in name order.
+    """
+
+    queries = [tap_range_query(query, column, lo, hi)
+               for lo, hi in tap_name_ranges(nparts)]
+
+    print(f"   running {nparts} queries with {nworkers} workers")
+    with ThreadPoolExecutor(max_workers=nworkers) as pool:
+        futures = [pool.submit(tap_fetch, rquery, fmt, process, url=url,
+                               retries=retries, delay=delay)
+                   for rquery in queries]
+        return [future.result() for future in futures]
+
+
+def srclist_merge(stores):
+    """Combine the source properties from separate name ranges.
+
+    The stores must be in name order.
+    """
+
+    import srctable
+
+    for store in stores[1:]:
+        if store["order"] != stores[0]["order"]:
+            raise ValueError("The name ranges have different columns")
+
+    return {"metadata": stores[0]["metadata"],
+            "table": srctable.SourceTable.concatenate([store["table"]
+                                                       for store in stores]),
+            "order": stores[0]["order"]}
+
+
+def get_source_properties(stream=False, binary=False, nparts=1,
+                          nworkers=4, url=TAP_URL):
     """What are the current source properties?
 
     This follows the CSC 2.0 props2json.py code but we don't have a
@@ -584,23 +1071,135 @@ def get_source_properties():
 
     Note: we EXCLUDE the extended sources but only in post processing
 
+    If stream is set then the response is processed as it is
+    downloaded, and the return value contains a "tables" field,
+    which is an iterator of tables, rather than "table" (see
+    srclist_stream_votable). The tables must be consumed for the
+    query to be completed.
+
+    If binary is set then the BINARY2 serialization is requested,
+    and the response is decoded a column at a time (this requires
+    NumPy). It can not be combined with stream.
+
+    If nparts is greater than 1 then the query is split up into
+    name ranges which are run in parallel, using nworkers queries at
+    a time, and the results combined (see tap_fetch_ranges). It can
+    not be combined with stream.
+
     """
 
+    if stream and binary:
+        raise ValueError("stream and binary can not both be set")
+
+    if stream and nparts > 1:
+        raise ValueError("stream can not be used with nparts > 1")
+
     print("-> start source properties")
     tstart = time.time()
-    proc = sbp.run(["curl",
-                    "--silent",
-                    "--request", "POST",
-                    "--location",
-                    "--data", "REQUEST=doQuery",
-                    "--data", "PHASE=RUN",
-                    "--data", "FORMAT=votable",
-                    "--data", "LANG=ADQL",
-                    "--data", "QUERY=SELECT DISTINCT m.name,m.ra,m.dec,m.err_ellipse_r0,m.err_ellipse_r1,m.err_ellipse_ang,m.conf_flag,m.sat_src_flag,m.acis_num,m.hrc_num,m.var_flag,m.significance,m.flux_aper_b,m.flux_aper_lolim_b,m.flux_aper_hilim_b,m.flux_aper_w,m.flux_aper_lolim_w,m.flux_aper_hilim_w,m.nh_gal,m.hard_hm,m.hard_hm_lolim,m.hard_hm_hilim,m.hard_ms,m.hard_ms_lolim,m.hard_ms_hilim FROM csc21_snapshot.master_source m ORDER BY name ASC",
-                    "https://cda.cfa.harvard.edu/csc21_snapshot_tap/sync"],
-                   check=True, stdout=sbp.PIPE)
 
-    tend = time.time()
-    print(f"<- took {tend - tstart:.1f} seconds")
+    if nparts > 1:
+        if binary:
+            fmt, process = BINARY2_FORMAT, srclist_process_binary
+        else:
+            fmt, process = "votable", lambda cts: srclist_process_votable(cts.decode())
+
+        stores = tap_fetch_ranges(SOURCE_QUERY, "m.name", fmt, process,
+                                  nparts, nworkers=nworkers, url=url)
+
+        tend = time.time()
+        print(f"<- took {tend - tstart:.1f} seconds")
 
-    return srclist_process_votable(proc.stdout.decode())
+        return srclist_merge(stores)
+
+    if binary:
+        cts = tap_query(SOURCE_QUERY, BINARY2_FORMAT, url=url)
+
+        tend = time.time()
+        print(f"<- took {tend - tstart:.1f} seconds")
+
+        return tap_check(SOURCE_QUERY, BINARY2_FORMAT, url,
+                         srclist_process_binary, cts)
+
+    if not stream:
+        cts = tap_query(SOURCE_QUERY, "votable", url=url)
+
+        tend = time.time()
+        print(f"<- took {tend - tstart:.1f} seconds")
+
+        return tap_check(SOURCE_QUERY, "votable", url,
+                         lambda cts: srclist_process_votable(cts.decode()),
+                         cts)
+
+    # In streaming mode a cached response is read directly from the
+    # file, otherwise the response is copied to the cache as it is
+    # read, and only added to the cache if it is read in completely.
+    #
+    params = tap_params(SOURCE_QUERY, "votable")
+    path = respcache.lookup(url, params)
+    if path is not None:
+        return stream_cached_votable(path, url, params, tstart)
+
+    command = tap_command(SOURCE_QUERY, "votable", url=url)
+    proc = sbp.Popen(command, stdout=sbp.PIPE)
+    entry = respcache.Entry(url, params)
+    try:
+        store = srclist_stream_votable(respcache.TeeReader(proc.stdout,
+                                                           entry))
+    except:
+        proc.kill()
+        proc.wait()
+        entry.discard()
+        raise
+
+    def tables(tableiter):
+        try:
+            try:
+                yield from tableiter
+            finally:
+                proc.stdout.close()
+                retcode = proc.wait()
+
+            if retcode != 0:
+                raise sbp.CalledProcessError(retcode, command)
+
+        except:
+            entry.discard()
+            raise
+
+        entry.commit()
+
+        tend = time.time()
+        print(f"<- streaming took {tend - tstart:.1f} seconds")
+
+    store["tables"] = tables(store["tables"])
+    return store
+
+
+def stream_cached_votable(path, url, params, tstart):
+    """Stream the source properties from the cache.
+
+    See get_source_properties.
+    """
+
+    fh = gzip.open(path, 'rb')
+    try:
+        store = srclist_stream_votable(fh)
+    except:
+        fh.close()
+        respcache.invalidate(url, params)
+        raise
+
+    def tables(tableiter):
+        try:
+            yield from tableiter
+        except Exception:
+            respcache.invalidate(url, params)
+            raise
+        finally:
+            fh.close()
+
+        tend = time.time()
+        print(f"<- streaming took {tend - tstart:.1f} seconds")
+
+    store["tables"] = tables(store["tables"])
+    return store
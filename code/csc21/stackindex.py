@@ -0,0 +1,122 @@
+"""
+An index from stack to the sources in the stack.
+
+The master_stack_assoc table lists the (source name, stack) pairs,
+which get_stack_assoc in stackdata.py downloads (to count the
+sources in each stack). This module turns these pairs into a
+compressed sparse row (CSR) index into the source-property table:
+the sources in the i'th stack are
+
+    rows[offsets[i]:offsets[i + 1]]
+
+where rows are the (0-based) positions of the sources in the full
+table - that is, the start field of a chunk plus the position in
+the chunk - in increasing order. The stacks are sorted by name.
+
+Sources which are not in the source-property table (such as the
+extended sources, which are removed) are not included.
+
+Requires NumPy.
+
+"""
+
+import gzip
+import json
+
+import numpy as np
+
+import srcjson
+
+
+def build(srcnames, names, stacks):
+    """Create the index.
+
+    Parameters
+    ----------
+    srcnames : sequence of str
+        The source names, in the order of the source-property table.
+    names, stacks : sequence of str
+        The source name and stack id of each pair.
+
+    Returns
+    -------
+    index : dict
+        The stacks (ndarray of str), offsets and rows (ndarray of
+        int) fields, and nmissing, the number of pairs whose source
+        is not in srcnames.
+    """
+
+    srcnames = np.asarray(srcnames, dtype=str)
+    names = np.asarray(names, dtype=str)
+    stacks = np.asarray(stacks, dtype=str)
+
+    # Find the position of each name in the table.
+    #
+    order = np.argsort(srcnames, kind="stable")
+    pos = np.searchsorted(srcnames[order], names)
+    pos = np.minimum(pos, max(len(srcnames) - 1, 0))
+    if len(srcnames) > 0:
+        found = srcnames[order][pos] == names
+        rows = order[pos]
+    else:
+        found = np.zeros(len(names), dtype=bool)
+        rows = np.zeros(len(names), dtype=np.int64)
+
+    ustacks, codes = np.unique(stacks, return_inverse=True)
+    codes = codes[found]
+    rows = rows[found]
+
+    idx = np.lexsort((rows, codes))
+    counts = np.bincount(codes, minlength=len(ustacks))
+    offsets = np.zeros(len(ustacks) + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+
+    return {"stacks": ustacks, "offsets": offsets,
+            "rows": rows[idx].astype(np.int64),
+            "nmissing": int(np.count_nonzero(~found))}
+
+
+def write(outname, index, nsources, compress=False):
+    """Write out the index as JSON.
+
+    The file contains the nsources (the number of rows in the
+    source-property table), stacks, offsets, and rows fields.
+    """
+
+    out = {"nsources": nsources,
+           "stacks": index["stacks"].tolist(),
+           "offsets": index["offsets"].tolist(),
+           "rows": index["rows"].tolist()}
+
+    with srcjson.open_output(outname, compress=compress) as fh:
+        fh.write(json.dumps(out))
+
+
+def read(filename):
+    """Read in the index (which may be gzip-compressed)."""
+
+    with open(filename, "rb") as fh:
+        cts = fh.read()
+
+    if cts[:2] == b"\x1f\x8b":
+        cts = gzip.decompress(cts)
+
+    js = json.loads(cts)
+    return {"nsources": js["nsources"],
+            "stacks": np.asarray(js["stacks"], dtype=str),
+            "offsets": np.asarray(js["offsets"], dtype=np.int64),
+            "rows": np.asarray(js["rows"], dtype=np.int64)}
+
+
+def lookup(index, stack):
+    """Return the rows of the sources in the stack.
+
+    A KeyError is raised if the stack is not known.
+    """
+
+    stacks = index["stacks"]
+    idx = np.searchsorted(stacks, stack)
+    if idx == len(stacks) or stacks[idx] != stack:
+        raise KeyError(stack)
+
+    return index["rows"][index["offsets"][idx]:index["offsets"][idx + 1]]
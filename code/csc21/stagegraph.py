@@ -0,0 +1,108 @@
+"""
+Run a set of stages, each as soon as the stages it depends on
+have finished.
+
+make_status.py used to run each step in turn, so the local work had
+to wait for the TAP queries, and the second query for the first.
+Here each stage is given as
+
+  name: (func, deps)
+
+where deps is a list of stage names, and func is called with the
+return values of these stages (in the same order). The stages are
+run by a pool of threads, which is fine for the network queries
+and file output, and the stages can still use a process pool for
+the heavy lifting (see srcjson.run_jobs).
+
+If a stage fails then no new stages are started, the running stages
+are allowed to finish, and the error is re-raised.
+
+"""
+
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import time
+
+
+def check_stages(stages):
+    """Check that the dependencies are known and there is no cycle."""
+
+    for name, (_, deps) in stages.items():
+        for dep in deps:
+            if dep not in stages:
+                raise ValueError(f"Stage {name} depends on unknown stage {dep}")
+
+    done = set()
+    todo = set(stages)
+    while len(todo) > 0:
+        ready = [name for name in todo if set(stages[name][1]) <= done]
+        if len(ready) == 0:
+            raise ValueError(f"Stages have a dependency cycle: {sorted(todo)}")
+
+        done.update(ready)
+        todo.difference_update(ready)
+
+
+def run_stages(stages, nworkers=None):
+    """Run the stages.
+
+    Returns a dictionary of the return value of each stage and a
+    dictionary of the start and end time of each stage (in seconds,
+    relative to the start of the first stage).
+    """
+
+    check_stages(stages)
+    if nworkers is None:
+        nworkers = max(1, len(stages))
+
+    results = {}
+    timings = {}
+    t0 = time.perf_counter()
+
+    def run(name):
+        func, deps = stages[name]
+        start = time.perf_counter() - t0
+        out = func(*[results[dep] for dep in deps])
+        timings[name] = (start, time.perf_counter() - t0)
+        return out
+
+    todo = dict(stages)
+    running = {}
+    error = None
+    with ThreadPoolExecutor(max_workers=nworkers) as pool:
+        while True:
+            if error is None:
+                ready = [name for name, (_, deps) in todo.items()
+                         if all(dep in results for dep in deps)]
+                for name in ready:
+                    del todo[name]
+                    running[pool.submit(run, name)] = name
+
+            if len(running) == 0:
+                break
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                name = running.pop(future)
+                try:
+                    results[name] = future.result()
+                except Exception as exc:
+                    if error is None:
+                        error = exc
+
+    if error is not None:
+        raise error
+
+    return results, timings
+
+
+def print_timings(timings):
+    """Display the stage timings, in the order they started."""
+
+    total = max((end for _, end in timings.values()), default=0)
+    busy = sum(end - start for start, end in timings.values())
+    print("# stage                 start (s)  end (s)  time (s)")
+    for name, (start, end) in sorted(timings.items(),
+                                     key=lambda kv: kv[1]):
+        print(f"  {name:20s}  {start:9.2f}  {end:7.2f}  {end - start:8.2f}")
+
+    print(f"# wall-clock time: {total:.2f} s (sum of the stages: {busy:.2f} s)")
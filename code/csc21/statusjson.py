@@ -0,0 +1,180 @@
+"""
+The layouts of the stack status in wwt21_status.json.
+
+The original (dicts) layout has three objects keyed by the stack id:
+
+  stacks     the state code of each stack (see STATE_CODES)
+  completed  the completion time (Unix seconds) of the completed stacks
+  nsource    the number of sources in the completed stacks
+
+so each stack id is written out up to three times. The arrays
+layout (make_status.py --status-layout arrays) writes each stack
+id once, with the values stored in parallel arrays:
+
+  layout     "arrays"
+  stackids   the stack ids, in sorted order
+  stacks     the state code of each stack
+  completed  the completion time, or null
+  nsource    the number of sources, or null
+
+The other fields (such as lastupdate and nsources) are the same in
+both layouts. The read routine returns the dicts layout, whichever
+layout the file uses.
+
+Each status has a runid field, a hash of the contents (ignoring the
+lastupdate time, so two runs that find the same status have the
+same id). make_status.py saves the status of each run, and writes
+out the changes since the previous run (make_delta) as
+
+  base       the runid of the previous run
+  target     the runid of this run
+  nchanged   the number of stacks that have changed
+  changes    the stacks, completed, and nsource values of the
+             changed stacks (null means the value has been removed)
+  fields     the other fields that have changed (such as lastupdate)
+
+so a client that has the status for the base run can update it with
+apply_delta, and only needs to download the full file when it has
+neither the base nor the target run.
+
+"""
+
+import hashlib
+import json
+
+
+LAYOUTS = ["dicts", "arrays"]
+
+STATE_CODES = {"Pending": 0, "Completed": 1, "Processing": 2}
+
+STACK_FIELDS = ["stacks", "completed", "nsource"]
+
+
+def to_arrays(status):
+    """Convert the dicts layout to the arrays layout."""
+
+    stackids = sorted(status["stacks"])
+    out = {key: value for key, value in status.items()
+           if key not in STACK_FIELDS}
+    out["layout"] = "arrays"
+    out["stackids"] = stackids
+    out["stacks"] = [status["stacks"][stack] for stack in stackids]
+    out["completed"] = [status["completed"].get(stack) for stack in stackids]
+    out["nsource"] = [status["nsource"].get(stack) for stack in stackids]
+    return out
+
+
+def to_dicts(status):
+    """Convert the arrays layout to the dicts layout.
+
+    The input is returned if it is already in the dicts layout.
+    """
+
+    if status.get("layout") != "arrays":
+        return status
+
+    stackids = status["stackids"]
+    nstacks = len(stackids)
+    for key in STACK_FIELDS:
+        if len(status[key]) != nstacks:
+            raise ValueError(f"Expected {nstacks} values in {key}, " +
+                             f"found {len(status[key])}")
+
+    out = {key: value for key, value in status.items()
+           if key not in ["layout", "stackids"] + STACK_FIELDS}
+    out["stacks"] = dict(zip(stackids, status["stacks"]))
+    out["completed"] = {stack: value for stack, value in
+                        zip(stackids, status["completed"])
+                        if value is not None}
+    out["nsource"] = {stack: value for stack, value in
+                      zip(stackids, status["nsource"])
+                      if value is not None}
+    return out
+
+
+def read(filename):
+    """Read in the status file, returning the dicts layout."""
+
+    with open(filename, "rt") as fh:
+        return to_dicts(json.load(fh))
+
+
+def run_id(status):
+    """The id of the status (in the dicts layout)."""
+
+    content = {key: value for key, value in status.items()
+               if key not in ["lastupdate", "runid"]}
+    txt = json.dumps(content, sort_keys=True)
+    return hashlib.blake2b(txt.encode("utf-8"), digest_size=8).hexdigest()
+
+
+def make_delta(previous, current):
+    """The changes from the previous to the current status.
+
+    Both must be in the dicts layout, with the runid field set.
+    """
+
+    changes = {}
+    changed = set()
+    for key in STACK_FIELDS:
+        old = previous[key]
+        new = current[key]
+        changes[key] = {}
+        for stack in sorted(set(old) | set(new)):
+            if old.get(stack) != new.get(stack):
+                changes[key][stack] = new.get(stack)
+                changed.add(stack)
+
+    fields = {}
+    skip = STACK_FIELDS + ["runid"]
+    for key in sorted(set(previous) | set(current)):
+        if key in skip or previous.get(key) == current.get(key):
+            continue
+
+        fields[key] = current.get(key)
+
+    return {"base": previous["runid"],
+            "target": current["runid"],
+            "nchanged": len(changed),
+            "changes": changes,
+            "fields": fields}
+
+
+def apply_delta(status, delta):
+    """Return the status (dicts layout) updated by the delta.
+
+    A ValueError is raised if the status is not for the base run.
+    """
+
+    if status.get("runid") != delta["base"]:
+        raise ValueError(f"The status is for run {status.get('runid')}, " +
+                         f"not {delta['base']}")
+
+    out = dict(status)
+    for key in STACK_FIELDS:
+        values = dict(out[key])
+        for stack, value in delta["changes"][key].items():
+            if value is None:
+                values.pop(stack, None)
+            else:
+                values[stack] = value
+
+        out[key] = values
+
+    for key, value in delta["fields"].items():
+        if value is None:
+            out.pop(key, None)
+        else:
+            out[key] = value
+
+    out["runid"] = delta["target"]
+    return out
+
+
+def read_state(filename):
+    """Read in the saved status, returning None if there is none."""
+
+    try:
+        return read(filename)
+    except FileNotFoundError:
+        return None
@@ -0,0 +1,154 @@
+#!/usr/bin/env python
+
+"""Usage:
+
+  ./tap_standin.py votable stacks [--port 8765] [--fail-rate 0.2]
+
+Aim:
+
+A local stand-in for the CSC TAP service, so that the range-based
+queries of stackdata.py (tap_fetch_ranges) can be checked without
+querying the archive. The votable file is a saved response to the
+master_source query (stackdata.SOURCE_QUERY, using the TABLEDATA
+serialization) and stacks is a saved response to the stack query
+(stackdata.STACK_QUERY, text format). The server only understands
+the name ranges added by stackdata.tap_range_query, and returns
+the matching rows of the saved files.
+
+The --fail-rate option makes the given fraction of requests fail
+(with a 503 error), to check the retry handling.
+
+Point the code at the server with the url argument - e.g.
+
+  stackdata.get_source_properties(nparts=6, url="http://localhost:8765/sync")
+
+"""
+
+from http.server import HTTPServer, BaseHTTPRequestHandler
+import random
+import re
+import sys
+from urllib.parse import parse_qs
+
+
+def read_votable(infile):
+    """Split the VOTable into the text before, the rows, and after.
+
+    Each row is returned as a (name, text) pair, where the name is
+    the first column.
+    """
+
+    with open(infile, "rt") as fh:
+        cts = fh.read()
+
+    start = cts.index("<TABLEDATA>") + len("<TABLEDATA>")
+    end = cts.index("</TABLEDATA>")
+    rows = [(m.group(2), m.group(0))
+            for m in re.finditer(r"<TR>\s*<TD>(\s*)(.*?)\s*</TD>.*?</TR>",
+                                 cts[start:end], flags=re.DOTALL)]
+    return cts[:start], rows, cts[end:]
+
+
+def read_stacks(infile):
+    """Split the stack file into the header and the rows.
+
+    Each row is returned as a (name, text) pair.
+    """
+
+    header = []
+    rows = []
+    with open(infile, "rt") as fh:
+        for l in fh:
+            if l.startswith("#") or l.startswith("name\t"):
+                header.append(l)
+            elif l.strip() != "":
+                rows.append((l.split("\t")[0], l))
+
+    return "".join(header), rows
+
+
+def select(rows, query):
+    """Return the rows which match the name range in the query."""
+
+    lo = re.search(r"name >= '([^']*)'", query)
+    hi = re.search(r"name < '([^']*)'", query)
+    out = []
+    for name, text in rows:
+        if lo is not None and name < lo.group(1):
+            continue
+
+        if hi is not None and name >= hi.group(1):
+            continue
+
+        out.append(text)
+
+    return out
+
+
+def make_handler(votable, stacks, fail_rate, rng):
+
+    vhead, vrows, vtail = votable
+    shead, srows = stacks
+
+    class Handler(BaseHTTPRequestHandler):
+
+        def do_POST(self):
+            nbytes = int(self.headers.get("Content-Length", 0))
+            form = parse_qs(self.rfile.read(nbytes).decode())
+            query = form.get("QUERY", [""])[0]
+
+            if rng.random() < fail_rate:
+                self.send_error(503, "Simulated failure")
+                return
+
+            if "master_stack_assoc" in query:
+                body = shead + "".join(select(srows, query))
+                ctype = "text/plain"
+            elif "master_source" in query:
+                body = vhead + "".join(select(vrows, query)) + vtail
+                ctype = "application/x-votable+xml"
+            else:
+                self.send_error(400, "Unknown query")
+                return
+
+            out = body.encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", ctype)
+            self.send_header("Content-Length", str(len(out)))
+            self.end_headers()
+            self.wfile.write(out)
+
+    return Handler
+
+
+def doit(votable, stacks, port=8765, fail_rate=0):
+
+    handler = make_handler(read_votable(votable), read_stacks(stacks),
+                           fail_rate, random.Random(4832))
+    server = HTTPServer(("localhost", port), handler)
+    print(f"Serving on http://localhost:{port}/sync")
+    server.serve_forever()
+
+
+help_str = "A local stand-in for the CSC TAP service."
+
+
+if __name__ == "__main__":
+
+    import argparse
+
+    parser = argparse.ArgumentParser(description=help_str,
+                                     prog=sys.argv[0])
+
+    parser.add_argument('votable', type=str,
+                        help='The saved master_source query (TABLEDATA)')
+    parser.add_argument('stacks', type=str,
+                        help='The saved master_stack_assoc query (text)')
+    parser.add_argument('--port', type=int, default=8765,
+                        help='The port to use (default: %(default)s)')
+    parser.add_argument('--fail-rate', type=float, default=0,
+                        help='The fraction of requests that fail (default: %(default)s)')
+
+    args = parser.parse_args(sys.argv[1:])
+    doit(args.votable, args.stacks, port=args.port,
+         fail_rate=args.fail_rate)
@@ -0,0 +1,16 @@
+"""
+The scripts are run from their own directory, rather than installed,
+so add the csc21/ and code/ directories to the path.
+"""
+
+import os
+import sys
+
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+CSC21 = os.path.dirname(HERE)
+CODE = os.path.dirname(CSC21)
+
+for path in [CODE, CSC21]:
+    if path not in sys.path:
+        sys.path.insert(0, path)
@@ -0,0 +1,131 @@
+"""Tests for the HEALPix pixels (healpix.py) and the tiles (make_status.py)."""
+
+import gzip
+import json
+import os
+
+import numpy as np
+import pytest
+
+import healpix
+import make_status
+import stackdata
+
+
+DATADIR = os.path.join(os.path.dirname(__file__), "data")
+
+# Known NESTED pixel numbers, as (order, ra, dec, pixel). The base
+# pixels are 0-3 around the north pole (centered at ra = 45, 135,
+# 225, 315), 4-7 on the equator (centered at ra = 0, 90, 180, 270),
+# and 8-11 around the south pole. The children of pixel p are 4p
+# (south corner), 4p + 1 (east), 4p + 2 (west), and 4p + 3 (north).
+#
+KNOWN = [(0, 0, 0, 4), (0, 90, 0, 5), (0, 180, 0, 6), (0, 270, 0, 7),
+         (0, 45, 60, 0), (0, 135, 60, 1), (0, 225, 60, 2), (0, 315, 60, 3),
+         (0, 45, -60, 8), (0, 135, -60, 9), (0, 225, -60, 10),
+         (0, 315, -60, 11),
+         (1, 0, -10, 16), (1, 10, 0, 17), (1, 350, 0, 18), (1, 0, 10, 19),
+         (1, 360, 10, 19), (1, -10, 0, 18),
+         # The poles are at the corner of the faces of each cap (the
+         # face depends on ra, as with the HEALPix library).
+         (0, 0, 90, 0), (1, 0, 90, 3), (4, 0, 90, 255), (4, 120, 90, 511),
+         (0, 0, -90, 8), (1, 0, -90, 32), (4, 0, -90, 2048),
+         (10, 0, 90, 4**10 - 1), (10, 0, -90, 8 * 4**10)]
+
+
+@pytest.mark.parametrize("order,ra,dec,pixel", KNOWN)
+def test_known_pixels(order, ra, dec, pixel):
+    assert healpix.ang2pix_nest(order, [ra], [dec]).tolist() == [pixel]
+
+
+def test_ra_wraps():
+    rng = np.random.default_rng(8)
+    dec = rng.uniform(-90, 90, size=1000)
+    for order in [0, 3, 8]:
+        assert np.array_equal(healpix.ang2pix_nest(order, np.zeros(1000), dec),
+                              healpix.ang2pix_nest(order, np.full(1000, 360.0), dec))
+
+
+def test_nested():
+    """The parent of each pixel is the pixel at the previous order."""
+
+    rng = np.random.default_rng(80)
+    ra = rng.uniform(0, 360, size=20000)
+    dec = np.degrees(np.arcsin(rng.uniform(-1, 1, size=20000)))
+    parent = healpix.ang2pix_nest(0, ra, dec)
+    for order in range(1, 12):
+        pix = healpix.ang2pix_nest(order, ra, dec)
+        assert pix.min() >= 0
+        assert pix.max() < 12 * 4**order
+        assert np.array_equal(pix >> 2, parent), order
+        parent = pix
+
+
+def test_equal_area():
+    """Points spread evenly over the sphere fill the pixels evenly."""
+
+    rng = np.random.default_rng(12)
+    n = 480000
+    ra = rng.uniform(0, 360, size=n)
+    dec = np.degrees(np.arcsin(rng.uniform(-1, 1, size=n)))
+    counts = np.bincount(healpix.ang2pix_nest(2, ra, dec), minlength=192)
+    assert len(counts) == 192
+    expected = n / 192
+    assert np.all(np.abs(counts - expected) < 6 * np.sqrt(expected))
+
+
+def test_invalid_order():
+    with pytest.raises(ValueError):
+        healpix.order_to_nside(-1)
+
+    with pytest.raises(ValueError):
+        healpix.order_to_nside(30)
+
+
+def test_write_tiles(tmp_path):
+    with open(os.path.join(DATADIR, "srcprop_tabledata.vot"), "rt") as fh:
+        source_data = stackdata.srclist_process_votable(fh.read())
+
+    table = source_data["table"]
+    outhead = str(tmp_path / "srctile")
+    manifest = str(tmp_path / "srctiles.json")
+
+    # A tile from a previous run, which is now empty.
+    #
+    stale = tmp_path / "srctile.1.47.json.gz"
+    stale.write_bytes(b"")
+
+    make_status.write_tiles(source_data, 1, outhead=outhead,
+                            manifest=manifest)
+    assert not stale.exists()
+
+    with open(manifest, "rt") as fh:
+        info = json.load(fh)
+
+    assert info["scheme"] == "healpix-nested"
+    assert (info["order"], info["nside"]) == (1, 2)
+    assert info["cols"] == source_data["order"]
+    assert info["ntotal"] == len(table)
+    assert sum(tile[1] for tile in info["tiles"]) == len(table)
+
+    pixels = healpix.ang2pix_nest(1, table["ra"].values, table["dec"].values)
+    assert [tile[0] for tile in info["tiles"]] == sorted(set(pixels.tolist()))
+
+    names = []
+    for pixel, nrows, nbytes in info["tiles"]:
+        filename = info["file"].format(pixel=pixel)
+        assert filename == f"{outhead}.1.{pixel}.json.gz"
+        assert os.path.getsize(filename) == nbytes
+        with gzip.open(filename, "rt") as fh:
+            tile = json.load(fh)
+
+        assert tile["cols"] == source_data["order"]
+        assert len(tile["rows"]) == nrows
+        tnames = [row[0] for row in tile["rows"]]
+        assert tnames == table["name"][pixels == pixel].tolist()
+        names.extend(tnames)
+
+    assert sorted(names) == sorted(table["name"].tolist())
+    assert sorted(os.listdir(tmp_path)) == \
+        sorted([os.path.basename(info["file"].format(pixel=tile[0]))
+                for tile in info["tiles"]] + ["srctiles.json"])
@@ -0,0 +1,77 @@
+"""Check the source-property chunks against the original code.
+
+The files in data/srcprop_chunks/ were created by the original
+(list of rows) version of make_status.write_sources, with a chunk
+size of 2, from the source query in data/srcprop_tabledata.vot.
+"""
+
+import gzip
+import os
+
+import pytest
+
+import make_status
+import stackdata
+
+
+DATADIR = os.path.join(os.path.dirname(__file__), "data")
+CHUNKDIR = os.path.join(DATADIR, "srcprop_chunks")
+
+
+def read(name):
+    with open(os.path.join(DATADIR, name), "rt") as fh:
+        return fh.read()
+
+
+@pytest.mark.parametrize("process,votable",
+                         [(stackdata.srclist_process_votable,
+                           "srcprop_tabledata.vot"),
+                          (stackdata.srclist_process_binary,
+                           "srcprop_binary2.vot")])
+def test_chunks_match_original(tmp_path, process, votable):
+    source_data = process(read(votable))
+    make_status.write_sources(source_data,
+                              outhead=str(tmp_path / "srcprop"),
+                              chunksize=2)
+
+    expected = sorted(os.listdir(CHUNKDIR))
+    assert sorted(os.listdir(tmp_path)) == expected
+    for name in expected:
+        with open(os.path.join(CHUNKDIR, name), "rb") as fh:
+            want = fh.read()
+
+        assert (tmp_path / name).read_bytes() == want, name
+
+
+@pytest.mark.parametrize("typed_arrays", [False, True])
+def test_compressed_chunks_match(tmp_path, typed_arrays):
+    """The gzip chunks do not depend on the number of processes."""
+
+    source_data = stackdata.srclist_process_votable(read("srcprop_tabledata.vot"))
+    for nproc in [1, 2]:
+        outdir = tmp_path / str(nproc)
+        outdir.mkdir()
+        make_status.write_sources(source_data,
+                                  outhead=str(outdir / "srcprop"),
+                                  chunksize=2, compress=True, nproc=nproc,
+                                  typed_arrays=typed_arrays)
+
+    names = sorted(os.listdir(tmp_path / "1"))
+    expected = [f"{name}.gz" for name in sorted(os.listdir(CHUNKDIR))]
+    if typed_arrays:
+        expected = sorted(expected + [f"srcprop.{ctr}.bin.gz" for ctr in [1, 2, 3]])
+
+    assert names == expected
+    assert sorted(os.listdir(tmp_path / "2")) == names
+    for name in names:
+        data = (tmp_path / "1" / name).read_bytes()
+        assert (tmp_path / "2" / name).read_bytes() == data, name
+
+        # No file name or time stamp in the header (as with gzip -n).
+        #
+        assert data[3] == 0, name
+        assert data[4:8] == bytes(4), name
+
+        if name.endswith(".json.gz"):
+            with open(os.path.join(CHUNKDIR, name[:-3]), "rb") as fh:
+                assert gzip.decompress(data) == fh.read(), name
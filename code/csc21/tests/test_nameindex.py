@@ -0,0 +1,64 @@
+"""Tests for the sorted name index (nameindex.py)."""
+
+import pytest
+
+import nameindex
+import srctable
+
+
+NAMES = ["2CXO J000010.1+101010", "2CXO J000010.1+101011",
+         "2CXO J000020.2-202020", "2CXO J010203.4+050607",
+         "2CXO J120000.0+000000", "2CXO J235959.9-895959",
+         "2CXO J235959.9-895960"]
+
+
+def test_block_round_trip():
+    block = nameindex.encode_block(NAMES)
+    assert block.split("|")[1] == chr(48 + 20) + "1"
+    assert nameindex.decode_block(block) == NAMES
+
+    for pos, name in enumerate(NAMES):
+        assert nameindex.find_in_block(block, name) == pos
+
+    assert nameindex.find_in_block(block, "2CXO J000015") == -1
+    assert nameindex.find_in_block(block, "3") == -1
+
+
+def test_long_prefix():
+    names = ["a" * 100 + "b", "a" * 100 + "c"]
+    block = nameindex.encode_block(names)
+    assert nameindex.decode_block(block) == names
+
+
+def test_invalid_names():
+    with pytest.raises(ValueError):
+        nameindex.encode_block(["a|b"])
+
+    with pytest.raises(ValueError):
+        nameindex.build(["a", "b", "a"], [0])
+
+
+@pytest.mark.parametrize("order", [list(range(7)), [3, 0, 6, 2, 5, 1, 4]])
+@pytest.mark.parametrize("compress", [False, True])
+def test_round_trip(tmp_path, order, compress):
+    """Every name maps to its chunk and row after a write and read."""
+
+    names = [NAMES[idx] for idx in order]
+    chunks = [0, 3, 5]
+    index = nameindex.build(srctable.Column(names).values, chunks,
+                            blocksize=2)
+    assert (index["rows"] is None) == (order == sorted(order))
+
+    outname = str(tmp_path / "names.json")
+    nameindex.write(outname, index, compress=compress)
+    got = nameindex.read(outname)
+    assert got == index
+
+    for row, name in enumerate(names):
+        assert nameindex.find_row(got, name) == row
+        chunk = 1 if row < 3 else 2 if row < 5 else 3
+        assert nameindex.lookup(got, name) == (chunk, row - chunks[chunk - 1])
+
+    for name in ["2CXO J000000.0+000000", "2CXO J000015.0+000000", "3"]:
+        with pytest.raises(KeyError):
+            nameindex.lookup(got, name)
@@ -0,0 +1,132 @@
+"""Tests for the compressed versions of the data files (precompress.py)."""
+
+import gzip
+import os
+
+import pytest
+
+import make_status
+import precompress
+import stackdata
+
+
+DATADIR = os.path.join(os.path.dirname(__file__), "data")
+CHUNKDIR = os.path.join(DATADIR, "srcprop_chunks")
+
+
+def formats():
+    """The formats, skipping those whose module is not installed."""
+
+    available = precompress.available_formats()
+    return [pytest.param(fmt, marks=pytest.mark.skipif(fmt not in available,
+                                                       reason=f"no module for .{fmt}"))
+            for fmt in precompress.FORMATS]
+
+
+def read_chunk(name="srcprop.1.json"):
+    with open(os.path.join(CHUNKDIR, name), "rb") as fh:
+        return fh.read()
+
+
+@pytest.mark.parametrize("fmt", formats())
+def test_compress_round_trip(fmt):
+    data = read_chunk()
+    cdata = precompress.compress(data, fmt)
+    assert precompress.compress(data, fmt) == cdata
+    assert len(cdata) < len(data)
+    assert precompress.decompress(cdata, fmt) == data
+
+
+def test_unknown_format():
+    with pytest.raises(ValueError):
+        precompress.compress(b"[]", "bz2")
+
+    with pytest.raises(ValueError):
+        precompress.decompress(b"[]", "bz2")
+
+
+@pytest.mark.parametrize("fmt", formats())
+def test_process_file_twice(tmp_path, fmt):
+    """The same file is compressed to the same bytes, and not re-written."""
+
+    data = read_chunk()
+    infile = tmp_path / "srcprop.1.json"
+    infile.write_bytes(data)
+
+    _, size, out = precompress.process_file(str(infile), [fmt])
+    outname, csize, _, changed = out[fmt]
+    assert size == len(data)
+    assert outname == f"{infile}.{fmt}"
+    assert changed
+    first = (tmp_path / f"srcprop.1.json.{fmt}").read_bytes()
+    assert len(first) == csize
+    mtime = os.stat(outname).st_mtime_ns
+
+    # Starting from the gzip version gives the same output (for gz
+    # this is the output file).
+    #
+    infiles = [infile]
+    if fmt != "gz":
+        gzfile = tmp_path / "srcprop.1.json.gz"
+        gzfile.write_bytes(gzip.compress(data, mtime=0))
+        infiles.append(gzfile)
+
+    for name in infiles:
+        _, _, out = precompress.process_file(str(name), [fmt])
+        assert not out[fmt][3]
+        assert (tmp_path / f"srcprop.1.json.{fmt}").read_bytes() == first
+
+    assert os.stat(outname).st_mtime_ns == mtime
+
+
+def test_gzip_is_deterministic(tmp_path):
+    """The .gz version does not depend on the time or file name."""
+
+    data = read_chunk()
+    for name in ["a.json", "b.json"]:
+        (tmp_path / name).write_bytes(data)
+        precompress.process_file(str(tmp_path / name), ["gz"])
+
+    assert (tmp_path / "a.json.gz").read_bytes() == \
+        (tmp_path / "b.json.gz").read_bytes()
+
+
+def test_changed_file_is_rewritten(tmp_path):
+    infile = tmp_path / "srcprop.2.json"
+    infile.write_bytes(read_chunk("srcprop.2.json"))
+    precompress.process_file(str(infile), ["gz"])
+
+    infile.write_bytes(read_chunk("srcprop.3.json"))
+    _, _, out = precompress.process_file(str(infile), ["gz"])
+    assert out["gz"][3]
+    assert gzip.decompress((tmp_path / "srcprop.2.json.gz").read_bytes()) == \
+        read_chunk("srcprop.3.json")
+
+
+def test_precompress_sources(tmp_path, monkeypatch):
+    """make_status compresses the chunk files, and only those."""
+
+    with open(os.path.join(DATADIR, "srcprop_tabledata.vot"), "rt") as fh:
+        source_data = stackdata.srclist_process_votable(fh.read())
+
+    monkeypatch.chdir(tmp_path)
+    make_status.write_sources(source_data, chunksize=2, typed_arrays=True)
+    (tmp_path / "wwt21_srcprop.state.npz").write_bytes(b"")
+    (tmp_path / "wwt21_srcstats.json").write_text("{}")
+    make_status.precompress_sources()
+
+    formats = precompress.available_formats()
+    expected = set()
+    for suffix in ["json", "bin"]:
+        for ctr in [1, 2, 3]:
+            name = f"wwt21_srcprop.{ctr}.{suffix}"
+            expected.add(name)
+            expected.update(precompress.output_names(name, formats))
+
+    expected.update(["wwt21_srcprop.state.npz", "wwt21_srcstats.json"])
+    assert set(os.listdir(tmp_path)) == expected
+
+    data = (tmp_path / "wwt21_srcprop.2.json").read_bytes()
+    for fmt in formats:
+        cdata = (tmp_path / f"wwt21_srcprop.2.json.{fmt}").read_bytes()
+        assert precompress.decompress(cdata, fmt) == data
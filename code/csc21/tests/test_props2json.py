@@ -0,0 +1,487 @@
+"""Tests for the TSV to JSON conversion (props2json.py)."""
+
+import contextlib
+import io
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+
+import props2json
+import srctable
+
+
+CODEDIR = os.path.dirname(os.path.abspath(props2json.__file__))
+WWTJS = os.path.join(CODEDIR, "..", "website", "wwt.js")
+
+# The columns of the TSV file, as (name, format, units).
+#
+COLUMNS = [("name", "A21", ""),
+           ("ra", "E24.16", "deg"),
+           ("dec", "E24.16", "deg"),
+           ("err_ellipse_r0", "E24.16", "arcsec"),
+           ("conf_flag", "A5", ""),
+           ("acis_num", "I4", ""),
+           ("flux_aper_b", "E24.16", "erg/s"),
+           ("flux_aper_lolim_b", "E24.16", "erg/s"),
+           ("flux_aper_hilim_b", "E24.16", "erg/s"),
+           ("flux_aper_w", "E24.16", "erg/s"),
+           ("flux_aper_lolim_w", "E24.16", "erg/s"),
+           ("flux_aper_hilim_w", "E24.16", "erg/s"),
+           ("comment", "A12", "")]
+
+# The comment values, which are not interpreted (apart from removing
+# the surrounding spaces).
+#
+COMMENTS = ['"a b"', '', ' "x" ', 'a"b', '"', "café"]
+
+# The pre-release name of the source that was renamed (see
+# add_unprocessed_sources).
+#
+NEWNAME = "2CXO J200718.6-482145"
+OLDNAME = "2CXO J200718.6-482146"
+
+
+def make_name(idx):
+    return "2CXO J{:06d}.{}+{:06d}".format(idx * 7919 % 240000, idx % 10, idx)
+
+
+def make_row(name, idx):
+    """The TSV values for a source (idx controls the nulls)."""
+
+    flux = "{!r}".format(1e-14 * (idx + 1))
+    lims = ["{!r}".format(0.5e-14 * (idx + 1)),
+            "" if idx % 3 == 0 else "{!r}".format(2e-14 * (idx + 1))]
+    empty = ["", "", ""]
+    if idx % 4 == 0:
+        fluxes = empty + [flux] + lims
+    elif idx % 4 == 1:
+        fluxes = empty + empty
+    else:
+        fluxes = [flux] + lims + empty
+
+    return [name, "{!r}".format(idx * 1.1 % 360), "{!r}".format(idx * 0.7 % 90 - 45),
+            "" if idx % 5 == 0 else "{!r}".format(0.1 * idx),
+            "TRUE" if idx % 2 else "FALSE",
+            "" if idx % 3 == 1 else str(idx)] + fluxes + \
+            [COMMENTS[idx % len(COMMENTS)]]
+
+
+def write_tsv(path, rows):
+    """Write the TSV file, in the format returned by the TAP service."""
+
+    with open(path, "wt", encoding="utf-8") as fh:
+        for name, fmt, units in COLUMNS:
+            units = '["{}"]'.format(units) if units != "" else ""
+            fh.write("#Column\t{}\t({})\tdesc {}\t\t{}\t\n".format(name, fmt, name, units))
+
+        fh.write("\t".join(col[0] for col in COLUMNS) + "\n")
+        for row in rows:
+            fh.write("\t".join(row) + "\n")
+
+
+def make_pre(names):
+    """The pre-release list, with the positions based on the name order."""
+
+    idx = np.arange(len(names))
+    return props2json.make_srclist(names, 10.0 + idx, -5.0 - idx, 0.25 * idx)
+
+
+def read_table(infile, pre):
+    """The source table before add_unprocessed_sources is called."""
+
+    with open(infile, "rb") as fh:
+        store, start = props2json.read_tsv_header(fh)
+
+    end = infile.stat().st_size
+    columns = props2json.parse_shard(str(infile), start, end, store["order"],
+                                     store["metadata"])
+    store["table"] = props2json.make_table(store, columns, pre)
+    return store
+
+
+def old_add_unprocessed_sources(store, pre):
+    """The set-based version of add_unprocessed_sources.
+
+    The pre-release list is a dictionary, keyed by name, of the row
+    values (as used before make_srclist).
+    """
+
+    print("Looking for unprocessed sources")
+
+    table = store['table']
+    already_seen = set(table['name'].tolist())
+    pre_names = set(pre.keys())
+
+    assert len(already_seen) == len(table)
+    assert len(pre_names) == len(pre)
+
+    renames = {NEWNAME: OLDNAME}
+    for (newname, oldname) in renames.items():
+        assert newname not in pre_names, newname
+        assert oldname not in already_seen, oldname
+
+        pre_names.remove(oldname)
+        pre_names.add(newname)
+
+    print("already_seen = {}".format(len(already_seen)))
+    print("pre names    = {}".format(len(pre_names)))
+
+    todo = sorted(list(pre_names.difference(already_seen)))
+    print("todo         = {}".format(len(todo)))
+
+    newnames = sorted(list(already_seen.difference(pre_names)))
+    print(" <new sources> = {}".format(len(newnames)))
+
+    for name in todo:
+        print(" - missing {}".format(name))
+
+    nmiss = len(todo)
+    columns = {}
+    for col in table.names:
+        template = table[col]
+        if col in ['name', 'ra', 'dec', 'err_ellipse_r0']:
+            vals = [pre[name][col] for name in todo]
+            if col != 'name':
+                vals = np.asarray(vals, dtype=template.values.dtype)
+
+            columns[col] = srctable.Column(vals)
+        else:
+            columns[col] = srctable.Column(np.zeros(nmiss,
+                                                    dtype=template.values.dtype),
+                                           np.ones(nmiss, dtype=bool))
+
+    table['fluxband'].null = ''
+    columns['fluxband'].null = ''
+
+    missing = srctable.SourceTable(table.names, columns)
+    store['table'] = srctable.SourceTable.concatenate([table, missing])
+
+    print("There are {} unprocessed sources".format(nmiss))
+
+
+def as_dict(pre):
+    return {row[0]: dict(zip(pre.names, row)) for row in pre.tolist()}
+
+
+def run(func, store, pre):
+    with contextlib.redirect_stdout(io.StringIO()) as buf:
+        func(store, pre)
+
+    return buf.getvalue(), store["table"].tolist()
+
+
+def test_unprocessed_sources(tmp_path, capsys):
+    """Compare to the set-based version, including the renamed source
+    and a source that is not in the pre-release list."""
+
+    allnames = [make_name(idx) for idx in range(40)]
+    pre = make_pre(allnames[:30] + [OLDNAME])
+
+    # Skip some of the pre-release sources, add the renamed source and
+    # some that are not in the pre-release list, and do not use the
+    # name order.
+    #
+    names = allnames[25:] + [NEWNAME] + allnames[:20:3]
+    infile = tmp_path / "srcprop.tsv"
+    write_tsv(infile, [make_row(name, idx) for idx, name in enumerate(names)])
+
+    store = read_table(infile, pre)
+    out = capsys.readouterr().out
+    for name in allnames[30:] + [NEWNAME]:
+        assert "Source {} not in prerelease list".format(name) in out
+
+    assert "Source {} not".format(allnames[29]) not in out
+
+    ostore = dict(store, table=store["table"][:])
+    got = run(props2json.add_unprocessed_sources, store, pre)
+    expected = run(old_add_unprocessed_sources, ostore, as_dict(pre))
+    assert got == expected
+
+    # Check the output, rather than only that it is unchanged.
+    #
+    todo = sorted(set(allnames[:25]) - set(allnames[:20:3]))
+    assert " - missing {}".format(todo[0]) in got[0]
+    assert OLDNAME not in got[0]
+    assert "There are {} unprocessed sources".format(len(todo)) in got[0]
+
+    rows = got[1]
+    assert [row[0] for row in rows] == names + todo
+    fluxband = store["table"].names.index("fluxband")
+    flux = store["table"].names.index("flux")
+    pre_rows = as_dict(pre)
+    for row in rows[len(names):]:
+        assert row[1:4] == [pre_rows[row[0]][col]
+                            for col in ["ra", "dec", "err_ellipse_r0"]]
+        assert row[fluxband] == ""
+        assert row[flux] is None
+
+
+def test_unprocessed_rename(tmp_path):
+    """The renamed source uses the new name when it is missing."""
+
+    allnames = [make_name(idx) for idx in range(6)]
+    pre = make_pre(allnames + [OLDNAME])
+    infile = tmp_path / "srcprop.tsv"
+    write_tsv(infile, [make_row(name, idx) for idx, name in enumerate(allnames[:4])])
+
+    store = read_table(infile, pre)
+    _, rows = run(props2json.add_unprocessed_sources, store, pre)
+
+    old = as_dict(pre)[OLDNAME]
+    expected = sorted(allnames[4:] + [NEWNAME])
+    assert [row[0] for row in rows[4:]] == expected
+    row = rows[4 + expected.index(NEWNAME)]
+    assert row[1:4] == [old["ra"], old["dec"], old["err_ellipse_r0"]]
+
+
+@pytest.mark.parametrize("func", [props2json.add_unprocessed_sources,
+                                  old_add_unprocessed_sources])
+@pytest.mark.parametrize("dup", [2, 35])
+def test_repeated_names(tmp_path, func, dup):
+    """A source can only be processed once, whether or not it is in
+    the pre-release list."""
+
+    allnames = [make_name(idx) for idx in range(40)]
+    pre = make_pre(allnames[:30] + [OLDNAME])
+    names = allnames[:5] + allnames[32:] + [allnames[dup]]
+    infile = tmp_path / "srcprop.tsv"
+    write_tsv(infile, [make_row(name, idx) for idx, name in enumerate(names)])
+
+    store = read_table(infile, pre)
+    if func is old_add_unprocessed_sources:
+        pre = as_dict(pre)
+
+    with pytest.raises(AssertionError):
+        run(func, store, pre)
+
+
+def test_srclist_repeated_names():
+    names = [make_name(idx) for idx in range(5)]
+    with pytest.raises(AssertionError):
+        make_pre(names + names[2:3])
+
+
+def test_find_names():
+    pre = make_pre(["b", "d", "a"])
+    idx, found = props2json.find_names(pre["name"].values,
+                                       srctable.Column(["d", "c", "e", "a"]).values)
+    assert found.tolist() == [True, False, False, True]
+    assert idx[found].tolist() == [2, 0]
+    assert props2json.in_srclist(pre, ["a", "aa"]).tolist() == [True, False]
+
+
+def test_shard_ranges(tmp_path):
+    names = [make_name(idx) for idx in range(50)]
+    infile = tmp_path / "srcprop.tsv"
+    write_tsv(infile, [make_row(name, idx) for idx, name in enumerate(names)])
+
+    data = infile.read_bytes()
+    with open(infile, "rb") as fh:
+        _, start = props2json.read_tsv_header(fh)
+
+    linestarts = {start} | {idx + 1 for idx in range(start, len(data) - 1)
+                            if data[idx:idx + 1] == b"\n"}
+
+    # Make sure the split points do not all land on a new line.
+    #
+    nshards = 7
+    naive = [start + (len(data) - start) * idx // nshards
+             for idx in range(1, nshards)]
+    assert not set(naive) <= linestarts
+
+    ranges = props2json.shard_ranges(str(infile), start, nshards)
+    assert len(ranges) == nshards
+    assert ranges[0][0] == start
+    assert ranges[-1][1] == len(data)
+    for (lo1, hi1), (lo2, _) in zip(ranges[:-1], ranges[1:]):
+        assert hi1 == lo2
+
+    assert {lo for lo, _ in ranges} <= linestarts
+
+    # Asking for too many shards gives one per line.
+    #
+    ranges = props2json.shard_ranges(str(infile), start, 1000)
+    assert len(ranges) == len(names)
+
+
+@pytest.mark.parametrize("nproc", [2, 3])
+def test_read_tsv_nproc(tmp_path, monkeypatch, nproc):
+    """The table does not depend on the number of processes or shards."""
+
+    allnames = [make_name(idx) for idx in range(60)]
+    pre = make_pre(allnames[:50] + [OLDNAME])
+    names = allnames[10:] + [NEWNAME]
+    infile = tmp_path / "srcprop.tsv"
+    write_tsv(infile, [make_row(name, idx) for idx, name in enumerate(names)])
+
+    def read(nproc):
+        with contextlib.redirect_stdout(io.StringIO()) as buf:
+            store = props2json.read_tsv(str(infile), pre, nproc=nproc)
+
+        return store, buf.getvalue()
+
+    expected, out = read(1)
+    assert "in 1 parts, nproc=1" in out
+    table = expected["table"]
+    assert table["comment"].tolist()[:6] == ['"a b"', '', '"x"', 'a"b', '"', "café"]
+    assert table["acis_num"].tolist()[:3] == [0, -999, 2]
+    assert len(table) == len(allnames) + 1
+
+    # A shard size that is not a multiple of the line length, so the
+    # split points are not at the start of a line.
+    #
+    monkeypatch.setattr(props2json, "SHARD_SIZE", 1000)
+    got, out = read(nproc)
+    nparts = int(out.split(" parts, ")[0].split()[-1])
+    assert nparts > nproc
+
+    assert got["order"] == expected["order"]
+    assert got["metadata"] == expected["metadata"]
+    assert got["table"].names == table.names
+    for name in table.names:
+        assert got["table"][name].values.dtype == table[name].values.dtype, name
+
+    assert got["table"].tolist() == table.tolist()
+
+
+def test_convert_nproc(tmp_path, monkeypatch):
+    """The gzip chunks do not depend on the number of processes."""
+
+    allnames = [make_name(idx) for idx in range(30)]
+    pre = make_pre(allnames[:25] + [OLDNAME])
+    monkeypatch.setattr(props2json, "read_srclist", lambda infile: pre)
+
+    infile = tmp_path / "srcprop.tsv"
+    write_tsv(infile, [make_row(name, idx) for idx, name in enumerate(allnames[3:])])
+
+    for nproc in [1, 2]:
+        outdir = tmp_path / str(nproc)
+        outdir.mkdir()
+        with contextlib.redirect_stdout(io.StringIO()):
+            props2json.convert("pre.fits", str(infile), str(outdir / "out"), 7,
+                               compress=True, nproc=nproc)
+
+    names = sorted(os.listdir(tmp_path / "1"))
+    assert names == sorted(f"out.{ctr}.json.gz" for ctr in range(1, 6))
+    assert sorted(os.listdir(tmp_path / "2")) == names
+    for name in names:
+        data = (tmp_path / "1" / name).read_bytes()
+        assert (tmp_path / "2" / name).read_bytes() == data, name
+        assert data[4:8] == bytes(4), name
+
+
+def columns_to_rows(cols, columns):
+    """Convert the columns layout to rows (as columnsToRows in wwt.js)."""
+
+    values = [columns[col] for col in cols]
+    nrows = len(values[0]) if len(values) > 0 else 0
+    return [[vals[idx] for vals in values] for idx in range(nrows)]
+
+
+def read_chunks(outhead):
+    chunks = []
+    ctr = 1
+    while os.path.exists(f"{outhead}.{ctr}.json"):
+        with open(f"{outhead}.{ctr}.json", "rt") as fh:
+            chunks.append(json.load(fh))
+
+        ctr += 1
+
+    return chunks
+
+
+@pytest.mark.parametrize("chunksize", [7, 11])
+def test_layouts(tmp_path, monkeypatch, chunksize):
+    """The columns layout contains the same values as the rows layout."""
+
+    allnames = [make_name(idx) for idx in range(30)]
+    pre = make_pre(allnames[:25] + [OLDNAME])
+    monkeypatch.setattr(props2json, "read_srclist", lambda infile: pre)
+
+    infile = tmp_path / "srcprop.tsv"
+    write_tsv(infile, [make_row(name, idx) for idx, name in enumerate(allnames[3:])])
+
+    for layout in ["rows", "columns"]:
+        with contextlib.redirect_stdout(io.StringIO()):
+            props2json.convert("pre.fits", str(infile), str(tmp_path / layout),
+                               chunksize, layout=layout)
+
+    rows = read_chunks(tmp_path / "rows")
+    columns = read_chunks(tmp_path / "columns")
+    assert len(rows) == len(columns) == 31 // chunksize + 1
+
+    nrows = 0
+    for rchunk, cchunk in zip(rows, columns):
+        assert list(cchunk) == ["ntotal", "start", "cols", "columns"]
+        assert sorted(cchunk["columns"]) == sorted(cchunk["cols"])
+        for key in ["ntotal", "start", "cols"]:
+            assert cchunk[key] == rchunk[key], key
+
+        assert columns_to_rows(cchunk["cols"], cchunk["columns"]) == rchunk["rows"]
+        nrows += len(rchunk["rows"])
+
+    assert nrows == rows[0]["ntotal"] == 31
+
+    # The viewer does the conversion.
+    #
+    if shutil.which("node") is None:
+        return
+
+    with open(WWTJS, "rt") as fh:
+        match = re.search(r"^  function columnsToRows\(cols, columns\) \{$.*?^  \}$",
+                          fh.read(), re.MULTILINE | re.DOTALL)
+
+    assert match is not None
+    script = match.group(0) + """
+let txt = '';
+process.stdin.on('data', (data) => { txt += data; });
+process.stdin.on('end', () => {
+  const chunks = JSON.parse(txt);
+  console.log(JSON.stringify(chunks.map(json => columnsToRows(json.cols, json.columns))));
+});
+"""
+
+    proc = subprocess.run(["node", "-e", script], input=json.dumps(columns),
+                          capture_output=True, text=True, check=True)
+    assert json.loads(proc.stdout) == [chunk["rows"] for chunk in rows]
+
+
+def test_command_line(tmp_path):
+    table = pytest.importorskip("astropy.table")
+
+    allnames = [make_name(idx) for idx in range(10)]
+    pre = make_pre(allnames + [OLDNAME])
+    srclist = table.Table([pre[name].values for name in pre.names],
+                          names=["NAME", "RA", "DEC", "ERR_ELLIPSE_R0"])
+    srcfile = tmp_path / "pre.fits"
+    srclist.write(srcfile)
+
+    infile = tmp_path / "srcprop.tsv"
+    write_tsv(infile, [make_row(name, idx) for idx, name in enumerate(allnames[2:])])
+
+    script = os.path.join(CODEDIR, "props2json.py")
+    for layout in ["rows", "columns"]:
+        proc = subprocess.run([sys.executable, script, str(srcfile), str(infile),
+                               str(tmp_path / layout), "--layout", layout,
+                               "--nproc", "2"],
+                              capture_output=True, text=True, check=True)
+        assert "nproc=2" in proc.stdout
+
+    rows = read_chunks(tmp_path / "rows")
+    columns = read_chunks(tmp_path / "columns")
+    assert len(rows) == 1
+    assert rows[0]["ntotal"] == 11
+    assert columns_to_rows(columns[0]["cols"], columns[0]["columns"]) == rows[0]["rows"]
+
+    outhead = str(tmp_path / "out")
+    for args in [[outhead, "--layout", "cols"], [outhead, "--nproc", "0"], []]:
+        proc = subprocess.run([sys.executable, script, str(srcfile), str(infile)] + args,
+                              capture_output=True, text=True)
+        assert proc.returncode == 2
+        assert "usage:" in proc.stderr
@@ -0,0 +1,152 @@
+"""Tests for the fixed-point positions and fluxes (quantize.py)."""
+
+import json
+import os
+
+import numpy as np
+import pytest
+
+import make_status
+import quantize
+import srctable
+import stackdata
+
+
+DATADIR = os.path.join(os.path.dirname(__file__), "data")
+
+
+def random_column(rng, n, lo, hi, nnull=3):
+    values = rng.uniform(lo, hi, size=n)
+    mask = np.zeros(n, dtype=bool)
+    mask[rng.choice(n, size=nnull, replace=False)] = True
+    return srctable.Column(values, mask)
+
+
+def test_scaled_round_trip():
+    rng = np.random.default_rng(2101)
+    col = random_column(rng, 1000, -90, 90)
+    qcol = quantize.quantize_scaled(col, quantize.COORD_SCALE)
+    assert qcol.values.dtype.kind == "i"
+    assert qcol.mask.tolist() == col.mask.tolist()
+
+    dcol = quantize.dequantize_scaled(qcol, quantize.COORD_SCALE)
+    good = ~col.mask
+    diff = np.abs(dcol.values[good] - col.values[good])
+    assert diff.max() <= 0.5e-6 * (1 + 1e-9)
+    assert dcol.tolist().count(None) == 3
+
+
+def test_scaled_is_decimal():
+    col = srctable.Column(np.asarray([0.08417, -20.33889, 359.99958]))
+    qcol = quantize.quantize_scaled(col, 1e-6)
+    assert qcol.values.tolist() == [84170, -20338890, 359999580]
+    dcol = quantize.dequantize_scaled(qcol, 1e-6)
+    assert dcol.values.tolist() == [0.08417, -20.33889, 359.99958]
+
+
+@pytest.mark.parametrize("digits", [3, 5, 7])
+def test_mantissa_round_trip(digits):
+    rng = np.random.default_rng(digits)
+    n = 1000
+    values = rng.choice([-1, 1], size=n) * 10**rng.uniform(-20, 10, size=n)
+    values[:3] = [0, 1e-15, -9.99999999e-13]
+    mask = np.zeros(n, dtype=bool)
+    mask[-2:] = True
+    col = srctable.Column(values, mask)
+
+    qcol = quantize.quantize_mantissa(col, digits=digits)
+    assert qcol.mask.tolist() == mask.tolist()
+
+    mant = np.abs(qcol.values) // 100
+    nonzero = ~mask & (values != 0)
+    assert np.all(mant[nonzero] >= 10**(digits - 1))
+    assert np.all(mant[nonzero] < 10**digits)
+    assert np.all(np.sign(qcol.values[~mask]) == np.sign(values[~mask]))
+
+    dcol = quantize.dequantize_mantissa(qcol)
+    rel = np.abs(dcol.values[nonzero] - values[nonzero]) / np.abs(values[nonzero])
+    assert rel.max() <= 0.5 * 10**(1 - digits) * (1 + 1e-9)
+    assert dcol.values[0] == 0
+    assert dcol.values[1] == 1e-15
+    assert dcol.values[2] == -1e-12
+    assert dcol.tolist()[-2:] == [None, None]
+
+
+def test_mantissa_errors():
+    with pytest.raises(ValueError):
+        quantize.quantize_mantissa(srctable.Column(np.asarray([1.0, np.inf])))
+
+    with pytest.raises(ValueError):
+        quantize.quantize_mantissa(srctable.Column(np.asarray([1e60])))
+
+    # A masked value is not checked.
+    col = srctable.Column(np.asarray([1.0, np.nan]), np.asarray([False, True]))
+    assert quantize.quantize_mantissa(col).tolist() == [1000046, None]
+
+
+def test_table_report():
+    rng = np.random.default_rng(14)
+    n = 500
+    names = ["name", "ra", "dec", "flux", "flux_lolim", "significance"]
+    columns = {"name": srctable.Column([f"n{i:04d}" for i in range(n)]),
+               "ra": random_column(rng, n, 0, 360, nnull=0),
+               "dec": random_column(rng, n, -90, 90, nnull=0),
+               "flux": random_column(rng, n, 1e-16, 1e-12),
+               "flux_lolim": random_column(rng, n, 1e-17, 1e-13),
+               "significance": random_column(rng, n, 0, 50)}
+    table = srctable.SourceTable(names, columns)
+
+    qtable, quant = quantize.quantize_table(table)
+    assert sorted(quant) == ["dec", "flux", "flux_lolim", "ra"]
+    assert qtable["significance"] is table["significance"]
+
+    report = quantize.error_report(table, qtable, quant)
+    assert report["nrows"] == n
+    assert 0 < report["maxpos"] <= 2.6e-3
+    assert sorted(report["fluxes"]) == ["flux", "flux_lolim"]
+    for err in report["fluxes"].values():
+        assert 0 < err <= 0.5e-4 * (1 + 1e-9)
+
+    half = n // 2
+    merged = quantize.merge_reports(
+        [quantize.error_report(table[:half], qtable[:half], quant),
+         quantize.error_report(table[half:], qtable[half:], quant)])
+    assert merged == report
+
+
+def test_chunk_round_trip(tmp_path):
+    with open(os.path.join(DATADIR, "srcprop_tabledata.vot"), "rt") as fh:
+        source_data = stackdata.srclist_process_votable(fh.read())
+
+    table = source_data["table"]
+    make_status.write_sources(source_data, outhead=str(tmp_path / "srcprop"),
+                              chunksize=2, quantize_data=True)
+    assert source_data["quant_report"]["nrows"] == len(table)
+
+    rows = []
+    for ctr in range(1, 4):
+        with open(tmp_path / f"srcprop.{ctr}.json", "rt") as fh:
+            chunk = json.load(fh)
+
+        assert chunk["cols"] == source_data["order"]
+        quant = chunk["quant"]
+        assert sorted(quant) == ["dec", "flux", "flux_hilim", "flux_lolim", "ra"]
+        rows.extend(chunk["rows"])
+
+    # Convert the rows back into a table and compare to the original
+    # values (which are short enough to be restored exactly).
+    #
+    names = source_data["order"]
+    columns = {}
+    for idx, name in enumerate(names):
+        vals = [row[idx] for row in rows]
+        if name in quant:
+            mask = np.asarray([v is None for v in vals])
+            vals = np.asarray([0 if v is None else v for v in vals], dtype=np.int64)
+            columns[name] = srctable.Column(vals, mask)
+        else:
+            columns[name] = vals
+
+    dtable = quantize.dequantize_table(srctable.SourceTable(names, columns), quant)
+    for name in quant:
+        assert dtable[name].tolist() == table[name].tolist(), name
@@ -0,0 +1,74 @@
+"""Tests for respcache.py."""
+
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+
+import respcache
+
+
+URL = "http://localhost/sync"
+PARAMS = {"QUERY": "SELECT count(1) FROM t", "FORMAT": "text"}
+
+
+@pytest.fixture(autouse=True)
+def cache(tmp_path, monkeypatch):
+    monkeypatch.setitem(respcache.settings, "cachedir", str(tmp_path))
+    monkeypatch.setitem(respcache.settings, "mode", "use")
+    monkeypatch.setitem(respcache.settings, "ttl", 6 * 3600)
+
+
+def download():
+    return b"12345"
+
+
+def test_fetch_time_of_cached_response():
+    """The time is when the response was downloaded, not read."""
+
+    assert respcache.fetch(URL, PARAMS, download) == b"12345"
+    now = time.time()
+    assert respcache.fetch_time(URL, PARAMS) == pytest.approx(now, abs=5)
+
+    old = now - 2 * 3600
+    os.utime(respcache.entry_path(URL, PARAMS), (old, old))
+    assert respcache.fetch(URL, PARAMS, lambda: b"changed") == b"12345"
+    assert respcache.fetch_time(URL, PARAMS) == pytest.approx(old)
+
+
+def test_fetch_time_refresh():
+    respcache.fetch(URL, PARAMS, download)
+    old = time.time() - 2 * 3600
+    os.utime(respcache.entry_path(URL, PARAMS), (old, old))
+
+    respcache.configure(mode="refresh")
+    assert respcache.fetch(URL, PARAMS, lambda: b"new") == b"new"
+    assert respcache.fetch_time(URL, PARAMS) == pytest.approx(time.time(),
+                                                              abs=5)
+
+
+def test_fetch_time_no_cache():
+    respcache.fetch(URL, PARAMS, download)
+    respcache.configure(mode="off")
+    assert respcache.fetch(URL, PARAMS, lambda: b"new") == b"new"
+    assert respcache.fetch_time(URL, PARAMS) is None
+
+
+@pytest.mark.parametrize("cachedir,mode", [(None, "off"), ("/tmp/x", "use")])
+def test_default_mode(cachedir, mode):
+    """The cache is only used by default if CSC_TAP_CACHE is set."""
+
+    env = dict(os.environ)
+    env.pop("CSC_TAP_CACHE", None)
+    if cachedir is not None:
+        env["CSC_TAP_CACHE"] = cachedir
+
+    code = "import respcache; print(respcache.settings['mode'], respcache.settings['cachedir'])"
+    out = subprocess.run([sys.executable, "-c", code], env=env, check=True,
+                         cwd=os.path.dirname(respcache.__file__),
+                         capture_output=True, text=True).stdout.split()
+    assert out[0] == mode
+    if cachedir is not None:
+        assert out[1] == cachedir
@@ -0,0 +1,141 @@
+"""Tests for the binary source-property chunks (srcbinary.py)."""
+
+import os
+
+import numpy as np
+import pytest
+
+import srcbinary
+import srctable
+import stackdata
+
+
+DATADIR = os.path.join(os.path.dirname(__file__), "data")
+
+
+@pytest.fixture(scope="module")
+def source_data():
+    with open(os.path.join(DATADIR, "srcprop_tabledata.vot"), "rt") as fh:
+        return stackdata.srclist_process_votable(fh.read())
+
+
+def round_trip(table, **kwargs):
+    buf = srcbinary.encode_table(table, 10, 4, table.names, **kwargs)
+    assert buf[:8] == srcbinary.MAGIC
+    return srcbinary.decode(buf)
+
+
+def test_fixture_round_trip(source_data):
+    table = source_data["table"]
+    header, out = round_trip(table)
+    assert (header["ntotal"], header["start"]) == (10, 4)
+    assert header["nrows"] == len(table)
+    assert header["cols"] == source_data["order"]
+    assert out.names == table.names
+
+    types = {info["name"]: info["type"] for info in header["columns"]}
+    assert types["name"] == "string"
+    assert types["ra"] == types["dec"] == "float64"
+    assert types["flux"] == types["hard_hm"] == "float32"
+    assert types["conf_flag"] == types["var_flag"] == "int8"
+    assert types["fluxband"] == "int8"
+
+    # The missing integers are stored as INT_NULL, which needs int16.
+    #
+    assert types["acis_num"] == types["hrc_num"] == "int16"
+
+    for info in header["columns"]:
+        for key in ["offset", "nulls", "data"]:
+            if info.get(key) is not None:
+                assert info[key] % 8 == 0, (info["name"], key)
+
+    for name in table.names:
+        want = table[name]
+        got = out[name]
+        assert got.mask.tolist() == want.mask.tolist(), name
+        if types[name] == "float32":
+            good = ~want.mask
+            assert np.all(np.isnan(got.values[want.mask])), name
+            assert np.allclose(got.values[good], want.values[good],
+                               rtol=1e-6, atol=0), name
+        else:
+            assert got.tolist() == want.tolist(), name
+
+
+def test_null_bitmaps(source_data):
+    """Columns with nulls have a bitmap, the others do not."""
+
+    table = source_data["table"]
+    header, _ = round_trip(table)
+    for info in header["columns"]:
+        hasnull = table[info["name"]].mask.any()
+        assert (info["nulls"] is not None) == hasnull, info["name"]
+
+    assert table["flux_hilim"].mask.tolist() == [False, True, True, False, False]
+
+
+def test_int_null_is_a_value(source_data):
+    """The INT_NULL sentinel is not masked, so it is written as is."""
+
+    table = source_data["table"]
+    _, out = round_trip(table)
+    assert out["hrc_num"].values.tolist() == [0, srctable.INT_NULL,
+                                              srctable.INT_NULL, 2, 1]
+    assert not out["hrc_num"].mask.any()
+
+
+def test_masked_integers():
+    col = srctable.Column(np.asarray([1, 2, 3, 4, 5, 6, 7, 8, 9], dtype=np.int32),
+                          np.asarray([0, 1, 0, 0, 0, 0, 0, 0, 1], dtype=bool))
+    table = srctable.SourceTable(["x"], {"x": col})
+    header, out = round_trip(table)
+    info = header["columns"][0]
+    assert info["type"] == "int8"
+    assert out["x"].tolist() == [1, None, 3, 4, 5, 6, 7, 8, None]
+    assert out["x"].values[[1, 8]].tolist() == [0, 0]
+
+
+@pytest.mark.parametrize("values,dtype", [([0, 127, -128], "int8"),
+                                          ([0, 128], "int16"),
+                                          ([-32769, 1], "int32")])
+def test_integer_types(values, dtype):
+    table = srctable.SourceTable(["x"], {"x": srctable.Column(np.asarray(values))})
+    header, out = round_trip(table)
+    assert header["columns"][0]["type"] == dtype
+    assert out["x"].tolist() == values
+
+
+def test_integer_overflow():
+    table = srctable.SourceTable(["x"], {"x": srctable.Column(np.asarray([2**40]))})
+    with pytest.raises(ValueError):
+        srcbinary.encode_table(table, 1, 0, ["x"])
+
+
+def test_utf8_strings():
+    names = ["2CXO J000010.1+101010", "café α", "", "☃"]
+    col = srctable.Column(names, [False, False, True, False])
+    assert col.values.dtype.kind == "U"
+    table = srctable.SourceTable(["name"], {"name": col})
+    header, out = round_trip(table)
+    info = header["columns"][0]
+    assert info["nbytes"] == sum(len(name.encode("utf-8")) for name in names)
+    assert out["name"].tolist() == [names[0], names[1], None, names[3]]
+
+
+def test_quant_header(source_data):
+    quant = {"ra": {"type": "scaled", "scale": 1e-6}}
+    header, _ = round_trip(source_data["table"], quant=quant)
+    assert header["quant"] == quant
+
+
+@pytest.mark.parametrize("compress", [False, True])
+def test_write_read_chunk(tmp_path, source_data, compress):
+    table = source_data["table"]
+    outname = str(tmp_path / ("chunk.bin" + (".gz" if compress else "")))
+    assert srcbinary.write_chunk(outname, 5, 0, source_data["order"], table,
+                                 compress=compress) == outname
+
+    header, out = srcbinary.read_chunk(outname)
+    assert header["nrows"] == 5
+    assert out["name"].tolist() == table["name"].tolist()
+    assert out["acis_num"].tolist() == table["acis_num"].tolist()
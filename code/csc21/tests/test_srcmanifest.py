@@ -0,0 +1,121 @@
+"""Tests for the incremental chunks (srcmanifest.py)."""
+
+import gzip
+import json
+import os
+
+import numpy as np
+import pytest
+
+import make_status
+import srcjson
+import srcmanifest
+import stackdata
+
+
+DATADIR = os.path.join(os.path.dirname(__file__), "data")
+
+
+def read_sources():
+    with open(os.path.join(DATADIR, "srcprop_tabledata.vot"), "rt") as fh:
+        return stackdata.srclist_process_votable(fh.read())
+
+
+def read_chunk(filename):
+    opener = gzip.open if filename.endswith(".gz") else open
+    with opener(filename, "rt") as fh:
+        return json.load(fh)
+
+
+def run(outhead, source_data, compress=False):
+    make_status.write_sources_incremental(source_data, outhead=outhead,
+                                          chunksize=2, compress=compress)
+    return source_data["manifest"]
+
+
+def test_state_round_trip(tmp_path):
+    statefile = str(tmp_path / "state.npz")
+    assert srcmanifest.read_state(statefile) is None
+
+    names = np.asarray(["a", "b", "c"])
+    hashes = srcmanifest.row_hashes(["[1]", "[2]", "[3]"])
+    starts = np.asarray([0, 2])
+    files = ["x.1.json", "x.2.json"]
+    srcmanifest.write_state(statefile, names, hashes, starts, files)
+
+    state = srcmanifest.read_state(statefile)
+    assert state["names"].astype(str).tolist() == ["a", "b", "c"]
+    assert np.array_equal(state["hashes"], hashes)
+    assert state["starts"].tolist() == [0, 2]
+    assert state["files"].tolist() == files
+
+
+def test_chunk_starts_are_stable():
+    names = np.asarray([f"n{i:03d}" for i in range(100)])
+    starts = srcmanifest.chunk_starts(names, 10)
+    assert starts.tolist() == list(range(0, 100, 10))
+
+    # Adding a source only changes the chunk it is added to.
+    previous = {"names": names, "starts": starts}
+    newnames = np.sort(np.append(names, "n0555"))
+    assert srcmanifest.chunk_starts(newnames, 10,
+                                    previous=previous).tolist() == \
+        [0, 10, 20, 30, 40, 50, 61, 71, 81, 91]
+
+
+@pytest.mark.parametrize("compress", [False, True])
+def test_manifest_matches_rows(tmp_path, compress):
+    source_data = read_sources()
+    rows = json.loads(srcjson.encode_table(source_data["table"],
+                                           precision=make_status.FLOAT_PRECISION))
+    manifest = run(str(tmp_path / "srcprop"), source_data,
+                   compress=compress)
+
+    got = []
+    for chunk in manifest:
+        js = read_chunk(chunk["file"])
+        assert js["cols"] == source_data["order"]
+        assert len(js["rows"]) == chunk["nrows"]
+        assert chunk["start"] == len(got)
+        got.extend(js["rows"])
+
+    assert got == rows
+
+
+def test_previous_chunks_are_kept(tmp_path):
+    """The chunks of the previous run are only removed a run later."""
+
+    outhead = str(tmp_path / "srcprop")
+    first = run(outhead, read_sources())
+
+    # Change the last source, so the last chunk changes.
+    source_data = read_sources()
+    source_data["table"]["significance"].values[-1] = 99.0
+    second = run(outhead, source_data)
+
+    assert [c["file"] for c in first[:-1]] == [c["file"] for c in second[:-1]]
+    assert first[-1]["file"] != second[-1]["file"]
+    for chunk in first + second:
+        assert os.path.exists(chunk["file"])
+
+    # The old chunk is removed once it is two runs old.
+    third = run(outhead, source_data)
+    assert third == second
+    assert not os.path.exists(first[-1]["file"])
+    for chunk in third:
+        assert os.path.exists(chunk["file"])
+
+    state = srcmanifest.read_state(f"{outhead}.state.npz")
+    assert state["files"].tolist() == [c["file"] for c in third]
+
+
+def test_chunk_filenames():
+    hashval = "0123456789abcdef" * 2
+    for suffix in ["json", "json.gz", "json.br", "json.zst"]:
+        assert srcmanifest.is_chunk_filename(f"out/srcprop.{hashval}.{suffix}",
+                                             "out/srcprop")
+
+    for name in [f"out/srcprop.{hashval}.bin", f"out/srcprop.{hashval[1:]}.json",
+                 "out/srcprop.1.json", "out/srcprop.state.npz",
+                 f"srcprop.{hashval}.json"]:
+        assert not srcmanifest.is_chunk_filename(name, "out/srcprop")
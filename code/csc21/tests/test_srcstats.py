@@ -0,0 +1,63 @@
+"""Tests for the summary statistics (srcstats.py)."""
+
+import os
+
+import numpy as np
+import pytest
+
+import srcstats
+import srctable
+import stackdata
+
+
+DATADIR = os.path.join(os.path.dirname(__file__), "data")
+
+
+def read_table(process, votable):
+    with open(os.path.join(DATADIR, votable), "rt") as fh:
+        return process(fh.read())["table"]
+
+
+@pytest.mark.parametrize("process,votable",
+                         [(stackdata.srclist_process_votable,
+                           "srcprop_tabledata.vot"),
+                          (stackdata.srclist_process_binary,
+                           "srcprop_binary2.vot")])
+def test_missing_integers(process, votable):
+    """The empty integer cells are null, not -999."""
+
+    table = read_table(process, votable)
+    assert table["acis_num"].tolist() == [3, -999, 12, 0, 1]
+    assert table["hrc_num"].tolist() == [0, -999, -999, 2, 1]
+
+    stats = srcstats.build(table)
+    acis = stats["columns"]["acis_num"]
+    assert acis["nrows"] == 5
+    assert acis["nnull"] == 1
+    assert acis["min"] == 0
+    assert acis["max"] == 12
+    assert acis["quantiles"][3] == 2
+    assert sum(acis["hist"]["counts"]) == 4
+    assert acis["hist"]["lo"] == -0.5
+
+    hrc = stats["columns"]["hrc_num"]
+    assert hrc["nnull"] == 2
+    assert (hrc["min"], hrc["max"]) == (0, 2)
+    assert sum(hrc["hist"]["counts"]) == 3
+
+
+def test_all_missing():
+    col = srctable.convert_column(["", " ", None], "integer",
+                                  stackdata.convert_to_int)
+    stats = srcstats.column_stats("acis_num", col)
+    assert stats["nnull"] == 3
+    assert stats["min"] is None
+    assert stats["quantiles"] == [None] * len(srcstats.QUANTILES)
+
+
+def test_masked_floats():
+    col = srctable.Column(np.asarray([1.0, -999.0, np.nan, 4.0]),
+                          np.asarray([False, False, True, False]))
+    stats = srcstats.column_stats("significance", col)
+    assert stats["nnull"] == 1
+    assert stats["min"] == -999
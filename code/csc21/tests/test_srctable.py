@@ -0,0 +1,92 @@
+"""Tests for srctable.py."""
+
+import numpy as np
+
+import srcjson
+import srctable
+import stackdata
+
+
+def test_strings_are_bytes():
+    col = srctable.Column(["2CXO J000010.1+101010", "x"])
+    assert col.values.dtype == np.dtype("S21")
+    assert col.text().dtype == np.dtype("U21")
+    assert col.tolist() == ["2CXO J000010.1+101010", "x"]
+
+
+def test_non_ascii_strings_are_str():
+    col = srctable.Column(["café", "x"])
+    assert col.values.dtype.kind == "U"
+    assert col.tolist() == ["café", "x"]
+
+
+def test_string_slices_stay_bytes():
+    col = srctable.Column(["a", "bb", "ccc"], [False, True, False], null="-")
+    sub = col[1:]
+    assert sub.values.dtype.kind == "S"
+    assert sub.tolist() == ["-", "ccc"]
+
+
+def test_convert_string_column():
+    col = srctable.convert_column([" a ", None, "b\t"], "string", str.strip)
+    assert col.values.dtype.kind == "S"
+    assert col.tolist() == ["a", "", "b"]
+
+
+def test_concatenate_strings():
+    tbl1 = srctable.SourceTable(["name"], {"name": srctable.Column(["a"])})
+    tbl2 = srctable.SourceTable(["name"], {"name": srctable.Column(["bcd"])})
+    tbl = srctable.SourceTable.concatenate([tbl1, tbl2])
+    assert tbl["name"].values.dtype == np.dtype("S3")
+    assert tbl.tolist() == [["a"], ["bcd"]]
+
+
+def test_encode_strings():
+    col = srctable.Column(['say "hi"', "b", "x"], [False, False, True])
+    assert srcjson.encode_column(col).tolist() == ['"say \\"hi\\""',
+                                                   '"b"', 'null']
+
+
+def test_convert_flags():
+    col = srctable.convert_column(["T", "F", "T"], "flag",
+                                  stackdata.convert_to_bool)
+    assert col.values.dtype == np.int8
+    assert col.tolist() == [1, 0, 1]
+
+
+def test_unknown_flag_is_kept(capsys):
+    """An unrecognized flag value is kept, not made null."""
+
+    col = srctable.convert_column(["T", "1", " F", "0"], "flag",
+                                  stackdata.convert_to_bool)
+    assert col.tolist() == [1, "1", 0, "0"]
+    assert not col.mask.any()
+    assert srcjson.encode_column(col).tolist() == ["1", '"1"', "0", '"0"']
+    assert "Unable to convert '1'" in capsys.readouterr().out
+
+
+def test_invalid_float_is_kept():
+    col = srctable.convert_column(["1.5", "abc", ""], "float",
+                                  stackdata.convert_to_float)
+    assert col.tolist() == [1.5, "abc", None]
+    assert srcjson.encode_column(col).tolist() == ["1.5", '"abc"', "null"]
+
+
+def test_integer_overflow():
+    """Integers which do not fit into int32 are not lost."""
+
+    col = srctable.convert_column(["3", "3000000000", ""], "integer",
+                                  stackdata.convert_to_int)
+    assert col.values.dtype == np.int64
+    assert col.tolist() == [3, 3000000000, -999]
+
+    col = srctable.convert_column(["3", str(2**70)], "integer",
+                                  stackdata.convert_to_int)
+    assert col.tolist() == [3, 2**70]
+    assert srcjson.encode_column(col).tolist() == ["3", str(2**70)]
+
+
+def test_column_from_list_overflow():
+    col = srctable.column_from_list([1, None, -2**40], "integer")
+    assert col.values.dtype == np.int64
+    assert col.tolist() == [1, None, -2**40]
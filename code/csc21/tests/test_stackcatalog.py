@@ -0,0 +1,134 @@
+"""Tests for the StackCatalog snapshot (stackdata.py)."""
+
+import os
+import pickle
+
+import pytest
+
+import respcache
+import stackdata
+
+
+@pytest.fixture
+def indir(tmp_path, monkeypatch):
+    """Create the input files (some are read from the current directory)."""
+
+    indir = tmp_path / "stacks"
+    indir.mkdir()
+    (indir / "acis_stacks_unchanged.txt").write_text("# unchanged\nacisfJ0000001p000001_001\n")
+    (indir / "acis_stacks_updated.txt").write_text("acisfJ0000002p000002_001 102_0,103_0\n")
+    (indir / "acis_stacks_new.txt").write_text("acisfJ0000003m000003_001 105_1,104_0\n")
+    (indir / "hrc_stacks_unchanged.txt").write_text("")
+    (indir / "hrc_stacks_updated.txt").write_text("")
+    (indir / "hrc_stacks_new.txt").write_text("hrcfJ0000004p000004_001 106_0\n")
+
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "csc20_detect_stack_obi.lis").write_text(
+        "# CSC 2.0\ndetect_stack_id\tobsid\tobi\n" +
+        "acisfJ0000001p000001_001\t101\t0\nacisfJ0000001p000001_001\t100\t0\n" +
+        "acisfJ0000002p000002_001\t102\t0\n")
+    (tmp_path / "obsid-targets.tsv").write_text(
+        "".join(f"{obsid}\tTarget {obsid}\n" for obsid in range(100, 107)))
+
+    # Restore the cache settings after the test.
+    #
+    monkeypatch.setattr(respcache, "settings", dict(respcache.settings))
+    respcache.configure(cachedir=str(tmp_path / "cache"))
+    return indir
+
+
+@pytest.fixture
+def nread(monkeypatch):
+    """Count the number of times the input files are parsed."""
+
+    calls = []
+    orig = stackdata.StackCatalog.read
+
+    def read(indir):
+        calls.append(indir)
+        return orig(indir)
+
+    monkeypatch.setattr(stackdata.StackCatalog, "read", staticmethod(read))
+    return calls
+
+
+def as_dict(catalog):
+    return {"obis": catalog.obis, "status": catalog.status,
+            "targets": catalog.targets, "stacks20": catalog.stacks20}
+
+
+def test_parse(indir):
+    catalog = stackdata.StackCatalog.load(indir, use_snapshot=False)
+    assert catalog.status == {"acisfJ0000001p000001_001": "unchanged",
+                              "acisfJ0000002p000002_001": "updated",
+                              "acisfJ0000003m000003_001": "new",
+                              "hrcfJ0000004p000004_001": "new"}
+    assert catalog.obis["acisfJ0000001p000001_001"] == [(100, 0), (101, 0)]
+    assert catalog.obis["acisfJ0000003m000003_001"] == [(104, 0), (105, 1)]
+    assert catalog.targets[106] == "Target 106"
+    assert not os.path.exists(stackdata.snapshot_path())
+
+
+def test_snapshot_is_used(indir, nread):
+    snapshot = stackdata.snapshot_path()
+    assert snapshot == os.path.join(respcache.settings["cachedir"],
+                                    "stackcatalog.pickle")
+
+    first = stackdata.StackCatalog.load(indir)
+    assert len(nread) == 1
+    assert os.path.exists(snapshot)
+
+    second = stackdata.StackCatalog.load(indir)
+    assert len(nread) == 1
+    assert as_dict(second) == as_dict(first)
+
+
+@pytest.mark.parametrize("name", ["acis_stacks_new.txt", "obsid-targets.tsv"])
+@pytest.mark.parametrize("change", ["mtime", "size"])
+def test_snapshot_is_rebuilt(indir, nread, name, change):
+    first = stackdata.StackCatalog.load(indir)
+    assert len(nread) == 1
+
+    infile = indir / name if name.startswith("acis") else indir.parent / name
+    stat = os.stat(infile)
+    if change == "mtime":
+        os.utime(infile, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    else:
+        # Change the size but not the modification time.
+        #
+        with open(infile, "at") as fh:
+            fh.write("\n")
+
+        os.utime(infile, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+
+    second = stackdata.StackCatalog.load(indir)
+    assert len(nread) == 2
+    assert as_dict(second) == as_dict(first)
+
+    # The new snapshot is then used.
+    #
+    stackdata.StackCatalog.load(indir)
+    assert len(nread) == 2
+
+
+@pytest.mark.parametrize("contents", [b"", b"not a pickle",
+                                      pickle.dumps({"version": 1})[:-3],
+                                      pickle.dumps([1, 2]),
+                                      pickle.dumps({"version": -1})])
+def test_corrupt_snapshot(indir, nread, contents):
+    expected = as_dict(stackdata.StackCatalog.load(indir, use_snapshot=False))
+
+    snapshot = stackdata.snapshot_path()
+    os.makedirs(os.path.dirname(snapshot))
+    with open(snapshot, "wb") as fh:
+        fh.write(contents)
+
+    catalog = stackdata.StackCatalog.load(indir)
+    assert len(nread) == 2
+    assert as_dict(catalog) == expected
+
+    # The snapshot has been replaced.
+    #
+    stackdata.StackCatalog.load(indir)
+    assert len(nread) == 2
+    assert sorted(os.listdir(os.path.dirname(snapshot))) == ["stackcatalog.pickle"]
@@ -0,0 +1,81 @@
+"""Compare the TABLEDATA and BINARY2 versions of the source query.
+
+The two files in data/ are the same (small) master_source response,
+using the two serializations (the BINARY2 stream was created by
+encoding the TABLEDATA cells, with a null bit for each empty cell).
+They contain an extended source, which is dropped, missing integers,
+which use the -999 sentinel, null values, and both flag types.
+"""
+
+import os
+
+import numpy as np
+import pytest
+
+import stackdata
+
+
+DATADIR = os.path.join(os.path.dirname(__file__), "data")
+
+COLUMNS = ["name", "ra", "dec", "err_ellipse_r0", "err_ellipse_r1",
+           "err_ellipse_ang", "conf_flag", "sat_src_flag", "acis_num",
+           "hrc_num", "var_flag", "significance", "fluxband", "flux",
+           "flux_lolim", "flux_hilim", "nh_gal", "hard_hm",
+           "hard_hm_lolim", "hard_hm_hilim", "hard_ms", "hard_ms_lolim",
+           "hard_ms_hilim"]
+
+
+def read(name):
+    with open(os.path.join(DATADIR, name), "rt") as fh:
+        return fh.read()
+
+
+@pytest.fixture(scope="module")
+def tables():
+    tdata = stackdata.srclist_process_votable(read("srcprop_tabledata.vot"))
+    binary = stackdata.srclist_process_binary(read("srcprop_binary2.vot"))
+    return tdata, binary
+
+
+def test_same_columns(tables):
+    tdata, binary = tables
+    assert tdata["order"] == COLUMNS
+    assert binary["order"] == COLUMNS
+    assert tdata["table"].names == COLUMNS
+    assert binary["table"].names == COLUMNS
+    assert len(tdata["table"]) == 5
+    assert len(binary["table"]) == 5
+
+
+@pytest.mark.parametrize("name", COLUMNS)
+def test_same_values(tables, name):
+    tcol = tables[0]["table"][name]
+    bcol = tables[1]["table"][name]
+
+    assert tcol.values.dtype == bcol.values.dtype
+    assert tcol.mask.tolist() == bcol.mask.tolist()
+    assert tcol.null == bcol.null
+
+    good = ~tcol.mask
+    assert np.array_equal(tcol.values[good], bcol.values[good])
+    assert tcol.tolist() == bcol.tolist()
+
+
+def test_row_values(tables):
+    """Check the nulls, flags, and integer sentinel."""
+
+    for store in tables:
+        rows = store["table"].tolist()
+        assert [row[0] for row in rows] == ["2CXO J000010.1+101010",
+                                            "2CXO J000020.2-202020",
+                                            "2CXO J000040.4-404040",
+                                            "2CXO J000050.5+505050",
+                                            "2CXO J235959.9-895959"]
+
+        assert rows[1] == ["2CXO J000020.2-202020", 0.08417, -20.33889,
+                           1.2, 0.9, 170.0, 1, 0, -999, -999, 1, 2.5,
+                           1, 2.25e-15, 1e-15, None, 0.6,
+                           None, None, None, -0.9375, -1.0, -0.75]
+
+        # No flux, so the band is -1.
+        assert rows[2][8:16] == [12, -999, 0, 1.75, -1, None, None, None]
@@ -0,0 +1,154 @@
+"""Check the queries split by name range (stackdata.tap_fetch_ranges).
+
+The queries are sent - with curl - to tap_standin.py, which serves
+the saved source query in data/srcprop_tabledata.vot and a small
+stack query.
+"""
+
+from http.server import HTTPServer
+import os
+import shutil
+import threading
+
+import numpy as np
+import pytest
+
+import respcache
+import stackdata
+import tap_standin
+
+
+DATADIR = os.path.join(os.path.dirname(__file__), "data")
+
+STACKS = """#comment
+name\tdetect_stack_id
+2CXO J000010.1+101010\tacisfJ0000036p000000_001
+2CXO J000010.1+101010\tacisfJ0000016p000000_001
+2CXO J000020.2-202020\tacisfJ0000036p000000_001
+2CXO J123456.7+010203\tacisfJ1234567p010203_001
+2CXO J235959.9-895959\tacisfJ2359599m895959_001
+2CXO J235959.9-895959\tacisfJ0000036p000000_001
+"""
+
+pytestmark = pytest.mark.skipif(shutil.which("curl") is None,
+                                reason="curl is not available")
+
+
+class FailFirst:
+    """Make the first nfail requests fail (the stand-in fails a
+    request when random() is below the fail rate)."""
+
+    def __init__(self, nfail):
+        self.nfail = nfail
+        self.lock = threading.Lock()
+
+    def random(self):
+        with self.lock:
+            self.nfail -= 1
+            return 0.0 if self.nfail >= 0 else 1.0
+
+
+def serve(tmp_path_factory, nfail):
+    stackfile = tmp_path_factory.mktemp("tap") / "stacks.tsv"
+    stackfile.write_text(STACKS)
+
+    votable = tap_standin.read_votable(os.path.join(DATADIR,
+                                                    "srcprop_tabledata.vot"))
+    handler = tap_standin.make_handler(votable,
+                                       tap_standin.read_stacks(str(stackfile)),
+                                       0.5, FailFirst(nfail))
+
+    # Do not log each request.
+    handler.log_message = lambda *args: None
+
+    server = HTTPServer(("localhost", 0), handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, f"http://localhost:{server.server_port}/sync"
+
+
+@pytest.fixture(scope="module")
+def url(tmp_path_factory):
+    server, url = serve(tmp_path_factory, 0)
+    yield url
+    server.shutdown()
+
+
+@pytest.fixture(scope="module")
+def flaky_url(tmp_path_factory):
+    # Each range is tried up to three times, so at most two
+    # failures can be guaranteed to be recovered from.
+    server, url = serve(tmp_path_factory, 2)
+    yield url
+    server.shutdown()
+
+
+@pytest.fixture(autouse=True)
+def no_cache(monkeypatch):
+    monkeypatch.setitem(respcache.settings, "mode", "off")
+
+
+def test_name_ranges():
+    assert stackdata.tap_name_ranges(1) == [(None, None)]
+    assert stackdata.tap_name_ranges(3) == [(None, "2CXO J08"),
+                                            ("2CXO J08", "2CXO J16"),
+                                            ("2CXO J16", None)]
+
+    ranges = stackdata.tap_name_ranges(24)
+    assert len(ranges) == 24
+    for (_, hi), (lo, _) in zip(ranges[:-1], ranges[1:]):
+        assert hi == lo
+
+
+@pytest.mark.parametrize("nparts", [0, 25])
+def test_name_ranges_invalid(nparts):
+    with pytest.raises(ValueError):
+        stackdata.tap_name_ranges(nparts)
+
+
+def test_range_query():
+    query = "SELECT a.name FROM t a ORDER BY name ASC"
+    assert stackdata.tap_range_query(query, "a.name", "X1", "X2") == \
+        "SELECT a.name FROM t a WHERE a.name >= 'X1' AND a.name < 'X2' " + \
+        "ORDER BY name ASC"
+    assert stackdata.tap_range_query("SELECT a FROM t", "a", None, "X") == \
+        "SELECT a FROM t WHERE a < 'X'"
+    assert stackdata.tap_range_query(query, "a.name", None, None) == query
+
+    with pytest.raises(ValueError):
+        stackdata.tap_range_query("SELECT a FROM t WHERE a > 2", "a", "X", None)
+
+
+def test_source_ranges_match_single_query(url):
+    single = stackdata.get_source_properties(url=url)
+    split = stackdata.get_source_properties(nparts=2, nworkers=2, url=url)
+
+    assert split["order"] == single["order"]
+    assert len(split["table"]) == 5
+    for name in single["order"]:
+        scol = single["table"][name]
+        pcol = split["table"][name]
+        assert scol.mask.tolist() == pcol.mask.tolist()
+        assert np.array_equal(scol.values[~scol.mask], pcol.values[~pcol.mask])
+        assert scol.tolist() == pcol.tolist()
+
+
+def test_stack_ranges_match_single_query(url):
+    single = stackdata.get_stack_numbers(url=url)
+    assert single == {"acisfJ0000036p000000_001": 3,
+                      "acisfJ0000016p000000_001": 1,
+                      "acisfJ1234567p010203_001": 1,
+                      "acisfJ2359599m895959_001": 1}
+
+    for nparts in [2, 5, 24]:
+        assert stackdata.get_stack_numbers(nparts=nparts, url=url) == single
+
+
+def test_ranges_are_retried(flaky_url, monkeypatch, capsys):
+    monkeypatch.setattr(stackdata.time, "sleep", lambda delay: None)
+    counts = stackdata.get_stack_numbers(nparts=6, nworkers=3, url=flaky_url)
+    assert counts == {"acisfJ0000036p000000_001": 3,
+                      "acisfJ0000016p000000_001": 1,
+                      "acisfJ1234567p010203_001": 1,
+                      "acisfJ2359599m895959_001": 1}
+    assert capsys.readouterr().out.count("retrying") == 2
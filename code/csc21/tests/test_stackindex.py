@@ -0,0 +1,85 @@
+"""Tests for the stack to source-row index (stackindex.py)."""
+
+import os
+
+import numpy as np
+import pytest
+
+import make_status
+import srctable
+import stackdata
+import stackindex
+
+
+DATADIR = os.path.join(os.path.dirname(__file__), "data")
+
+SRCNAMES = ["c", "a", "d", "b"]
+
+PAIRS = [("a", "s2"), ("d", "s1"), ("b", "s1"), ("x", "s1"),
+         ("c", "s2"), ("a", "s1"), ("y", "s3")]
+
+
+def make_index():
+    names, stacks = zip(*PAIRS)
+    return stackindex.build(srctable.Column(SRCNAMES).values, names, stacks)
+
+
+def test_build():
+    index = make_index()
+    assert index["stacks"].tolist() == ["s1", "s2", "s3"]
+    assert index["offsets"].tolist() == [0, 3, 5, 5]
+    assert index["rows"].tolist() == [1, 2, 3, 0, 1]
+    assert index["nmissing"] == 2
+
+
+def test_lookup():
+    index = make_index()
+    for stack in ["s1", "s2", "s3"]:
+        rows = stackindex.lookup(index, stack)
+        got = sorted(SRCNAMES[row] for row in rows)
+        want = sorted(name for name, s in PAIRS
+                      if s == stack and name in SRCNAMES)
+        assert got == want
+
+    with pytest.raises(KeyError):
+        stackindex.lookup(index, "s0")
+
+
+def test_empty_table():
+    index = stackindex.build([], ["a"], ["s1"])
+    assert index["rows"].tolist() == []
+    assert index["offsets"].tolist() == [0, 0]
+    assert index["nmissing"] == 1
+
+
+@pytest.mark.parametrize("compress", [False, True])
+def test_round_trip(tmp_path, compress):
+    index = make_index()
+    outname = str(tmp_path / "index.json")
+    stackindex.write(outname, index, len(SRCNAMES), compress=compress)
+
+    got = stackindex.read(outname)
+    assert got["nsources"] == len(SRCNAMES)
+    for key in ["stacks", "offsets", "rows"]:
+        assert np.array_equal(got[key], index[key])
+
+
+def test_write_stack_index(tmp_path):
+    """The rows refer to the sources in the chunks."""
+
+    with open(os.path.join(DATADIR, "srcprop_tabledata.vot"), "rt") as fh:
+        source_data = stackdata.srclist_process_votable(fh.read())
+
+    names = source_data["table"]["name"].tolist()
+    assoc = {"name": [names[4], names[0], names[2], "2CXO J000030.3+303030X"],
+             "stack": ["s1", "s1", "s2", "s2"]}
+
+    outname = str(tmp_path / "stacks.json")
+    make_status.write_stack_index(source_data, assoc, outname=outname)
+
+    index = stackindex.read(outname)
+    assert index["nsources"] == 5
+    assert [names[row] for row in stackindex.lookup(index, "s1")] == \
+        [names[0], names[4]]
+    assert [names[row] for row in stackindex.lookup(index, "s2")] == \
+        [names[2]]
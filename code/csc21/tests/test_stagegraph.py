@@ -0,0 +1,57 @@
+"""Tests for running the stages (stagegraph.py)."""
+
+import operator
+
+import pytest
+
+import srcjson
+import stagegraph
+
+
+def test_run_stages():
+    stages = {"a": (lambda: 2, []),
+              "b": (lambda: 3, []),
+              "c": (operator.mul, ["a", "b"]),
+              "d": (lambda a, c: c - a, ["a", "c"])}
+    results, timings = stagegraph.run_stages(stages)
+    assert results == {"a": 2, "b": 3, "c": 6, "d": 4}
+    assert sorted(timings) == ["a", "b", "c", "d"]
+
+
+def test_failed_stage():
+    def fail():
+        raise OSError("no network")
+
+    ran = []
+    stages = {"a": (fail, []),
+              "b": (lambda: ran.append("b"), ["a"])}
+    with pytest.raises(OSError):
+        stagegraph.run_stages(stages)
+
+    assert ran == []
+
+
+def test_process_pool_in_stage():
+    """srcjson.run_jobs can be called from several stages at once."""
+
+    def work(n):
+        return srcjson.run_jobs(operator.add, [(i, n) for i in range(4)],
+                                nproc=2)
+
+    stages = {"one": (lambda: work(10), []),
+              "two": (lambda: work(20), [])}
+    results, _ = stagegraph.run_stages(stages)
+    assert results == {"one": [10, 11, 12, 13], "two": [20, 21, 22, 23]}
+
+
+def test_process_pool_is_not_forked(monkeypatch):
+    methods = []
+
+    class Pool(srcjson.ProcessPoolExecutor):
+        def __init__(self, max_workers=None, mp_context=None):
+            methods.append(mp_context.get_start_method())
+            super().__init__(max_workers=max_workers, mp_context=mp_context)
+
+    monkeypatch.setattr(srcjson, "ProcessPoolExecutor", Pool)
+    assert srcjson.run_jobs(operator.neg, [(1,), (2,)], nproc=2) == [-1, -2]
+    assert methods[0] in ["forkserver", "spawn"]
@@ -0,0 +1,136 @@
+"""Tests for the JSON version of the status table (make_status.py)."""
+
+import json
+import os
+
+import pytest
+
+import make_status
+import stackdata
+
+
+def make_stackid(idx):
+    inst = "acisfJ" if idx % 4 else "hrcfJ"
+    return "{}{:07d}{}{:06d}_{:03d}".format(inst, idx * 7919 % 2359599,
+                                            "p" if idx % 2 else "m",
+                                            idx * 13 % 895959, idx % 5)
+
+
+def make_inputs(nstacks):
+    """The processing, stack_count, and catalog values."""
+
+    processing = {}
+    stack_count = {}
+    obis = {}
+    status = {}
+    targets = {}
+    for idx in range(nstacks):
+        stack = make_stackid(idx)
+        obis[stack] = [(1000 + idx, 0), (2000 + idx // 2, 1)]
+        status[stack] = ["new", "updated", "unchanged"][idx % 3]
+        targets[1000 + idx] = f"target {idx}"
+        targets[2000 + idx // 2] = f"field {idx // 2}"
+        if idx % 3 == 0:
+            processing[stack] = {"state": "Pending"}
+        else:
+            processing[stack] = {"state": "Completed",
+                                 "completed_str": f"2026-10-{1 + idx % 28:02d}"}
+            stack_count[stack] = idx * 3
+
+    catalog = stackdata.StackCatalog(obis, status, targets, {})
+    return processing, stack_count, catalog
+
+
+def read(name):
+    with open(name, "rt") as fh:
+        return json.load(fh)
+
+
+def read_pages(outhead=make_status.STATUS_TABLE):
+    """Return the first page and the rows from all the pages."""
+
+    first = read(f"{outhead}.json")
+    rows = list(first["rows"])
+    for page in range(2, first.get("npages", 1) + 1):
+        data = read(f"{outhead}.{page}.json")
+        assert data["page"] == page
+        assert 0 < len(data["rows"]) <= first["pagesize"]
+        rows.extend(data["rows"])
+
+    return first, rows
+
+
+@pytest.mark.parametrize("nstacks,pagesize,npages",
+                         [(23, 5, 5), (20, 5, 4), (3, 5, 1), (5, 5, 1),
+                          (6, 5, 2), (0, 5, 1), (7, 1, 7)])
+def test_pages(tmp_path, monkeypatch, nstacks, pagesize, npages):
+    """The pages contain each row once, in order."""
+
+    monkeypatch.chdir(tmp_path)
+    inputs = make_inputs(nstacks)
+    expected = make_status.status_table_rows(*inputs)
+    assert len(expected) == nstacks
+
+    make_status.write_status_table(inputs[0], "2026-10-17 12:00",
+                                   inputs[1], inputs[2], pagesize=pagesize)
+
+    first, rows = read_pages()
+    assert first["cols"] == make_status.STATUS_TABLE_COLS
+    assert first["nrows"] == nstacks
+    assert first["lastupdate"] == "2026-10-17 12:00"
+    assert (first["pagesize"], first["npages"]) == (pagesize, npages)
+    assert len(first["rows"]) == min(nstacks, pagesize)
+    assert rows == expected
+    assert [row[0] for row in rows] == list(inputs[0])
+
+    # The last page is partly filled when nstacks is not a multiple
+    # of pagesize.
+    #
+    if npages > 1:
+        last = read(f"{make_status.STATUS_TABLE}.{npages}.json")
+        assert len(last["rows"]) == nstacks - (npages - 1) * pagesize
+
+    names = sorted(os.listdir(tmp_path))
+    assert names == sorted([f"{make_status.STATUS_TABLE}.json"] +
+                           [f"{make_status.STATUS_TABLE}.{page}.json"
+                            for page in range(2, npages + 1)])
+
+
+def test_no_pages(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    processing, stack_count, catalog = make_inputs(12)
+    make_status.write_status_table(processing, "2026-10-17 12:00",
+                                   stack_count, catalog)
+
+    first = read(f"{make_status.STATUS_TABLE}.json")
+    assert "npages" not in first
+    assert "pagesize" not in first
+    assert first["rows"] == make_status.status_table_rows(processing,
+                                                          stack_count,
+                                                          catalog)
+    assert os.listdir(tmp_path) == [f"{make_status.STATUS_TABLE}.json"]
+
+
+def test_old_pages_removed(tmp_path, monkeypatch):
+    """Pages from a previous (larger) run are removed."""
+
+    monkeypatch.chdir(tmp_path)
+    inputs = make_inputs(23)
+    make_status.write_status_table(inputs[0], "2026-10-17 12:00",
+                                   inputs[1], inputs[2], pagesize=5)
+    assert os.path.exists(f"{make_status.STATUS_TABLE}.5.json")
+
+    # Files that are not pages are left alone.
+    #
+    keep = ["stacks-2.1.txt", "stacks-2.1.x.json", "stacks-2.10.json"]
+    for name in keep:
+        (tmp_path / name).write_text("")
+
+    inputs = make_inputs(8)
+    make_status.write_status_table(inputs[0], "2026-10-17 13:00",
+                                   inputs[1], inputs[2], pagesize=5)
+    first, rows = read_pages()
+    assert first["npages"] == 2
+    assert rows == make_status.status_table_rows(*inputs)
+    assert sorted(os.listdir(tmp_path)) == \
+        sorted(["stacks-2.1.json", "stacks-2.1.2.json"] + keep)
@@ -0,0 +1,289 @@
+"""Tests for the stack status layouts and deltas (statusjson.py)."""
+
+import copy
+import json
+import os
+import re
+import shutil
+import subprocess
+
+import pytest
+
+import make_status
+import statusjson
+
+
+WWTJS = os.path.join(os.path.dirname(__file__), "..", "..", "..",
+                     "website", "wwt.js")
+
+def make_stackid(idx):
+    return "acisfJ{:07d}p{:06d}_{:03d}".format(idx * 7919 % 3600000, idx, idx % 7)
+
+
+def make_status_dict(nstacks=20, lastupdate="2026-10-17 12:00"):
+    """A status in the dicts layout (without the runid)."""
+
+    stacks = {}
+    completed = {}
+    nsource = {}
+    for idx in range(nstacks):
+        stackid = make_stackid(idx)
+        state = idx % 3
+        stacks[stackid] = state
+        if state == statusjson.STATE_CODES["Completed"]:
+            completed[stackid] = 1700000000 + 3600 * idx
+            nsource[stackid] = idx * 4
+
+        # Some stacks in processing have a source count.
+        elif state == statusjson.STATE_CODES["Processing"] and idx % 2:
+            nsource[stackid] = 0
+
+    return {"stacks": stacks, "completed": completed, "nsource": nsource,
+            "lastupdate": lastupdate, "lastupdate_db": "2026-10-17 11:50",
+            "nsources": sum(nsource.values()), "nchunks": 3}
+
+
+def with_runid(status):
+    status = copy.deepcopy(status)
+    status["runid"] = statusjson.run_id(status)
+    return status
+
+
+def update(status):
+    """Add, remove, and change stacks (including completing a stack)."""
+
+    new = copy.deepcopy(status)
+    new.pop("runid", None)
+
+    stackids = sorted(new["stacks"])
+
+    # Remove a completed stack.
+    #
+    gone = [stack for stack in stackids if stack in new["completed"]][0]
+    for key in statusjson.STACK_FIELDS:
+        new[key].pop(gone, None)
+
+    stackids.remove(gone)
+
+    # Add a pending and a completed stack.
+    #
+    new["stacks"][make_stackid(100)] = 0
+    new["stacks"][make_stackid(101)] = 1
+    new["completed"][make_stackid(101)] = 1800000000
+    new["nsource"][make_stackid(101)] = 12
+
+    # Complete a pending stack, re-process a completed stack, and
+    # change the source count of a stack.
+    #
+    pending = [stack for stack in stackids if new["stacks"][stack] == 0]
+    done = [stack for stack in stackids if stack in new["completed"]]
+
+    new["stacks"][pending[0]] = 1
+    new["completed"][pending[0]] = 1800003600
+    new["nsource"][pending[0]] = 3
+
+    new["stacks"][done[0]] = 2
+    del new["completed"][done[0]]
+    new["nsource"][done[1]] += 1
+
+    new["lastupdate"] = "2026-10-17 13:00"
+    new["nsources"] = sum(new["nsource"].values())
+    return new
+
+
+def test_runid():
+    status = make_status_dict()
+    runid = statusjson.run_id(status)
+    assert len(runid) == 16
+
+    # The order of the keys and the lastupdate time do not matter.
+    #
+    reordered = {key: status[key] for key in reversed(list(status))}
+    reordered["stacks"] = dict(reversed(list(status["stacks"].items())))
+    assert statusjson.run_id(reordered) == runid
+    assert statusjson.run_id(dict(status, lastupdate="2027-01-01 00:00")) == runid
+    assert statusjson.run_id(dict(status, runid="x")) == runid
+
+    # Any other change does.
+    #
+    changed = copy.deepcopy(status)
+    changed["stacks"][make_stackid(0)] = 1
+    assert statusjson.run_id(changed) != runid
+
+    changed = copy.deepcopy(status)
+    changed["nsource"][make_stackid(1)] += 1
+    assert statusjson.run_id(changed) != runid
+
+    assert statusjson.run_id(dict(status, nchunks=4)) != runid
+    assert statusjson.run_id(dict(status, lastupdate_db="x")) != runid
+
+
+def test_delta_round_trip():
+    old = with_runid(make_status_dict())
+    new = with_runid(update(old))
+    assert new["runid"] != old["runid"]
+
+    delta = statusjson.make_delta(old, new)
+    assert (delta["base"], delta["target"]) == (old["runid"], new["runid"])
+    assert delta["nchanged"] == 6
+    assert delta["fields"] == {"lastupdate": new["lastupdate"],
+                               "nsources": new["nsources"]}
+
+    gone = sorted(set(old["stacks"]) - set(new["stacks"]))
+    assert len(gone) == 1
+    assert delta["changes"]["stacks"][gone[0]] is None
+
+    assert statusjson.apply_delta(old, delta) == new
+
+    # The delta is written out as JSON.
+    #
+    delta = json.loads(json.dumps(delta, sort_keys=True))
+    assert statusjson.apply_delta(old, delta) == new
+
+    # The input is not changed.
+    #
+    assert old == with_runid(make_status_dict())
+
+
+def test_delta_fields():
+    """Fields that are added or removed are included."""
+
+    old = with_runid(dict(make_status_dict(), srcprop="manifest.json"))
+    new = make_status_dict()
+    new["extra"] = [1, 2]
+    new = with_runid(new)
+
+    delta = statusjson.make_delta(old, new)
+    assert delta["nchanged"] == 0
+    assert delta["fields"] == {"extra": [1, 2], "srcprop": None}
+    assert statusjson.apply_delta(old, delta) == new
+
+
+def test_empty_delta():
+    old = with_runid(make_status_dict())
+    new = with_runid(make_status_dict(lastupdate="2026-10-18 00:00"))
+    assert new["runid"] == old["runid"]
+
+    delta = statusjson.make_delta(old, new)
+    assert delta["nchanged"] == 0
+    assert delta["changes"] == {key: {} for key in statusjson.STACK_FIELDS}
+    assert statusjson.apply_delta(old, delta) == new
+
+
+def test_delta_wrong_base():
+    old = with_runid(make_status_dict())
+    new = with_runid(update(old))
+    delta = statusjson.make_delta(old, new)
+    with pytest.raises(ValueError):
+        statusjson.apply_delta(new, delta)
+
+
+def test_write_status_delta(tmp_path, capsys):
+    """The delta is only re-written when the status changes."""
+
+    statefile = tmp_path / "wwt21_status.state.json"
+    deltafile = tmp_path / "wwt21_status.delta.json"
+
+    first = with_runid(make_status_dict())
+    make_status.write_status_delta(first, str(statefile), str(deltafile))
+    assert not deltafile.exists()
+    assert statusjson.read_state(str(statefile)) == first
+
+    # The same stacks, but a later time.
+    #
+    second = with_runid(make_status_dict(lastupdate="2026-10-17 12:30"))
+    make_status.write_status_delta(second, str(statefile), str(deltafile))
+    assert not deltafile.exists()
+    assert "has not changed" in capsys.readouterr().out
+
+    third = with_runid(update(second))
+    make_status.write_status_delta(third, str(statefile), str(deltafile))
+    delta = json.loads(deltafile.read_text())
+    assert delta["base"] == second["runid"]
+    assert statusjson.apply_delta(second, delta) == third
+    assert statusjson.read_state(str(statefile)) == third
+
+    # A state file from before the runid was added.
+    #
+    old = make_status_dict()
+    statefile.write_text(json.dumps(old))
+    make_status.write_status_delta(third, str(statefile), str(deltafile))
+    delta = json.loads(deltafile.read_text())
+    assert delta["base"] == statusjson.run_id(old)
+    assert statusjson.apply_delta(with_runid(old), delta) == third
+
+
+@pytest.mark.parametrize("status", [make_status_dict(),
+                                    with_runid(make_status_dict(nstacks=1)),
+                                    make_status_dict(nstacks=0)])
+def test_layout_round_trip(status):
+    arrays = statusjson.to_arrays(status)
+    assert arrays["layout"] == "arrays"
+    assert arrays["stackids"] == sorted(status["stacks"])
+    for key in statusjson.STACK_FIELDS:
+        assert len(arrays[key]) == len(status["stacks"])
+
+    assert statusjson.to_dicts(arrays) == status
+    assert statusjson.to_dicts(json.loads(json.dumps(arrays))) == status
+
+    # The dicts layout is left alone.
+    #
+    assert statusjson.to_dicts(status) is status
+
+
+def test_layout_keeps_zero():
+    """A zero value is not confused with null."""
+
+    status = make_status_dict()
+    nzero = sum(value == 0 for value in status["nsource"].values())
+    assert nzero > 1
+
+    arrays = statusjson.to_arrays(status)
+    assert arrays["nsource"].count(0) == nzero
+    assert statusjson.to_dicts(arrays)["nsource"] == status["nsource"]
+
+
+def test_layout_mismatch():
+    arrays = statusjson.to_arrays(make_status_dict())
+    arrays["completed"] = arrays["completed"][:-1]
+    with pytest.raises(ValueError):
+        statusjson.to_dicts(arrays)
+
+
+def test_read_layouts(tmp_path):
+    status = with_runid(make_status_dict())
+    for layout in statusjson.LAYOUTS:
+        out = status if layout == "dicts" else statusjson.to_arrays(status)
+        outfile = tmp_path / f"{layout}.json"
+        outfile.write_text(json.dumps(out, sort_keys=True))
+        assert statusjson.read(str(outfile)) == status
+
+
+@pytest.mark.skipif(shutil.which("node") is None, reason="node is not installed")
+def test_layout_round_trip_js():
+    """The viewer (statusArraysToDicts in wwt.js) gives the same result."""
+
+    with open(WWTJS, "rt") as fh:
+        match = re.search(r"^  function statusArraysToDicts\(status\) \{$.*?^  \}$",
+                          fh.read(), re.MULTILINE | re.DOTALL)
+
+    assert match is not None
+    script = match.group(0) + """
+let txt = '';
+process.stdin.on('data', (data) => { txt += data; });
+process.stdin.on('end', () => {
+  console.log(JSON.stringify(statusArraysToDicts(JSON.parse(txt))));
+});
+"""
+
+    status = with_runid(make_status_dict())
+    arrays = statusjson.to_arrays(status)
+    proc = subprocess.run(["node", "-e", script], input=json.dumps(arrays),
+                          capture_output=True, text=True, check=True)
+    got = json.loads(proc.stdout)
+
+    # The layout and stackids fields are left in.
+    #
+    assert got.pop("layout") == "arrays"
+    assert got.pop("stackids") == arrays["stackids"]
+    assert got == status
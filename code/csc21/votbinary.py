@@ -0,0 +1,274 @@
+"""
+Decode the BINARY and BINARY2 serializations of a VOTABLE.
+
+Unlike the TABLEDATA serialization, where every cell has to be
+converted from text, the binary formats can be converted a column
+at a time with NumPy. Only the parts of the VOTable standard needed
+for the CSC TAP responses are supported: scalar fields of the
+numeric and boolean types and character strings (fixed or variable
+length).
+
+The column data is returned as a (values, mask) pair, where mask
+is True for null values.
+
+Requires NumPy.
+
+"""
+
+import base64
+import xml.etree.ElementTree as ET
+
+import numpy as np
+
+
+VOT_NS = "{http://www.ivoa.net/xml/VOTable/v1.2}"
+
+# The size, in bytes, and (big-endian) NumPy type of each element.
+#
+DATATYPES = {
+    "boolean": (1, "S1"),
+    "unsignedByte": (1, "u1"),
+    "short": (2, ">i2"),
+    "int": (4, ">i4"),
+    "long": (8, ">i8"),
+    "char": (1, "S1"),
+    "float": (4, ">f4"),
+    "double": (8, ">f8"),
+}
+
+
+def field_layout(field):
+    """Return the element size and whether it is variable length.
+
+    For fixed-length fields the size is the total size of the field.
+    """
+
+    dtype = field["datatype"]
+    try:
+        size, _ = DATATYPES[dtype]
+    except KeyError:
+        raise ValueError(f"Unsupported datatype: {dtype}") from None
+
+    arraysize = field.get("arraysize")
+    if arraysize is None:
+        return size, False
+
+    if dtype != "char":
+        raise ValueError(f"Unsupported arraysize for {field['name']}")
+
+    if arraysize.endswith("*"):
+        return size, True
+
+    return size * int(arraysize), False
+
+
+def find_row_starts(buf, fields, binary2):
+    """Find the byte offset of each row.
+
+    This is the only step that has to loop over the rows, and it
+    is only needed when there are variable-length fields.
+    """
+
+    nbitmap = (len(fields) + 7) // 8 if binary2 else 0
+    layout = [field_layout(field) for field in fields]
+
+    # Group the fixed-length fields so that each step is the
+    # number of fixed bytes followed by a variable-length field
+    # (with the given element size).
+    #
+    steps = []
+    nfixed = nbitmap
+    for size, variable in layout:
+        if not variable:
+            nfixed += size
+            continue
+
+        steps.append((nfixed, size))
+        nfixed = 0
+
+    nbytes = len(buf)
+    if len(steps) == 0:
+        if nbytes % nfixed != 0:
+            raise ValueError("Stream is not a multiple of the row size")
+
+        return np.arange(0, nbytes, nfixed, dtype=np.int64)
+
+    starts = []
+    pos = 0
+    while pos < nbytes:
+        starts.append(pos)
+        for skip, size in steps:
+            pos += skip
+            nelem = int.from_bytes(buf[pos:pos + 4], "big")
+            pos += 4 + nelem * size
+
+        pos += nfixed
+
+    if pos != nbytes:
+        raise ValueError("Stream ended part way through a row")
+
+    return np.asarray(starts, dtype=np.int64)
+
+
+def gather(arr, offsets, size):
+    """Extract size bytes starting at each offset as a 2D array."""
+
+    return arr[offsets[:, None] + np.arange(size)]
+
+
+def decode_column(arr, offsets, field):
+    """Decode the field, returning values, mask, and the new offsets.
+
+    The mask only flags the NaN and null-value cases; the BINARY2
+    null bitmap is handled by the caller.
+    """
+
+    dtype = field["datatype"]
+    size, variable = field_layout(field)
+    _, nptype = DATATYPES[dtype]
+
+    if variable:
+        lengths = gather(arr, offsets, 4).view(">u4")[:, 0].astype(np.int64)
+        offsets = offsets + 4
+        nbytes = lengths * size
+        maxlen = max(int(nbytes.max()), 1) if len(nbytes) > 0 else 1
+
+        # Pad each string with null bytes, which NumPy drops.
+        #
+        idx = offsets[:, None] + np.arange(maxlen)
+        np.minimum(idx, len(arr) - 1, out=idx)
+        raw = arr[idx]
+        raw[np.arange(maxlen)[None, :] >= nbytes[:, None]] = 0
+
+        values = raw.view(f"S{maxlen}")[:, 0].astype("U")
+        mask = np.zeros(len(values), dtype=bool)
+        return values, mask, offsets + nbytes
+
+    raw = gather(arr, offsets, size)
+    offsets = offsets + size
+
+    if dtype == "char":
+        values = raw.view(f"S{size}")[:, 0].astype("U")
+        mask = np.zeros(len(values), dtype=bool)
+
+    elif dtype == "boolean":
+        raw = raw[:, 0]
+        values = np.isin(raw, np.frombuffer(b"Tt1", dtype=np.uint8))
+        false = np.isin(raw, np.frombuffer(b"Ff0", dtype=np.uint8))
+        mask = ~(values | false)
+        values = values.astype(np.uint8)
+
+    else:
+        native = np.dtype(nptype).newbyteorder("=")
+        values = raw.view(nptype)[:, 0].astype(native)
+        if values.dtype.kind == "f":
+            mask = np.isnan(values)
+        elif "null" in field:
+            mask = values == field["null"]
+        else:
+            mask = np.zeros(len(values), dtype=bool)
+
+    return values, mask, offsets
+
+
+def decode_stream(buf, fields, binary2=True):
+    """Decode the binary stream.
+
+    Parameters
+    ----------
+    buf : bytes
+        The decoded contents of the STREAM element.
+    fields : list of dict
+        The name, datatype, and (optional) arraysize and null
+        values for each FIELD.
+    binary2 : bool
+        Is this the BINARY2 (with a null bitmap per row) or BINARY
+        serialization?
+
+    Returns
+    -------
+    columns : dict
+        The keys are the field names and the values are the
+        (values, mask) pairs.
+    """
+
+    starts = find_row_starts(buf, fields, binary2)
+    arr = np.frombuffer(buf, dtype=np.uint8)
+
+    nfields = len(fields)
+    if binary2:
+        nbitmap = (nfields + 7) // 8
+        bitmap = np.unpackbits(gather(arr, starts, nbitmap),
+                               axis=1)[:, :nfields].astype(bool)
+        offsets = starts + nbitmap
+    else:
+        bitmap = None
+        offsets = starts
+
+    columns = {}
+    for idx, field in enumerate(fields):
+        values, mask, offsets = decode_column(arr, offsets, field)
+        if bitmap is not None:
+            mask |= bitmap[:, idx]
+
+        columns[field["name"]] = (values, mask)
+
+    return columns
+
+
+def process_votable(cts):
+    """Decode a TAP response which uses BINARY or BINARY2.
+
+    Returns the FIELD elements and the column data (see decode_stream).
+    """
+
+    root = ET.fromstring(cts)
+    check = root.findall(f"./{VOT_NS}RESOURCE/{VOT_NS}INFO[@value='OK']")
+    if len(check) != 1:
+        # don't bother reporting more info until we need to
+        raise ValueError("query was not OK")
+
+    tbls = root.findall(f"./{VOT_NS}RESOURCE/{VOT_NS}TABLE[@name='results']")
+    if len(tbls) != 1:
+        raise ValueError(f"expected 1 table, found {len(tbls)}")
+
+    tbl = tbls[0]
+    fields = tbl.findall(VOT_NS + "FIELD")
+
+    for label, binary2 in [("BINARY2", True), ("BINARY", False)]:
+        streams = tbl.findall(f"{VOT_NS}DATA/{VOT_NS}{label}/{VOT_NS}STREAM")
+        if len(streams) > 0:
+            break
+    else:
+        raise ValueError("no BINARY or BINARY2 data found")
+
+    if len(streams) != 1:
+        raise ValueError(f"expected 1 stream, found {len(streams)}")
+
+    stream = streams[0]
+    encoding = stream.attrib.get("encoding")
+    if encoding != "base64":
+        raise ValueError(f"unsupported stream encoding: {encoding}")
+
+    buf = base64.b64decode(stream.text)
+    return fields, decode_stream(buf, [field_info(f) for f in fields],
+                                 binary2=binary2)
+
+
+def field_info(field):
+    """The information needed to decode the FIELD element."""
+
+    out = {"name": field.attrib["name"],
+           "datatype": field.attrib["datatype"]}
+
+    try:
+        out["arraysize"] = field.attrib["arraysize"]
+    except KeyError:
+        pass
+
+    nulls = field.findall(VOT_NS + "VALUES[@null]")
+    if len(nulls) > 0 and out["datatype"] not in ["char", "boolean",
+                                                  "float", "double"]:
+        out["null"] = int(nulls[0].attrib["null"])
+
+    return out
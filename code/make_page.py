@@ -3,7 +3,7 @@
 """
 Usage:
 
-./make_page.py [log|linear]
+./make_page.py [log|linear] [--cache | --refresh | --offline]
 
 Aim:
 
@@ -30,9 +30,20 @@ The PNG files are no-longer generated because
   b) with only 2 (soon to be 1) ensembles left, the sky plot is not
      that useful
 
+The source count can be cached with respcache.py (loaded from the
+csc21/ directory next to this script), but this is off by default so
+the scheduled runs always report the current count: --cache uses a
+cached value if it has not expired, --refresh re-runs the query
+(and saves it), and --offline only uses the cached value. Setting
+the CSC_TAP_CACHE environment variable also turns on the cache. The
+count is reported with the time it was queried, not the time the
+cache was read.
+
 """
 
+import os
 import re
+import sys
 import time
 import datetime
 import json
@@ -52,6 +63,14 @@ from mpl_toolkits.axes_grid1 import make_axes_locatable
 
 from astropy.table import Table
 
+# respcache.py lives in csc21/ (this script is run from its own
+# directory, as in create_pages.sh, without PYTHONPATH set).
+#
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                'csc21'))
+
+import respcache
+
 
 # It is not clear what timezone these times are in
 TIMEFORMAT_IN = '%Y-%m-%d %H:%M:%S'
@@ -481,28 +500,41 @@ def find_db_count():
     # not https yet
     resource = 'http://cda.cfa.harvard.edu/csccli/getProperties'
 
-    params = urllib.parse.urlencode(vals)
-    request = urllib.request.Request(resource, params.encode("ascii"))
-    request.add_header('User-Agent', 'csc-stats-gatherer/1.0')
+    def download():
+        params = urllib.parse.urlencode(vals)
+        request = urllib.request.Request(resource, params.encode("ascii"))
+        request.add_header('User-Agent', 'csc-stats-gatherer/1.0')
+
+        rsp = urllib.request.urlopen(request)
+        code = rsp.getcode()
+        if code != 200:
+            raise IOError("Response to getProperties was {}".format(code))
 
-    rsp = urllib.request.urlopen(request)
-    code = rsp.getcode()
-    if code != 200:
-        raise IOError("Response to getProperties was {}".format(code))
+        return rsp.read()
 
-    cts = rsp.read().decode('ascii').rstrip()
-    lines = cts.split('\n')
-    if len(lines) != 3 or not lines[0].startswith('#') or \
-       lines[1] != 'total_count' or \
-                   len(lines[2].strip().split()) != 1:
-        raise IOError("Unexpected return value:\n{}\n".format(cts))
+    def process(rsp):
+        cts = rsp.decode('ascii').rstrip()
+        lines = cts.split('\n')
+        if len(lines) != 3 or not lines[0].startswith('#') or \
+           lines[1] != 'total_count' or \
+                       len(lines[2].strip().split()) != 1:
+            raise IOError("Unexpected return value:\n{}\n".format(cts))
 
-    count = int(lines[2].strip())
+        return int(lines[2].strip())
 
-    # exact time not that important
-    now = time.strftime(TIMEFORMAT_OUT)
+    # The response is cached, so re-running soon after does not
+    # need to re-query the archive.
+    #
+    count = respcache.fetch_process(resource, vals, download, process)
+
+    # Report when the count was queried, which is not now if the
+    # cached response was used (exact time not that important).
+    #
+    checked = respcache.fetch_time(resource, vals)
+    if checked is None:
+        checked = time.time()
 
-    return count, now
+    return count, time.strftime(TIMEFORMAT_OUT, time.localtime(checked))
 
 
 # use of re.compile is ott here
@@ -718,21 +750,27 @@ def doit(progname, yscale='linear'):
 
 def usage(progname):
 
-    sys.stderr.write("Usage: {} [log|linear]\n".format(progname))
+    sys.stderr.write("Usage: {} [log|linear] [--cache | --refresh | --offline]\n".format(progname))
     sys.exit(1)
 
 
 if __name__ == "__main__":
 
-    import os
-    import sys
+    modes = {'--cache': 'use', '--refresh': 'refresh', '--offline': 'offline'}
+    args = [arg for arg in sys.argv[1:] if arg not in modes]
+    flags = [arg for arg in sys.argv[1:] if arg in modes]
+    if len(flags) > 1:
+        usage(sys.argv[0])
+
+    if len(flags) == 1:
+        respcache.configure(mode=modes[flags[0]])
 
-    if len(sys.argv) > 2:
+    if len(args) > 1:
         usage(sys.argv[0])
 
     yscale = 'log'
-    if len(sys.argv) == 2:
-        yscale = sys.argv[1]
+    if len(args) == 1:
+        yscale = args[0]
         if yscale not in ['log', 'linear']:
             usage(sys.argv[0])
 
@@ -4,7 +4,8 @@
 
 Usage:
 
-  propsjson.py pre1 infile outhead
+  props2json.py pre1 infile outhead [--gzip] [--layout rows|columns]
+                [--nproc n]
 
 Aim:
 
@@ -27,26 +28,53 @@ up into chunks of x rows per file. So the output is
   outhead.4.json
   ...
 
+or, with the --gzip flag, outhead.1.json.gz ... which are created
+in parallel and are deterministic (as with gzip -n). The --nproc
+option sets the number of processes, which defaults to the number
+of CPUs; the output does not depend on it.
+
+The TSV file is read in parallel: once the header has been parsed,
+the data lines are split into byte ranges that are converted by
+separate processes and then combined in order (see read_tsv).
+
+Each chunk normally has a rows field, which lists the values for
+each source. With --layout columns this is replaced by a columns
+field, which maps each column name to the list of its values.
+
 Perhaps should take a list of to-be-completed stacks, so we can identify
 those sources from the preliminary list we are missing data (so copy
 over ra/dec). This way we avoid having to do matches.
 
-RA and Dec are limited to 4 and 5 decimal places, to save some space
-(this should be sub-arcsecond accuracy). This saves less than 1% space
-so actually don't do it.
+RA and Dec are not rounded: limiting them to 4 and 5 decimal places
+saves less than 1% space. See csc21/quantize.py for the fixed-point
+version used for the CSC 2.1 data, which does make a difference.
 
 There is some attempt to "save" space by
 
   - changing boolean fields from 'FALSE'/'TRUE' to 0/1
   - changing the band field from ''/'broad'/'wide' to -1/0/1
 
+The data is stored in a srctable.SourceTable, and written out with
+srcjson; these modules are loaded from the csc21/ directory next to
+this script.
+
 """
 
 
 import json
-# import math
+import os
+import sys
 
-from collections import OrderedDict
+import numpy as np
+
+# srctable.py and srcjson.py live in csc21/ (this script is run from
+# its own directory, as in create_pages.sh, without PYTHONPATH set).
+#
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                'csc21'))
+
+import srcjson
+import srctable
 
 
 try:
@@ -57,23 +85,6 @@ except ImportError:
     fileio = 'astropy'
 
 
-def roundy(v, n):
-    """Restrict to n decimal places.
-
-    Up to the vagueris of floating-point representation.
-
-    And have decided not to do this, so it just returns the
-    input value.
-    """
-
-    """
-    t = 10**n
-    return math.floor(v * t + 0.5) / t
-    """
-
-    return v
-
-
 def unitify(unitstr):
     """Try and clean up the units string"""
 
@@ -125,118 +136,79 @@ def get_colinfo(l):
 
 _nmiss = 1
 
+# The columns of the pre-release list.
+#
+PRE_COLUMNS = ['name', 'ra', 'dec', 'err_ellipse_r0']
+
 
-def update_store(store, converters, ncols, l, pre):
-    """Add the column data to the store.
+def convert_columns(order, metadata, rows):
+    """Convert the TSV rows (each a list of strings) to columns.
 
     There is limited type conversion:
        string
        number
 
+    The conversion is done a column at a time. The return value is
+    a dictionary of srctable.Column values.
+    """
+
+    columns = {}
+    toks = zip(*rows) if len(rows) > 0 else [()] * len(order)
+    for name, ctoks in zip(order, toks):
+        dtype = metadata[name]['datatype']
+        converter = make_converter(name, dtype)
+        if dtype == 'string' and name.endswith('_flag'):
+            dtype = 'flag'
+
+        columns[name] = srctable.convert_column(ctoks, dtype,
+                                                converter,
+                                                true='TRUE',
+                                                false='FALSE')
+
+    return columns
+
+
+def make_table(store, columns, pre):
+    """Create the source table from the converted columns.
+
     Use TSV values rather than those in pre; actually, at present the
     only thing pre is used for is an existance check (that the
     pre-release knows about this source).
 
-    Special case handling for flux_aper_[b/w] and the _lolim/_hilim
-    variants.
+    The flux_aper_[b/w] and the _lolim/_hilim variants are merged
+    into the fluxband, flux, flux_lolim, and flux_hilim columns (see
+    srctable.merge_fluxes).
     """
 
     global _nmiss
 
-    toks = l.split('\t')
-    assert len(toks) == ncols, (len(toks), ncols, l)
-
-    rowdata = dict(list(zip(store['order'], toks)))
-    name = rowdata['name'].strip()
-
-    if name not in pre:
+    names = columns['name'].values
+    for name in srctable.to_str(names[~in_srclist(pre, names)]).tolist():
         print("[{}] Source {} not in ".format(_nmiss, name) +
               "prerelease list")
         _nmiss += 1
 
-    # row = {}
-    row = []
-
-    # need to "down convert" the fluxes
-    rowdata = dict(list(zip(store['order'], toks)))
-
-    fb = rowdata['flux_aper_b'].strip()
-    fw = rowdata['flux_aper_w'].strip()
-    if fb != '' and fw != '':
-        print("WARNING: {} has fb=[{}] fw=[{}]".format(name,
-                                                       fb,
-                                                       fw))
-
-    # extract flux values here, not in loop
-    if fb != '':
-        # band = 'broad'
-        band = 0
-        flux = rowdata['flux_aper_b']
-        fluxlo = rowdata['flux_aper_lolim_b']
-        fluxhi = rowdata['flux_aper_hilim_b']
-    elif fw != '':
-        # band = 'wide'
-        band = 1
-        flux = rowdata['flux_aper_w']
-        fluxlo = rowdata['flux_aper_lolim_w']
-        fluxhi = rowdata['flux_aper_hilim_w']
-    else:
-        # band = ''
-        band = -1
-        flux = ''
-        fluxlo = ''
-        fluxhi = ''
-
-    flux = convert_to_float(flux)
-    fluxlo = convert_to_float(fluxlo)
-    fluxhi = convert_to_float(fluxhi)
-
-    for col, val in zip(store['order'], toks):
-        assert col not in row
-
-        # Need to handle conversion of flux values
-        if col == 'flux_aper_b':
-            row.extend([band, flux, fluxlo, fluxhi])
-
-        if col.startswith('flux_aper'):
-            continue
-
-        try:
-            val = converters[col](val)
-        except ValueError:
-            print("Unable to convert '{}'".format(val))
-
-        if col == 'ra':
-            val = roundy(val, 4)
-        elif col == 'dec':
-            val = roundy(val, 5)
-
-        # row[col] = val
-        row.append(val)
-
-    store['rows'].append(row)
+    return srctable.merge_fluxes(store['order'], columns, columns['name'])
 
 
 def add_unprocessed_sources(store, pre):
     """Add in basic information for sources that have not been
     processed yet.
 
+    The names are found with a binary search of the pre-release list
+    (which is sorted by name, see make_srclist) rather than with
+    Python sets.
     """
 
     print("Looking for unprocessed sources")
 
-    nameidx = store['order'].index('name')
-    if nameidx == -1:
+    table = store['table']
+    if 'name' not in table.names:
         raise IOError("No name field!")
 
-    # Hoping that set checking is faster than list checking
-    # already_seen = set([row['name'] for row in store['rows']])
-    already_seen = set([row[nameidx] for row in store['rows']])
-    pre_names = set(pre.keys())
-
-    # Check there's no repeats
-    assert len(already_seen) == len(store['rows'])
-    assert len(pre_names) == len(pre)
+    names = table['name'].values
+    pre_names = pre['name'].values
+    pre_rows = np.arange(len(pre_names))
 
     # The names were not meant to change, but they did for one
     # source, so exclude that one from the error reporting.
@@ -245,55 +217,79 @@ def add_unprocessed_sources(store, pre):
     renames = {'2CXO J200718.6-482145': '2CXO J200718.6-482146'}
 
     for (newname, oldname) in renames.items():
-        assert newname not in pre_names, newname
-        assert oldname not in already_seen, oldname
+        # Match the string type of the names (normally bytes).
+        new = pre_names.dtype.type(newname)
+        old = pre_names.dtype.type(oldname)
+
+        assert not is_member(pre_names, [new])[0], newname
+        assert not np.any(names == names.dtype.type(oldname)), oldname
+
+        if not is_member(pre_names, [old])[0]:
+            raise KeyError(oldname)
+
+        # Move the row to its new position, so that pre_names stays
+        # sorted, and pre_rows records the row in the pre-release list.
+        #
+        idx = np.searchsorted(pre_names, old)
+        row = pre_rows[idx]
+        pre_names = np.delete(pre_names, idx)
+        pre_rows = np.delete(pre_rows, idx)
+
+        pre_names = pre_names.astype(np.result_type(pre_names, np.array(new)),
+                                     copy=False)
+        idx = np.searchsorted(pre_names, new)
+        pre_names = np.insert(pre_names, idx, new)
+        pre_rows = np.insert(pre_rows, idx, row)
+
+    # Find each source in the pre-release list, counting how many
+    # times each pre-release source is matched.
+    #
+    idx, found = find_names(pre_names, names)
+    nseen = np.bincount(idx[found], minlength=len(pre_names))
+    newnames = np.sort(names[~found])
 
-        pre_names.remove(oldname)
-        pre_names.add(newname)
+    # Check there's no repeats (the pre-release list has already
+    # been checked).
+    assert not np.any(nseen > 1)
+    assert not np.any(newnames[1:] == newnames[:-1])
 
-    print("already_seen = {}".format(len(already_seen)))
+    print("already_seen = {}".format(len(names)))
     print("pre names    = {}".format(len(pre_names)))
 
-    # Try and ensure deterministic output
-    todo = sorted(list(pre_names.difference(already_seen)))
+    # Try and ensure deterministic output (pre_names is sorted).
+    unseen = nseen == 0
+    todo = pre_names[unseen]
     print("todo         = {}".format(len(todo)))
 
-    newnames = sorted(list(already_seen.difference(pre_names)))
     print(" <new sources> = {}".format(len(newnames)))
 
-    nmiss = 0
-    for name in todo:
+    for name in srctable.to_str(todo).tolist():
         print(" - missing {}".format(name))
-        srcdata = pre[name]
-
-        nmiss += 1
-        # row = {}
-        row = []
-        for col in store['order']:
-            assert col not in row
-
-            # handle conversion to flux
-            if col == 'flux_aper_b':
-                row.extend(['', None, None, None])
 
-            if col.startswith('flux_aper'):
-                continue
-
-            if col in srcdata:
-                val = srcdata[col]
-
-                if col == 'ra':
-                    val = roundy(val, 4)
-                elif col == 'dec':
-                    val = roundy(val, 5)
-
-            else:
-                val = None
+    # The missing sources only have the columns from the pre-release
+    # list, the rest are null. The fluxband column uses '' rather
+    # than null. The rows are selected all at once.
+    #
+    nmiss = len(todo)
+    rows = pre_rows[unseen]
+    columns = {}
+    for col in table.names:
+        template = table[col]
+        if col == 'name':
+            columns[col] = srctable.Column(todo)
+        elif col in pre.names:
+            vals = pre[col].values[rows].astype(template.values.dtype)
+            columns[col] = srctable.Column(vals)
+        else:
+            columns[col] = srctable.Column(np.zeros(nmiss,
+                                                    dtype=template.values.dtype),
+                                           np.ones(nmiss, dtype=bool))
 
-            # row[col] = val
-            row.append(val)
+    table['fluxband'].null = ''
+    columns['fluxband'].null = ''
 
-        store['rows'].append(row)
+    missing = srctable.SourceTable(table.names, columns)
+    store['table'] = srctable.SourceTable.concatenate([table, missing])
 
     print("There are {} unprocessed sources".format(nmiss))
 
@@ -342,56 +338,212 @@ def make_converter(name, dtype):
         raise ValueError(dtype)
 
 
-def read_tsv(infile, pre):
-    """Convert to a dictionary, storing lists.
+def read_tsv_header(fh):
+    """Parse the header of the TSV file (opened in binary mode).
 
-    Prefer the TSV values to the pre-release ones.
+    Returns the store, with the metadata and order fields set, and
+    the position of the first data line.
     """
 
-    store = {'metadata': {}, 'rows': [], 'order': []}
-    in_header = True
-    ncols = None
-    converters = {}
+    store = {'metadata': {}, 'order': []}
+    while True:
+        l = fh.readline().decode('utf-8').replace('\r\n', '\n')
+        if l == '':
+            raise ValueError("No column names found")
+
+        # Just want to remove the trailing '\n', not any
+        # trailing whitespace, since this has meaning here
+        # for the data columns.
+        #
+        assert l[-1] == '\n'
+        l = l[:-1]
+
+        if l.startswith('#'):
+            hdr = get_colinfo(l)
+            name = hdr['name']
+
+            assert name not in store['metadata']
+            store['metadata'][name] = hdr
+            store['order'].append(name)
+            continue
+
+        expected = '\t'.join(store['order'])
+        assert expected == l, \
+            "expected={}\n     got={}".format(expected, l)
+        return store, fh.tell()
 
-    with open(infile, 'r') as fh:
-        for l in fh.readlines():
 
-            # Just want to remove the trailing '\n', not any
-            # trailing whitespace, since this has meaning here
-            # for the data columns.
+# The maximum size, in bytes, of the data each process reads in at
+# a time.
+#
+SHARD_SIZE = 8 * 1024 * 1024
+
+
+def shard_ranges(infile, start, nshards):
+    """Split the data section of the file into byte ranges.
+
+    The data starts at start, and each range starts at the beginning
+    of a line and ends just after a newline (apart from the end of
+    the file). There may be less than nshards ranges.
+    """
+
+    size = os.path.getsize(infile)
+    bounds = [start]
+    with open(infile, 'rb') as fh:
+        for idx in range(1, nshards):
+            pos = start + (size - start) * idx // nshards
+
+            # Move to the start of the next line (which is pos if
+            # pos is already at the start of a line).
             #
-            # l = l.strip()
-            assert l[-1] == '\n'
-            l = l[:-1]
+            fh.seek(pos - 1)
+            fh.readline()
+            pos = fh.tell()
+            if pos > bounds[-1] and pos < size:
+                bounds.append(pos)
+
+    if size > bounds[-1]:
+        bounds.append(size)
 
-            if l.startswith('#'):
-                if not in_header:
-                    raise ValueError("Expected data, found header")
+    return list(zip(bounds[:-1], bounds[1:]))
 
-                hdr = get_colinfo(l)
-                name = hdr['name']
 
-                assert name not in store['metadata']
-                store['metadata'][name] = hdr
-                store['order'].append(name)
-                converters[name] = make_converter(name, hdr['datatype'])
-                continue
+def parse_shard(infile, start, end, order, metadata):
+    """Convert the lines between start and end (in bytes).
 
-            if in_header:
-                expected = '\t'.join(store['order'])
-                assert expected == l, \
-                    "expected={}\n     got={}".format(expected, l)
-                in_header = False
-                ncols = len(store['order'])
-                continue
+    This may be run in a separate process, and returns the columns
+    (see convert_columns).
+    """
+
+    with open(infile, 'rb') as fh:
+        fh.seek(start)
+        txt = fh.read(end - start).decode('utf-8')
+
+    if '\r' in txt:
+        txt = txt.replace('\r\n', '\n')
+
+    assert txt[-1] == '\n'
+
+    lines = txt[:-1].split('\n')
+    del txt
+
+    ncols = len(order)
+    rows = []
+    for l in lines:
+        if l.startswith('#'):
+            raise ValueError("Expected data, found header")
+
+        toks = l.split('\t')
+        assert len(toks) == ncols, (len(toks), ncols, l)
+        rows.append(toks)
+
+    return convert_columns(order, metadata, rows)
+
+
+def read_tsv(infile, pre, nproc=1):
+    """Convert to a dictionary, storing a SourceTable.
+
+    Prefer the TSV values to the pre-release ones.
+
+    The header is read in first, and then the data lines are split
+    into ranges of at most SHARD_SIZE bytes, which are converted by
+    nproc processes. The results are combined in the order of the
+    file, so the output does not depend on nproc, and only the
+    converted columns - rather than all the lines - are kept in
+    memory.
+    """
+
+    with open(infile, 'rb') as fh:
+        store, start = read_tsv_header(fh)
+
+    size = os.path.getsize(infile)
+    nshards = max(nproc, -(-(size - start) // SHARD_SIZE))
+    ranges = shard_ranges(infile, start, nshards)
+    print("Reading {}: {} bytes in {} parts, nproc={}".format(infile, size - start,
+                                                              len(ranges), nproc))
 
-            update_store(store, converters, ncols, l, pre)
+    jobs = [(infile, lo, hi, store['order'], store['metadata'])
+            for lo, hi in ranges]
+    parts = srcjson.run_jobs(parse_shard, jobs, nproc=nproc)
+    if len(parts) == 0:
+        columns = convert_columns(store['order'], store['metadata'], [])
+    else:
+        tables = [srctable.SourceTable(store['order'], part) for part in parts]
+        columns = srctable.SourceTable.concatenate(tables).columns
 
+    store['table'] = make_table(store, columns, pre)
     add_unprocessed_sources(store, pre)
     return store
 
 
+def make_srclist(names, ra, dec, r0):
+    """Create the pre-release list from the column values.
+
+    The return value is a srctable.SourceTable with the name, ra,
+    dec, and err_ellipse_r0 columns, sorted by name, so that names
+    can be found with a binary search (see in_srclist). The names
+    must be unique.
+    """
+
+    # Use the smallest string size (since the names may have been
+    # stripped).
+    #
+    names = np.asarray(names, dtype=str)
+    if len(names) > 0:
+        names = names.astype('U{}'.format(max(1, np.char.str_len(names).max())))
+
+    order = np.argsort(names, kind='stable')
+    names = names[order]
+    dups = names[1:][names[1:] == names[:-1]]
+    assert len(dups) == 0, dups[0]
+
+    columns = {'name': srctable.Column(names)}
+    for name, vals in [('ra', ra), ('dec', dec), ('err_ellipse_r0', r0)]:
+        columns[name] = srctable.Column(np.asarray(vals)[order].copy())
+
+    return srctable.SourceTable(PRE_COLUMNS, columns)
+
+
+def find_names(sorted_names, names):
+    """Find names in sorted_names (which must be sorted).
+
+    Returns the index of each name in sorted_names and whether it was
+    found (the index is only valid when it was).
+    """
+
+    names = np.asarray(names)
+    if names.dtype.kind != sorted_names.dtype.kind:
+        # The names are normally bytes (see srctable.Column), but
+        # bytes and str do not compare equal, so fall back to str.
+        sorted_names = srctable.to_str(sorted_names)
+        names = srctable.to_str(names).astype(str)
+
+    if len(sorted_names) == 0:
+        return np.zeros(len(names), dtype=int), np.zeros(len(names), dtype=bool)
+
+    idx = np.searchsorted(sorted_names, names)
+    idx[idx == len(sorted_names)] = 0
+    return idx, sorted_names[idx] == names
+
+
+def is_member(sorted_names, names):
+    """Which of names are in sorted_names (which must be sorted)?
+
+    Returns a boolean array.
+    """
+
+    return find_names(sorted_names, names)[1]
+
+
+def in_srclist(pre, names):
+    """Which of names are in the pre-release list?"""
+
+    return is_member(pre['name'].values, names)
+
+
 def read_srclist(infile):
+    """Read in the pre-release list (see make_srclist)."""
+
 
     if fileio == 'pycrates':
         return read_srclist_crates(infile)
@@ -413,21 +565,11 @@ def read_srclist_crates(infile):
     #
     fname = "{}[cols NAME,RA,DEC,ERR_ELLIPSE_R0]".format(infile)
     cr = pycrates.read_file(fname)
-    out = {}
-
-    # copies are a desperate/ineffectual attempt to save some memory
-    for name, ra, dec, r0 in zip(cr.NAME.values.copy(),
-                                 cr.RA.values.copy(),
-                                 cr.DEC.values.copy(),
-                                 cr.ERR_ELLIPSE_R0.values.copy()):
-
-        # SHOULD we strip the name?
-        name = str(name)
-        assert name not in out
-        out[name] = {'name': name, 'ra': ra, 'dec': dec,
-                     'err_ellipse_r0': r0}
 
-    return out
+    # SHOULD we strip the name?
+    return make_srclist(np.asarray(cr.NAME.values, dtype=str),
+                        cr.RA.values, cr.DEC.values,
+                        cr.ERR_ELLIPSE_R0.values)
 
 
 def read_srclist_astropy(infile):
@@ -441,74 +583,101 @@ def read_srclist_astropy(infile):
     assert tbl.colnames == ['NAME', 'RA', 'DEC',
                             'ERR_ELLIPSE_R0'], tbl.colnames
 
-    out = {}
-    for row in tbl:
+    names = np.char.strip(np.asarray(tbl['NAME'], dtype=str))
+    return make_srclist(names, tbl['RA'], tbl['DEC'],
+                        tbl['ERR_ELLIPSE_R0'])
 
-        name = row['NAME']
-        ra = row['RA']
-        dec = row['DEC']
-        r0 = row['ERR_ELLIPSE_R0']
 
-        name = str(name).strip()
-        assert name not in out
-        out[name] = {'name': name, 'ra': ra, 'dec': dec,
-                     'err_ellipse_r0': r0}
+def write_chunk(outname, ntotal, start, colorder, table, compress=False,
+                layout='rows'):
+    """Write out a chunk of the source data.
 
-    return out
+    This may be run in a separate process, so the file name is
+    returned rather than displayed.
+    """
+
+    # Write the keys in a fixed order so that we can be sure it
+    # serializes the same if the input data is the same (this
+    # matches the OrderedDict version that was used before).
+    #
+    with srcjson.open_output(outname, compress=compress) as fh:
+        if layout == 'columns':
+            fh.write('{{"ntotal": {}, "start": {}, "cols": {}, "columns": '.format(ntotal, start, json.dumps(colorder)))
+            fh.write(srcjson.encode_columns(table))
+        else:
+            fh.write('{{"ntotal": {}, "start": {}, "cols": {}, "rows": '.format(ntotal, start, json.dumps(colorder)))
+            fh.write(srcjson.encode_table(table))
+
+        fh.write('}')
+
+    return outname
 
 
-def convert(srcfile, infile, outhead, chunksize):
+def convert(srcfile, infile, outhead, chunksize, compress=False, nproc=1,
+            layout='rows'):
+
+    if layout not in ['rows', 'columns']:
+        raise ValueError("Unknown layout: {}".format(layout))
 
     pre = read_srclist(srcfile)
-    cts = read_tsv(infile, pre)
+    cts = read_tsv(infile, pre, nproc=nproc)
 
     # ASSUME there is a name field
-    ntotal = len(cts['rows'])
+    table = cts['table']
+    ntotal = len(table)
     start = 0
     end = start + chunksize
 
     ctr = 1
 
-    # Convert column order to handle flux conversion
+    # The column order includes the flux conversion
     #
-    colorder = []
-    for col in cts['order']:
-        if col == 'flux_aper_b':
-            colorder.extend(['fluxband', 'flux',
-                             'flux_lolim', 'flux_hilim'])
-        if col.startswith('flux_aper'):
-            continue
+    colorder = table.names
 
-        colorder.append(col)
+    suffix = 'json.gz' if compress else 'json'
 
     print("Starting output: " +
-          "nrows={} chunksize={}".format(ntotal, chunksize))
+          "nrows={} chunksize={} nproc={}".format(ntotal, chunksize, nproc))
+    jobs = []
     while start <= ntotal:
-        outname = "{}.{}.json".format(outhead, ctr)
-
-        # Use an ordered dict so that we can be sure it serializes
-        # the same if the input data is the same
-        #
-        js = OrderedDict()
-        js['ntotal'] = ntotal
-        js['start'] = start
-        js['cols'] = colorder
-        js['rows'] = cts['rows'][start:end]
-
-        open(outname, 'w').write(json.dumps(js, allow_nan=False))
-        print("Created: {}".format(outname))
+        outname = "{}.{}.{}".format(outhead, ctr, suffix)
+        jobs.append((outname, ntotal, start, colorder, table[start:end],
+                     compress, layout))
 
         start += chunksize
         end += chunksize
         ctr += 1
 
+    for outname in srcjson.run_jobs(write_chunk, jobs, nproc=nproc):
+        print("Created: {}".format(outname))
 
-if __name__ == '__main__':
 
-    import sys
-    if len(sys.argv) != 4:
-        sys.stderr.write("Usage: {} ".format(sys.argv[0]) +
-                         "prerel tsvfile outhead\n")
-        sys.exit(1)
+help_str = "Convert the CSC source properties from TSV to JSON."
+
+
+if __name__ == '__main__':
 
-    convert(sys.argv[1], sys.argv[2], sys.argv[3], 40000)
+    import argparse
+
+    parser = argparse.ArgumentParser(description=help_str,
+                                     prog=sys.argv[0])
+
+    parser.add_argument('prerel', type=str,
+                        help='The pre-release source list (FITS)')
+    parser.add_argument('tsvfile', type=str,
+                        help='The source properties (TSV)')
+    parser.add_argument('outhead', type=str,
+                        help='The output files are <outhead>.<n>.json')
+    parser.add_argument('--gzip', action='store_true',
+                        help='Write out gzip-compressed chunks')
+    parser.add_argument('--layout', choices=['rows', 'columns'], default='rows',
+                        help='How the chunks store the values (default: %(default)s)')
+    parser.add_argument('--nproc', type=int, default=os.cpu_count(),
+                        help='Number of processes to use (default: %(default)s)')
+
+    args = parser.parse_args(sys.argv[1:])
+    if args.nproc < 1:
+        parser.error("--nproc must be 1 or more")
+
+    convert(args.prerel, args.tsvfile, args.outhead, 40000,
+            compress=args.gzip, nproc=args.nproc, layout=args.layout)
@@ -0,0 +1,128 @@
+'use strict';
+
+/* global XMLHttpRequest */
+/* global DataTable */
+/* global document */
+
+/*
+ * Create the CSC 2.1 processing-status table (status.xml) from the
+ * JSON version of the table written by make_status.py, rather than
+ * from thousands of HTML rows.
+ *
+ * The JSON file has the fields cols, nrows, lastupdate, and rows,
+ * where each row is an array with the values
+ *
+ *    stack, nobi, targets, stacktype, state, ndet, completed, ra, dec
+ *
+ * and ndet is -1 and completed is "" if the stack has not been
+ * processed. If the npages field is set then the remaining rows are
+ * in <name>.2.json to <name>.<npages>.json, which are added to the
+ * table as they are downloaded.
+ */
+
+const status21 = (() => {
+
+  function getJSON(url, success, failure) {
+    const req = new XMLHttpRequest();
+    if (!req) {
+      failure();
+      return;
+    }
+
+    req.addEventListener('load', () => {
+      if (req.status === 200 && req.response !== null) {
+        success(req.response);
+      } else {
+        failure();
+      }
+    }, false);
+
+    req.addEventListener('error', failure, false);
+
+    req.open('GET', url);
+    req.responseType = 'json';
+    req.send();
+  }
+
+  function escapeHTML(txt) {
+    return txt.replace(/&/g, '&amp;')
+      .replace(/</g, '&lt;')
+      .replace(/>/g, '&gt;')
+      .replace(/"/g, '&quot;');
+  }
+
+  // Only the displayed values are changed; the ordering and search
+  // use the stored values.
+  //
+  function renderStack(data, type, row) {
+    if (type !== 'display') { return data; }
+    const href = `../wwt21.html?stackid=${data}&ra=${row[7].toFixed(5)}&dec=${row[8].toFixed(5)}`;
+    return `<a target="_blank" href="${href}">${data}</a>`;
+  }
+
+  function renderText(data, type) {
+    return type === 'display' ? escapeHTML(data) : data;
+  }
+
+  function renderCount(data, type) {
+    if (type !== 'display') { return data; }
+    return data < 0 ? '-' : data;
+  }
+
+  function renderDate(data, type) {
+    if (type !== 'display') { return data; }
+    return data === '' ? 'Not completed' : data;
+  }
+
+  const columns = [
+    { render: renderStack },
+    { },
+    { render: renderText },
+    { },
+    { },
+    { render: renderCount },
+    { render: renderDate }
+  ];
+
+  function pageName(url, page) {
+    return url.replace(/\.json$/, `.${page}.json`);
+  }
+
+  function reportError(selector, url) {
+    const caption = document.querySelector(`${selector} caption`);
+    if (caption !== null) {
+      caption.innerText = `Unable to download the table data (${url}).`;
+    }
+  }
+
+  // Create the table from the data in url, where selector identifies
+  // the table element.
+  //
+  function createTable(selector, url) {
+
+    getJSON(url, (json) => {
+      const table = new DataTable(selector, {
+        dom: 'Blfrtip',
+        pageLength: 25,
+        select: true,
+        buttons: ['colvis', 'copy', 'csv', 'excel'],
+        data: json.rows,
+        columns: columns,
+        deferRender: true
+      });
+
+      if (typeof json.npages === 'undefined') { return; }
+
+      for (let page = 2; page <= json.npages; page++) {
+        const purl = pageName(url, page);
+        getJSON(purl, (pjson) => {
+          table.rows.add(pjson.rows).draw(false);
+        }, () => reportError(selector, purl));
+      }
+
+    }, () => reportError(selector, url));
+  }
+
+  return { createTable: createTable };
+
+})();
@@ -1691,6 +1691,32 @@ var wwt = (function () {
     //
     const processChunk = (x) => (d) => { processCatalogData(chunks, x, d); };
 
+    // If the status file lists the chunks then they are named by
+    // their contents, so there is no need for the cache buster
+    // (the browser only has to download the chunks that have
+    // changed). The location of each chunk is taken from the
+    // manifest.
+    //
+    const manifest = inputStackData.srcprop;
+    if (typeof manifest !== "undefined") {
+      const processManifestChunk = (x, chunk) => (d) => {
+        if (d !== null) {
+          d.start = chunk.start;
+          d.ntotal = inputStackData.nsources;
+        }
+        processCatalogData(chunks, x, d);
+      };
+
+      manifest.forEach((chunk, idx) => {
+        const url = `wwtdata/${chunk.file}`;
+        const func = makeDownloadData(url, '#togglesources',
+				      'CSC2.1 catalog',
+				      processManifestChunk(idx + 1, chunk));
+        func();
+      });
+      return;
+    }
+
     for (var ctr = 1; ctr <= NCHUNK; ctr++) {
       const url = `wwtdata/wwt21_srcprop.${ctr}.json.gz` + cacheBuster();
       const func = makeDownloadData(url, '#togglesources',
@@ -2307,10 +2333,42 @@ var wwt = (function () {
     return true;
   }
 
+  // Convert the "arrays" layout of the status file - where the stack
+  // ids are listed once, in stackids, and stacks, completed, and
+  // nsource are parallel arrays - to the original layout, where
+  // these fields are objects keyed by the stack id (see
+  // statusjson.py). A null value means the field is not set.
+  //
+  function statusArraysToDicts(status) {
+    const stacks = {};
+    const completed = {};
+    const nsource = {};
+    const nstacks = status.stackids.length;
+    for (let i = 0; i < nstacks; i++) {
+      const stackid = status.stackids[i];
+      stacks[stackid] = status.stacks[i];
+      if (status.completed[i] !== null) {
+        completed[stackid] = status.completed[i];
+      }
+      if (status.nsource[i] !== null) {
+        nsource[stackid] = status.nsource[i];
+      }
+    }
+
+    status.stacks = stacks;
+    status.completed = completed;
+    status.nsource = nsource;
+    return status;
+  }
+
   // This is assumed to only be used for "processing" data.
   //
   function updateCompletionInfo(status) {
 
+    if (status.layout === 'arrays') {
+      status = statusArraysToDicts(status);
+    }
+
     let lmodStart = null;
     let lmodEnd = null;
 
@@ -2352,6 +2410,7 @@ var wwt = (function () {
     //
     inputStackData.nsources = status.nsources;
     inputStackData.nchunks = status.nchunks;
+    inputStackData.srcprop = status.srcprop;
 
     // Update the "Help" page (if still needed). This was from CSC 2.0
     const el = document.querySelector('#lastmod');
@@ -5215,6 +5274,52 @@ var wwt = (function () {
     saveState(keyForeground, name);
   }
 
+  // Convert the columns layout - an object containing the values
+  // of each column - into the rows used by the rest of the code.
+  //
+  function columnsToRows(cols, columns) {
+    const values = cols.map(col => columns[col]);
+    const nrows = values.length > 0 ? values[0].length : 0;
+    const rows = new Array(nrows);
+    for (let i = 0; i < nrows; i++) {
+      rows[i] = values.map(vals => vals[i]);
+    }
+    return rows;
+  }
+
+  // Convert the quantized columns in place. The scaled columns
+  // are integer multiples of scale, and the mantissa columns pack
+  // the mantissa and exponent as sign * (m * 100 + e + 50).
+  //
+  function dequantizeRows(cols, quant, rows) {
+    const convs = [];
+    cols.forEach((col, idx) => {
+      const info = quant[col];
+      if (typeof info === 'undefined') { return; }
+      if (info.type === 'scaled') {
+        const factor = Math.round(1 / info.scale);
+        convs.push([idx, (v) => v / factor]);
+      } else if (info.type === 'mantissa') {
+        convs.push([idx, (v) => {
+          const a = Math.abs(v);
+          const m = Math.floor(a / 100);
+          const e = a % 100 - 50;
+          const x = e < 0 ? m / Math.pow(10, -e) : m * Math.pow(10, e);
+          return v < 0 ? -x : x;
+        }]);
+      } else {
+        console.log(`ERROR: unknown quantization ${info.type} for ${col}`);
+      }
+    });
+
+    for (const row of rows) {
+      for (const conv of convs) {
+        const v = row[conv[0]];
+        if (v !== null) { row[conv[0]] = conv[1](v); }
+      }
+    }
+  }
+
   // Extract the data from this chunk and, if all chunks have
   // been read in, finalize things.
   //
@@ -5244,6 +5349,19 @@ var wwt = (function () {
       return;
     }
 
+    // The values may be stored by column rather than by row.
+    //
+    if (typeof json.columns !== 'undefined') {
+      json.rows = columnsToRows(json.cols, json.columns);
+    }
+
+    // Convert any fixed-point columns back to floating point (see
+    // code/csc21/quantize.py).
+    //
+    if (typeof json.quant !== 'undefined') {
+      dequantizeRows(json.cols, json.quant, json.rows);
+    }
+
     const props = catalogProps.csc;
     if (props.data === null) {
       props.data = new Array(json.ntotal);